@@ -45,6 +45,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     # Apps
     "text_analysis",
     # 3rd-party
@@ -151,6 +152,119 @@ STATIC_URL = "static/"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+
+# Django REST framework
+# https://www.django-rest-framework.org/api-guide/settings/
+
+REST_FRAMEWORK = {
+    # Clients are rate limited by the address nginx adds to X-Forwarded-For
+    "NUM_PROXIES": 1,
+    # Rejects bodies over MAX_REQUEST_BODY_BYTES with a 413
+    "DEFAULT_PARSER_CLASSES": [
+        "text_analysis.parsers.ORJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
+}
+
 # Project settings
 MODEL_NAME: str = "cardiffnlp/twitter-roberta-base-sentiment"
+# Bump when the model weights change so that cached results are not reused.
+MODEL_VERSION: str = os.environ.get("MODEL_VERSION", "1")
 SENTIMENT_LABELS: list[str] = ["negative", "neutral", "positive"]
+# Inference engine: "tf" runs the TensorFlow model, "onnx" runs its ONNX export
+# (see the export_onnx management command) with ONNX Runtime on the CPU.
+SENTIMENT_ENGINE: str = os.environ.get("SENTIMENT_ENGINE", "tf")
+ML_MODELS_DIR: Path = Path(__file__).resolve().parent.parent.parent / "ml_models"
+ONNX_MODEL_PATH: str = os.environ.get(
+    "ONNX_MODEL_PATH", str(ML_MODELS_DIR / "model.int8.onnx")
+)
+# Memory-maps the ONNX weights from ONNX_MODEL_PATH + ".data" (see export_onnx
+# --shared-weights), so every worker on a host shares one copy of them.
+SHARED_MODEL_WEIGHTS: bool = str2bool(os.environ.get("SHARED_MODEL_WEIGHTS", "false"))
+# The TensorFlow engine runs one compiled graph per length bucket, optionally
+# compiled with XLA (which also recompiles per batch size).
+TF_COMPILE: bool = str2bool(os.environ.get("TF_COMPILE", "true"))
+TF_JIT_COMPILE: bool = str2bool(os.environ.get("TF_JIT_COMPILE", "false"))
+# Web workers load the model and run warmup batches at startup (see asgi.py).
+MODEL_WARMUP: bool = str2bool(os.environ.get("MODEL_WARMUP", "true"))
+INFERENCE_BATCH_SIZE: int = 32
+INFERENCE_MAX_LENGTH: int = 512
+# Texts are grouped by token count into these buckets before batching, so one
+# long text only inflates the padding of texts of a similar length.
+INFERENCE_BUCKET_BOUNDARIES: list[int] = [32, 64, 128, 256, 512]
+# Upper bound on batch size x padded sequence length for a single forward pass.
+INFERENCE_MAX_BATCH_TOKENS: int = 8192
+# Texts longer than INFERENCE_MAX_LENGTH tokens are truncated, unless LONG_TEXT_MODE
+# is on. They are then split into windows of INFERENCE_MAX_LENGTH tokens overlapping
+# by LONG_TEXT_WINDOW_OVERLAP tokens, at most LONG_TEXT_MAX_WINDOWS per text, whose
+# logits are combined by LONG_TEXT_AGGREGATION: "mean", "weighted" (by token count)
+# or "max" (the most confident window).
+LONG_TEXT_MODE: bool = str2bool(os.environ.get("LONG_TEXT_MODE", "false"))
+LONG_TEXT_WINDOW_OVERLAP: int = int(os.environ.get("LONG_TEXT_WINDOW_OVERLAP", 128))
+LONG_TEXT_MAX_WINDOWS: int = int(os.environ.get("LONG_TEXT_MAX_WINDOWS", 8))
+LONG_TEXT_AGGREGATION: str = os.environ.get("LONG_TEXT_AGGREGATION", "mean")
+# Texts from concurrent requests are collected into one inference call of at most
+# MAX_BATCH_SIZE texts, waiting no longer than MAX_BATCH_WAIT_MS for it to fill up.
+MAX_BATCH_SIZE: int = 128
+MAX_BATCH_WAIT_MS: float = 5.0
+# Larger JSON, NDJSON and MessagePack request bodies are rejected with a 413. Keep
+# nginx's client_max_body_size in line with it.
+MAX_REQUEST_BODY_BYTES: int = int(os.environ.get("MAX_REQUEST_BODY_BYTES", 64 * 1024 * 1024))
+# Admission control, checked before any text is tokenized. Bulk analyses of more than
+# MAX_TEXTS_PER_REQUEST texts are rejected with a 413. While INFERENCE_MAX_QUEUE_SIZE
+# texts are waiting for inference, requests are shed with a 429 and a Retry-After of
+# INFERENCE_QUEUE_RETRY_AFTER seconds.
+MAX_TEXTS_PER_REQUEST: int = int(os.environ.get("MAX_TEXTS_PER_REQUEST", 10_000))
+INFERENCE_MAX_QUEUE_SIZE: int = int(os.environ.get("INFERENCE_MAX_QUEUE_SIZE", 4096))
+INFERENCE_QUEUE_RETRY_AFTER: int = 1
+# Each client may submit RATE_LIMIT_BURST texts at once, refilled at
+# RATE_LIMIT_TEXTS_PER_SECOND texts per second. A rate of 0 disables the limit.
+RATE_LIMIT_TEXTS_PER_SECOND: float = float(os.environ.get("RATE_LIMIT_TEXTS_PER_SECOND", 200))
+RATE_LIMIT_BURST: int = int(os.environ.get("RATE_LIMIT_BURST", 10_000))
+# Batches are tokenized on TOKENIZER_WORKERS threads and run through the model on
+# INFERENCE_WORKERS threads off the event loop, so the next batch is tokenized while
+# the current one is running. At most PIPELINE_QUEUE_SIZE tokenized batches wait
+# for an inference thread. The intra/inter-op thread counts also apply to ONNX
+# Runtime sessions; 0 leaves them to be picked by the runtime itself.
+TOKENIZER_WORKERS: int = int(os.environ.get("TOKENIZER_WORKERS", 1))
+INFERENCE_WORKERS: int = int(os.environ.get("INFERENCE_WORKERS", 2))
+PIPELINE_QUEUE_SIZE: int = int(os.environ.get("PIPELINE_QUEUE_SIZE", 1))
+# When INFERENCE_SERVER_SOCKET is set, web workers send texts to the inference
+# server (`manage.py run_inference_server`) listening on that Unix socket instead of
+# loading the model, over at most INFERENCE_SERVER_POOL_SIZE connections each.
+# Requests time out after INFERENCE_SERVER_TIMEOUT seconds. Texts are then analysed
+# in-process for INFERENCE_SERVER_RETRY_AFTER seconds, or fail if
+# INFERENCE_SERVER_FALLBACK is off.
+INFERENCE_SERVER_SOCKET: str = os.environ.get("INFERENCE_SERVER_SOCKET", "")
+INFERENCE_SERVER_POOL_SIZE: int = int(os.environ.get("INFERENCE_SERVER_POOL_SIZE", 8))
+INFERENCE_SERVER_TIMEOUT: float = float(os.environ.get("INFERENCE_SERVER_TIMEOUT", 10.0))
+INFERENCE_SERVER_RETRY_AFTER: float = 5.0
+INFERENCE_SERVER_FALLBACK: bool = str2bool(os.environ.get("INFERENCE_SERVER_FALLBACK", "true"))
+TF_INTRA_OP_THREADS: int = int(os.environ.get("TF_INTRA_OP_THREADS", 0))
+TF_INTER_OP_THREADS: int = int(os.environ.get("TF_INTER_OP_THREADS", 0))
+# Sentiment results are cached per worker in a bounded LRU in front of Redis.
+# Timeouts are in seconds.
+SENTIMENT_CACHE_TIMEOUT: int = int(os.environ.get("SENTIMENT_CACHE_TIMEOUT", 7 * 24 * 60 * 60))
+LOCAL_CACHE_MAX_ENTRIES: int = 10_000
+LOCAL_CACHE_MAX_BYTES: int = 16 * 1024 * 1024
+LOCAL_CACHE_TIMEOUT: int = 5 * 60
+# Fraction of analysed texts logged, with their sentiment, at debug level
+SENTIMENT_LOG_SAMPLE_RATE: float = float(os.environ.get("SENTIMENT_LOG_SAMPLE_RATE", 0.01))
+
+# Texts of background jobs are analysed in batches by `manage.py run_sentiment_worker`.
+# The poll interval is in seconds. Texts claimed by a worker which has not saved
+# them within JOB_CLAIM_TIMEOUT seconds, e.g. because it died or analysing them
+# failed, are claimed again. Texts are counted as failed after JOB_MAX_ATTEMPTS.
+JOB_BATCH_SIZE: int = int(os.environ.get("JOB_BATCH_SIZE", 256))
+JOB_POLL_INTERVAL: float = float(os.environ.get("JOB_POLL_INTERVAL", 1.0))
+JOB_CLAIM_TIMEOUT: float = float(os.environ.get("JOB_CLAIM_TIMEOUT", 600))
+JOB_MAX_ATTEMPTS: int = int(os.environ.get("JOB_MAX_ATTEMPTS", 3))
+JOB_INSERT_BATCH_SIZE: int = 5000
+# Results of a job are returned in pages of JOB_RESULTS_PAGE_SIZE by default
+JOB_RESULTS_PAGE_SIZE: int = 100
+JOB_RESULTS_MAX_PAGE_SIZE: int = 1000
+
+# Stored analyses are listed newest first, in pages of ANALYSIS_PAGE_SIZE by default
+ANALYSIS_PAGE_SIZE: int = 100
+ANALYSIS_MAX_PAGE_SIZE: int = 1000
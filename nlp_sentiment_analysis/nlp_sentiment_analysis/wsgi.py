@@ -14,3 +14,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "nlp_sentiment_analysis.settings.prod")
 
 application = get_wsgi_application()
+
+# Load and warm up the model in the background once the apps are ready, unless the
+# inference server runs it
+from django.conf import settings  # noqa: E402
+
+if settings.MODEL_WARMUP and not settings.INFERENCE_SERVER_SOCKET:
+    from text_analysis.analysis import loader  # noqa: E402
+
+    loader.start_warmup()
@@ -1,70 +1,535 @@
+import asyncio
 import logging
+import random
+import threading
+import time
 
-from transformers import TFAutoModelForSequenceClassification, AutoTokenizer
-import tensorflow as tf
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional
+
+import numpy as np
 
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from .batching import BatchScheduler
+from .engines import InferenceEngine, InferenceError, load_engine
+from .inference_server import REMOTE_FALLBACKS, RemoteEngine, RemoteEngineError
+from .metrics import BATCH_TEXTS, STAGE_SECONDS, TEXTS_ANALYSED, registry
+from .pipeline import Stage, StagedPipeline
+
+if TYPE_CHECKING:
+    from transformers import AutoTokenizer
 
 
 MODEL = settings.MODEL_NAME
 SENTIMENT_LABELS = settings.SENTIMENT_LABELS
+BATCH_SIZE = settings.INFERENCE_BATCH_SIZE
+MAX_LENGTH = settings.INFERENCE_MAX_LENGTH
+BUCKET_BOUNDARIES = settings.INFERENCE_BUCKET_BOUNDARIES
+MAX_BATCH_TOKENS = settings.INFERENCE_MAX_BATCH_TOKENS
+LOG_SAMPLE_RATE = settings.SENTIMENT_LOG_SAMPLE_RATE
+LONG_TEXT_MODE = settings.LONG_TEXT_MODE
+LONG_TEXT_WINDOW_OVERLAP = settings.LONG_TEXT_WINDOW_OVERLAP
+LONG_TEXT_MAX_WINDOWS = settings.LONG_TEXT_MAX_WINDOWS
+LONG_TEXT_AGGREGATION = settings.LONG_TEXT_AGGREGATION
 
-tokenizer: AutoTokenizer = AutoTokenizer.from_pretrained(MODEL)
-model: TFAutoModelForSequenceClassification = (
-    TFAutoModelForSequenceClassification.from_pretrained(MODEL)
-)
 
-async def analyse_sentiment_async(text: str) -> dict[str, float]:
+class ModelLoader:
     """
-    Analyzes sentiment of a given text using the pre-trained RoBERTa model.
+    Loads the tokenizer and inference engine on first use instead of at import time.
+
+    Importing this module is therefore cheap for management commands and the test
+    runner. Web workers call ``start_warmup`` at startup, which loads both and runs
+    representative batch shapes through the engine in a background thread;
+    ``ready`` is set once that has finished.
 
     Args:
-        text: The text to analyze (str).
+        model_name: The name or local path of the pre-trained model (str).
+        engine_name: The inference engine to load, "tf" or "onnx" (str).
+    """
+
+    def __init__(self, model_name: str, engine_name: str) -> None:
+        self.model_name = model_name
+        self.engine_name = engine_name
+        self.ready = threading.Event()
+        self.error: Optional[str] = None
+
+        self._tokenizer: Optional["AutoTokenizer"] = None
+        self._engine: Optional[InferenceEngine] = None
+        self._lock = threading.Lock()
+
+    @property
+    def tokenizer(self) -> "AutoTokenizer":
+        if self._tokenizer is None:
+            with self._lock:
+                if self._tokenizer is None:
+                    from transformers import AutoTokenizer
+
+                    self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        return self._tokenizer
+
+    @property
+    def engine(self) -> InferenceEngine:
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    self._engine = load_engine(self.engine_name)
+        return self._engine
+
+    def warmup(self) -> None:
+        """
+        Loads the tokenizer and engine and runs one batch of each bucket's shape
+        through the engine, then marks the loader as ready.
+        """
+        tokenizer: "AutoTokenizer" = self.tokenizer
+        for boundary in BUCKET_BOUNDARIES:
+            batch_size: int = max(1, min(BATCH_SIZE, MAX_BATCH_TOKENS // boundary))
+            input_ids: list[int] = [tokenizer.pad_token_id + 1] * boundary
+            encoded_input: dict[str, list[list[int]]] = {
+                "input_ids": [input_ids] * batch_size,
+                "attention_mask": [[1] * boundary] * batch_size,
+            }
+            batch: dict[str, np.ndarray] = _pad_batch(encoded_input, list(range(batch_size)))
+            if LONG_TEXT_MODE:
+                self.engine.predict_logits(batch)
+            else:
+                self.engine.predict(batch)
+
+        logging.info("Sentiment model '%s' is warmed up.", self.model_name)
+        self.ready.set()
+
+    def start_warmup(self) -> threading.Thread:
+        """
+        Runs ``warmup`` in a background thread so the worker can start serving
+        readiness checks straight away.
+        """
+
+        def _warmup() -> None:
+            try:
+                self.warmup()
+            except Exception as e:
+                self.error = str(e)
+                logging.error("An error occurred while warming up the model: %s", e)
+
+        thread = threading.Thread(target=_warmup, name="sentiment-warmup", daemon=True)
+        thread.start()
+        return thread
+
+
+loader: ModelLoader = ModelLoader(MODEL, settings.SENTIMENT_ENGINE)
+
+
+def _make_batches(lengths: list[int]) -> list[list[int]]:
+    """
+    Groups texts into length-bucketed batches.
+
+    Indices are sorted by token count and split whenever the length bucket changes,
+    the batch reaches ``INFERENCE_BATCH_SIZE`` or the padded batch would exceed
+    ``INFERENCE_MAX_BATCH_TOKENS``.
+
+    Args:
+        lengths: The token count of each text (list[int]).
 
     Returns:
-        A tuple containing the predicted sentiment label ("positive", "neutral", "negative")
-        and the confidence score associated with the prediction (float).
+        A list of batches, each a list of indices into ``lengths``.
     """
-    try:
+    batches: list[list[int]] = []
+    batch: list[int] = []
+    batch_bucket: int = 0
+    for index in sorted(range(len(lengths)), key=lengths.__getitem__):
+        bucket: int = bisect_left(BUCKET_BOUNDARIES, lengths[index])
+        # Indices are visited in ascending length, so the current text sets the padded width
+        padded_tokens: int = (len(batch) + 1) * lengths[index]
+        if batch and (
+            bucket != batch_bucket
+            or len(batch) >= BATCH_SIZE
+            or padded_tokens > MAX_BATCH_TOKENS
+        ):
+            batches.append(batch)
+            batch = []
+        batch.append(index)
+        batch_bucket = bucket
+
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _pad_batch(
+    encoded_input: dict[str, list[list[int]]], indices: list[int]
+) -> dict[str, np.ndarray]:
+    """
+    Pads the encoded texts at ``indices`` to the longest text in the batch.
+
+    Args:
+        encoded_input: The unpadded tokenizer output for all texts.
+        indices: The indices of the texts in this batch (list[int]).
+
+    Returns:
+        A dict of int32 model input arrays of shape (len(indices), longest length).
+    """
+    width: int = max(len(encoded_input["input_ids"][index]) for index in indices)
+    batch: dict[str, np.ndarray] = {}
+    for name, values in encoded_input.items():
+        pad_value: int = loader.tokenizer.pad_token_id if name == "input_ids" else 0
+        padded: np.ndarray = np.full((len(indices), width), pad_value, dtype=np.int32)
+        for row, index in enumerate(indices):
+            padded[row, : len(values[index])] = values[index]
+        batch[name] = padded
+    return batch
+
+
+def _split_windows(
+    encoded_input: dict[str, list[list[int]]]
+) -> tuple[dict[str, list[list[int]]], list[int]]:
+    """
+    Splits untruncated texts into overlapping windows of at most ``MAX_LENGTH``
+    tokens.
+
+    Each window keeps the first and last special tokens of its text. Consecutive
+    windows share ``LONG_TEXT_WINDOW_OVERLAP`` tokens, and only the first
+    ``LONG_TEXT_MAX_WINDOWS`` windows of a text are kept. Texts which fit into
+    ``MAX_LENGTH`` tokens are a single window.
+
+    Args:
+        encoded_input: The unpadded, untruncated tokenizer output for all texts.
+
+    Returns:
+        The tokenizer output of the windows, and the index of the text each window
+        was taken from (list[int]).
+    """
+    size: int = MAX_LENGTH - 2
+    step: int = size - LONG_TEXT_WINDOW_OVERLAP
+    windows: dict[str, list[list[int]]] = {name: [] for name in encoded_input}
+    owners: list[int] = []
+    for index, input_ids in enumerate(encoded_input["input_ids"]):
+        body_length: int = len(input_ids) - 2
+        starts: range = range(0, max(body_length - LONG_TEXT_WINDOW_OVERLAP, 1), step)
+        for start in starts[:LONG_TEXT_MAX_WINDOWS]:
+            end: int = 1 + min(start + size, body_length)
+            for name, values in encoded_input.items():
+                sequence: list[int] = values[index]
+                windows[name].append([sequence[0], *sequence[1 + start : end], sequence[-1]])
+            owners.append(index)
+    return windows, owners
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    exponents: np.ndarray = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return exponents / exponents.sum(axis=-1, keepdims=True)
+
+
+def _aggregate_windows(
+    logits: np.ndarray, owners: list[int], lengths: list[int], count: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Combines the logits of each text's windows into one prediction per text.
+
+    ``LONG_TEXT_AGGREGATION`` selects how: "mean" averages the logits of all
+    windows, "weighted" weighs them by their token counts, so a short last window
+    counts for less, and "max" takes the window with the most confident
+    prediction.
+
+    Args:
+        logits: The logits of each window (np.ndarray).
+        owners: The index of the text each window was taken from (list[int]).
+        lengths: The token count of each window (list[int]).
+        count: The number of texts (int).
+
+    Returns:
+        The index of the top label and its probability for each text.
+    """
+    owner_indices: np.ndarray = np.asarray(owners)
+    if LONG_TEXT_AGGREGATION == "max":
+        confidence: np.ndarray = _softmax(logits).max(axis=-1)
+        # Sorted by text, most confident window first
+        order: np.ndarray = np.lexsort((-confidence, owner_indices))
+        _, first = np.unique(owner_indices[order], return_index=True)
+        combined: np.ndarray = logits[order[first]]
+    elif LONG_TEXT_AGGREGATION in ("mean", "weighted"):
+        weights: np.ndarray = (
+            np.asarray(lengths, dtype=np.float32)
+            if LONG_TEXT_AGGREGATION == "weighted"
+            else np.ones(len(owners), dtype=np.float32)
+        )
+        combined = np.zeros((count, logits.shape[1]), dtype=np.float32)
+        totals: np.ndarray = np.zeros(count, dtype=np.float32)
+        np.add.at(combined, owner_indices, logits * weights[:, None])
+        np.add.at(totals, owner_indices, weights)
+        combined /= totals[:, None]
+    else:
+        raise ImproperlyConfigured(
+            f"Unknown LONG_TEXT_AGGREGATION '{LONG_TEXT_AGGREGATION}', "
+            "expected 'mean', 'weighted' or 'max'."
+        )
+
+    probabilities: np.ndarray = _softmax(combined)
+    label_ids: np.ndarray = probabilities.argmax(axis=-1)
+    return label_ids, probabilities[np.arange(count), label_ids]
+
+
+@dataclass
+class EncodedTexts:
+    """
+    The output of the tokenize stage for a list of texts.
+
+    Args:
+        texts: The texts (list[str]).
+        encoded_input: The unpadded tokenizer output, one row per text or window.
+        lengths: The token count of each row (list[int]).
+        owners: The index of the text each row was taken from in long-text mode,
+            None otherwise (Optional[list[int]]).
+    """
+
+    texts: list[str]
+    encoded_input: dict[str, list[list[int]]]
+    lengths: list[int]
+    owners: Optional[list[int]] = None
+
+
+def tokenize_texts(texts: list[str]) -> EncodedTexts:
+    """
+    Tokenizes a list of texts in a single call to the tokenizer, without padding.
+
+    Texts are truncated to ``MAX_LENGTH`` tokens, unless ``LONG_TEXT_MODE`` is on.
+    Longer texts are then split into overlapping windows (see ``_split_windows``).
+
+    Args:
+        texts: The texts to tokenize (list[str]).
 
-        async def _encode_text(text: str) -> tf.Tensor:
-            return tokenizer(
+    Returns:
+        The encoded texts (EncodedTexts).
+    """
+    with STAGE_SECONDS.time(stage="tokenize"):
+        encoded_input: dict[str, list[list[int]]] = loader.tokenizer(
+            texts,
+            truncation=not LONG_TEXT_MODE,
+            max_length=MAX_LENGTH,
+        )
+        owners: Optional[list[int]] = None
+        if LONG_TEXT_MODE:
+            encoded_input, owners = _split_windows(encoded_input)
+    lengths: list[int] = [len(input_ids) for input_ids in encoded_input["input_ids"]]
+    return EncodedTexts(texts, encoded_input, lengths, owners)
+
+
+def infer_sentiments(encoded: EncodedTexts) -> list[dict[str, float]]:
+    """
+    Runs tokenized texts through the configured inference engine.
+
+    Texts are grouped into length-bucketed batches which are only padded to their
+    longest text, and each batch is run through the engine at once. In long-text
+    mode, windows are batched together with the other texts and their predictions
+    are combined per text (see ``_aggregate_windows``).
+
+    Args:
+        encoded: The output of ``tokenize_texts`` (EncodedTexts).
+
+    Returns:
+        A list with one dict per text, in the same order as the texts, containing
+        the predicted sentiment label and its confidence score.
+    """
+    texts, lengths, owners = encoded.texts, encoded.lengths, encoded.owners
+    rows: int = len(lengths)
+    if owners is None:
+        label_ids: np.ndarray = np.zeros(rows, dtype=np.int64)
+        scores: np.ndarray = np.zeros(rows, dtype=np.float32)
+    else:
+        logits: np.ndarray = np.zeros((rows, len(SENTIMENT_LABELS)), dtype=np.float32)
+
+    inference_seconds: float = 0.0
+    for indices in _make_batches(lengths):
+        batch: dict[str, np.ndarray] = _pad_batch(encoded.encoded_input, indices)
+        start: float = time.perf_counter()
+        if owners is None:
+            label_ids[indices], scores[indices] = loader.engine.predict(batch)
+        else:
+            logits[indices] = loader.engine.predict_logits(batch)
+        inference_seconds += time.perf_counter() - start
+
+    if owners is not None:
+        label_ids, scores = _aggregate_windows(logits, owners, lengths, len(texts))
+
+    # Texts are only logged at debug level, and then only a sample of them
+    log_texts: bool = LOG_SAMPLE_RATE > 0 and logging.getLogger().isEnabledFor(
+        logging.DEBUG
+    )
+    results: list[dict[str, float]] = []
+    for text, label_id, score in zip(texts, label_ids, scores):
+        predicted_label: str = SENTIMENT_LABELS[label_id]
+        confidence_score: float = float(score)
+
+        if log_texts and random.random() < LOG_SAMPLE_RATE:
+            logging.debug(
+                "Sentiment analysis for '%s': %s (%.2f)",
                 text,
-                padding="max_length",
-                truncation=True,
-                max_length=512,
-                return_tensors="tf",
+                predicted_label,
+                confidence_score,
             )
+        results.append({"sentiment": predicted_label, "confidence_score": confidence_score})
 
-        encoded_input = await _encode_text(text)
-        outputs: dict = model(encoded_input)
-        logits: tf.Tensor = outputs.logits[0]
-        predictions: tf.Tensor = tf.nn.softmax(logits)
-
-        top_prediction, top_index = tf.nn.top_k(predictions, k=1)
-        predicted_label_id: int = top_index.numpy()[0]
-        predicted_label: str = SENTIMENT_LABELS[predicted_label_id]
-        confidence_score: float = top_prediction.numpy()[0]
-
-        logging.info(
-            "Sentiment analysis for '%s': %s (%.2f)",
-            text,
-            predicted_label,
-            confidence_score,
-        )
-        return {"sentiment": predicted_label, "confidence_score": confidence_score}
+    STAGE_SECONDS.observe(inference_seconds, stage="inference")
+    TEXTS_ANALYSED.inc(len(texts))
+    return results
 
-    except ValueError as e:
+
+def _error_results(texts: list[str], error: Exception) -> list[dict[str, str]]:
+    """
+    Logs an error raised while analysing texts and returns an error result per text.
+    """
+    if isinstance(error, ValueError):
         # Handle potential errors during preprocessing or input conversion
-        logging.error("An error occurred during text preprocessing '%s': %s", text, e)
-        return {"error": "Preprocessing error"}
+        logging.error("An error occurred during text preprocessing: %s", error)
+        return [{"error": "Preprocessing error"} for _ in texts]
+
+    if isinstance(error, InferenceError):
+        # Handle errors raised by the inference engine (e.g., out-of-range tensor indices)
+        logging.error("An inference error occurred: %s", error.__cause__)
+        return [{"error": str(error)} for _ in texts]
+
+    # Handle any other unexpected error
+    logging.error("An unexpected error occurred: %s", error)
+    return [{"error": "Unexpected error"} for _ in texts]
+
+
+def predict_sentiments(texts: list[str]) -> list[dict[str, float]]:
+    """
+    Analyzes sentiment of a list of texts using the pre-trained RoBERTa model.
+
+    Tokenizes the texts and runs them through the model in series on the calling
+    thread. Web workers run both stages in a pipeline instead (see ``pipeline``).
+
+    Args:
+        texts: The texts to analyze (list[str]).
 
-    except (tf.errors.OutOfRangeError, tf.errors.InvalidArgumentError) as e:
-        # Handle potential TensorFlow errors (e.g., out-of-range tensor indices)
-        logging.error("A TensorFlow error occurred '%s': %s", text, e)
-        return {"error": "TensorFlow error"}
+    Returns:
+        A list with one dict per text, in the same order as ``texts``, containing the
+        predicted sentiment label ("positive", "neutral", "negative") and the
+        confidence score associated with the prediction (float).
+    """
+    if not texts:
+        return []
 
+    try:
+        return infer_sentiments(tokenize_texts(texts))
     except Exception as e:
-        # Handle specific ValueError exception
-        logging.error("An unexpected error occurred '%s': %s", text, e)
-        return {"error": "Unexpected error"}
+        return _error_results(texts, e)
+
+
+# Tokenizing the next batch overlaps with running the current one through the
+# model. The Rust tokenizers, TensorFlow and ONNX Runtime all release the GIL, so
+# both stages run in parallel without blocking the event loop.
+pipeline: StagedPipeline = StagedPipeline(
+    [
+        Stage("tokenize", tokenize_texts, settings.TOKENIZER_WORKERS),
+        Stage("inference", infer_sentiments, settings.INFERENCE_WORKERS),
+    ],
+    queue_size=settings.PIPELINE_QUEUE_SIZE,
+)
+
+registry.callback(
+    "sentiment_pipeline_batches",
+    "Batches waiting for and running in each stage of the inference pipeline.",
+    "gauge",
+    lambda: [
+        ({"stage": stage, "state": state}, count)
+        for stage, counts in pipeline.stats().items()
+        for state, count in counts.items()
+    ],
+)
+
+
+async def _analyse_batch_async(texts: list[str]) -> list[dict[str, float]]:
+    BATCH_TEXTS.observe(len(texts))
+    try:
+        return await pipeline.run(texts)
+    except Exception as e:
+        return _error_results(texts, e)
+
+
+scheduler: BatchScheduler = BatchScheduler(
+    _analyse_batch_async,
+    max_batch_size=settings.MAX_BATCH_SIZE,
+    max_wait_ms=settings.MAX_BATCH_WAIT_MS,
+    # Enough batches to keep every stage of the pipeline busy
+    max_concurrent_batches=pipeline.capacity,
+    max_queue_size=settings.INFERENCE_MAX_QUEUE_SIZE,
+)
+
+registry.callback(
+    "sentiment_queue_depth",
+    "Texts waiting to be batched for inference.",
+    "gauge",
+    lambda: [({}, scheduler.queue_depth)],
+)
+
+registry.callback(
+    "sentiment_graph_traces_total",
+    "Traces of the compiled model graph per padded sequence length. Should stay at "
+    "one per length bucket once warmed up, more means the graph is retraced.",
+    "counter",
+    # Read from the loaded engine only, so scraping never loads the model
+    lambda: [
+        ({"length": str(width)}, count)
+        for width, count in sorted(getattr(loader._engine, "trace_counts", {}).items())
+    ],
+)
+
+
+# Analyses are sent to the inference server instead, when one is configured
+remote_engine: Optional[RemoteEngine] = (
+    RemoteEngine(
+        settings.INFERENCE_SERVER_SOCKET,
+        pool_size=settings.INFERENCE_SERVER_POOL_SIZE,
+        timeout=settings.INFERENCE_SERVER_TIMEOUT,
+        retry_after=settings.INFERENCE_SERVER_RETRY_AFTER,
+    )
+    if settings.INFERENCE_SERVER_SOCKET
+    else None
+)
+
+
+async def analyse_sentiments_async(texts: list[str]) -> list[dict[str, float]]:
+    """
+    Analyzes sentiment of a list of texts in batches.
+
+    Texts are queued on the shared ``scheduler``, so texts from concurrent requests
+    are analysed together in the same forward passes. With an inference server
+    configured, they are sent to the server instead, and only analysed in-process
+    while it is unavailable (unless ``INFERENCE_SERVER_FALLBACK`` is off).
+
+    Args:
+        texts: The texts to analyze (list[str]).
+
+    Returns:
+        A list of sentiment results in the same order as ``texts``.
+    """
+    if remote_engine is not None and texts:
+        if remote_engine.available:
+            try:
+                return await remote_engine.analyse(texts)
+            except RemoteEngineError as e:
+                logging.warning("An inference server error occurred: %s", e)
+
+        if not settings.INFERENCE_SERVER_FALLBACK:
+            return [{"error": "Inference server unavailable"} for _ in texts]
+        REMOTE_FALLBACKS.inc(len(texts))
+
+    return await scheduler.submit(texts)
+
+
+async def analyse_sentiment_async(text: str) -> dict[str, float]:
+    """
+    Analyzes sentiment of a given text using the pre-trained RoBERTa model.
+
+    Args:
+        text: The text to analyze (str).
+
+    Returns:
+        A dict containing the predicted sentiment label ("positive", "neutral", "negative")
+        and the confidence score associated with the prediction (float).
+    """
+    results: list[dict[str, float]] = await analyse_sentiments_async([text])
+    return results[0]
@@ -0,0 +1,165 @@
+import asyncio
+import logging
+
+from collections import deque
+from typing import Any, Awaitable, Callable, Optional
+
+
+BatchHandler = Callable[[list[str]], Awaitable[list[dict[str, Any]]]]
+
+
+class QueueFull(Exception):
+    """Raised when texts are submitted to a scheduler whose queue is full."""
+
+
+class BatchScheduler:
+    """
+    Collects texts from concurrent callers into shared inference batches.
+
+    Callers enqueue their texts and await one future per text. A single consumer
+    task takes up to ``max_batch_size`` queued texts, waiting at most
+    ``max_wait_ms`` after the first one for more to arrive, runs them through the
+    handler in one call and resolves the futures with the results.
+
+    Up to ``max_concurrent_batches`` batches are handled at the same time. While
+    all of them are busy, newly submitted texts keep accumulating into the next
+    batch. The consumer is started on demand and exits once the queue is drained,
+    so no task is left pending on an idle event loop.
+
+    With ``max_queue_size`` set, submissions which would grow the queue past that
+    many texts are rejected with ``QueueFull`` instead of waiting behind it. A
+    submission is always accepted by an empty queue, so no request is too large
+    to ever be served.
+
+    Args:
+        handler: Coroutine function analysing a list of texts (BatchHandler).
+        max_batch_size: Maximum number of texts passed to the handler at once (int).
+        max_wait_ms: Maximum time to wait for a batch to fill up (float).
+        max_concurrent_batches: Maximum number of batches in flight (int).
+        max_queue_size: Maximum number of texts waiting to be batched (Optional[int]).
+    """
+
+    def __init__(
+        self,
+        handler: BatchHandler,
+        max_batch_size: int,
+        max_wait_ms: float,
+        max_concurrent_batches: int = 1,
+        max_queue_size: Optional[int] = None,
+    ) -> None:
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_concurrent_batches = max_concurrent_batches
+        self.max_queue_size = max_queue_size
+
+        self._queue: deque[tuple[str, asyncio.Future]] = deque()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._consumer: Optional[asyncio.Task] = None
+        self._running: set[asyncio.Task] = set()
+
+    @property
+    def queue_depth(self) -> int:
+        """The number of texts waiting to be batched."""
+        return len(self._queue)
+
+    def is_full(self, count: int = 0) -> bool:
+        """Whether ``count`` more texts would be rejected."""
+        return (
+            self.max_queue_size is not None
+            and bool(self._queue)
+            and len(self._queue) + count > self.max_queue_size
+        )
+
+    async def submit(self, texts: list[str]) -> list[dict[str, Any]]:
+        """
+        Enqueues texts for batched analysis and waits for their results.
+
+        Args:
+            texts: The texts to analyze (list[str]).
+
+        Returns:
+            A list of results in the same order as ``texts``.
+
+        Raises:
+            QueueFull: If the queue cannot take the texts.
+        """
+        if not texts:
+            return []
+
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Events and futures are bound to the loop they were created on
+            self._loop = loop
+            self._queue.clear()
+            self._wakeup = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self._consumer = None
+            self._running = set()
+
+        if self.is_full(len(texts)):
+            raise QueueFull(f"{len(self._queue)} texts are already queued.")
+
+        futures: list[asyncio.Future] = []
+        for text in texts:
+            future: asyncio.Future = loop.create_future()
+            self._queue.append((text, future))
+            futures.append(future)
+        self._wakeup.set()
+
+        if self._consumer is None or self._consumer.done():
+            self._consumer = loop.create_task(self._consume())
+
+        return list(await asyncio.gather(*futures))
+
+    async def _next_batch(self) -> list[tuple[str, asyncio.Future]]:
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        batch: list[tuple[str, asyncio.Future]] = []
+        deadline: float = loop.time() + self.max_wait
+
+        while True:
+            while self._queue and len(batch) < self.max_batch_size:
+                batch.append(self._queue.popleft())
+
+            timeout: float = deadline - loop.time()
+            if len(batch) >= self.max_batch_size or timeout <= 0:
+                return batch
+
+            # Wait for more texts to be submitted or for the deadline to pass
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _consume(self) -> None:
+        while self._queue:
+            # Wait for a free slot first so texts keep accumulating while all are busy
+            await self._slots.acquire()
+            batch: list[tuple[str, asyncio.Future]] = await self._next_batch()
+            # Skip texts whose caller has gone away in the meantime
+            batch = [(text, future) for text, future in batch if not future.done()]
+            if not batch:
+                self._slots.release()
+                continue
+
+            task: asyncio.Task = asyncio.create_task(self._handle(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _handle(self, batch: list[tuple[str, asyncio.Future]]) -> None:
+        try:
+            results: list[dict[str, Any]] = await self.handler([text for text, _ in batch])
+        except Exception as e:
+            logging.error("An error occurred while analysing a batch: %s", e)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._slots.release()
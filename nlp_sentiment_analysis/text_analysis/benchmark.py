@@ -0,0 +1,395 @@
+import asyncio
+import platform
+import random
+import subprocess
+import time
+import zlib
+
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Optional
+
+import numpy as np
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import override_settings
+
+from .analysis import loader
+from .caching import make_cache_key, result_cache
+from .engines import TFEngine
+from .models import Analysis, SentimentResult, SentimentRollup
+from .renderers import ORJSONRenderer
+
+ASGIApp = Callable[[dict, Callable, Callable], Awaitable[None]]
+
+WORDS: list[str] = (
+    "the a this that movie product service phone battery screen delivery support "
+    "price quality love hate great terrible fine okay awful excellent slow fast "
+    "broken works again never always really quite not very good bad would buy "
+    "recommend return refund staff friendly rude late early cheap expensive"
+).split()
+
+# Scenarios clear and fill the cache, so they run against an in-memory cache of
+# their own rather than the configured one, which may be shared with other nodes
+BENCHMARK_CACHES: dict[str, dict[str, str]] = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "benchmark",
+    }
+}
+
+# Word counts per text are drawn uniformly from these ranges
+TEXT_LENGTHS: dict[str, list[tuple[int, int]]] = {
+    "short": [(3, 15)],
+    "long": [(150, 400)],
+    # Mostly short texts with the occasional long one, like real traffic
+    "mixed": [(3, 15)] * 8 + [(30, 80), (150, 400)],
+}
+
+
+class StubTokenizer:
+    """
+    Tokenizes texts offline, one token per word, without any vocabulary files.
+
+    Word ids are derived from a checksum of the word, so they are the same in
+    every run.
+
+    Args:
+        vocab_size: The number of token ids (int).
+    """
+
+    pad_token_id: int = 1
+
+    def __init__(self, vocab_size: int = 1000) -> None:
+        self.vocab_size = vocab_size
+
+    def __call__(
+        self, texts: list[str], truncation: bool = True, max_length: int = 512
+    ) -> dict[str, list[list[int]]]:
+        input_ids: list[list[int]] = []
+        for text in texts:
+            word_ids: list[int] = [
+                3 + zlib.crc32(word.encode()) % (self.vocab_size - 3) for word in text.split()
+            ]
+            ids: list[int] = [0, *word_ids, 2]
+            input_ids.append(ids[:max_length] if truncation else ids)
+        return {
+            "input_ids": input_ids,
+            "attention_mask": [[1] * len(ids) for ids in input_ids],
+        }
+
+
+class StubEngine:
+    """
+    A deterministic stand-in for the model.
+
+    The logits of each row are derived from its token ids. To stand in
+    for the cost of a forward pass, each batch sleeps for ``token_cost`` seconds
+    per padded token, releasing the GIL like the real engines do.
+
+    Args:
+        token_cost: Seconds per padded token (float).
+    """
+
+    name: str = "stub"
+
+    def __init__(self, token_cost: float = 0.0) -> None:
+        self.token_cost = token_cost
+
+    def predict(self, batch: dict[str, np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+        logits: np.ndarray = self.predict_logits(batch)
+        exponents: np.ndarray = np.exp(logits - logits.max(axis=-1, keepdims=True))
+        predictions: np.ndarray = exponents / exponents.sum(axis=-1, keepdims=True)
+        return predictions.argmax(axis=-1), predictions.max(axis=-1)
+
+    def predict_logits(self, batch: dict[str, np.ndarray]) -> np.ndarray:
+        input_ids: np.ndarray = batch["input_ids"]
+        if self.token_cost:
+            time.sleep(input_ids.size * self.token_cost)
+
+        checksums: np.ndarray = (input_ids * batch["attention_mask"]).sum(axis=-1)
+        labels: int = len(settings.SENTIMENT_LABELS)
+        # The top label's logit lies between 1 and 5.9, the others are 0
+        return np.eye(labels, dtype=np.float32)[checksums % labels] * (
+            1 + (checksums % 50)[:, None] / 10
+        )
+
+
+def tiny_model_engine(seed: int = 0) -> TFEngine:
+    """
+    Builds a randomly initialised two-layer RoBERTa, which runs through the same
+    TensorFlow code paths as the real model without downloading anything.
+
+    Args:
+        seed: The TensorFlow random seed (int).
+
+    Returns:
+        The engine (TFEngine).
+    """
+    import tensorflow as tf
+    from transformers import RobertaConfig, TFRobertaForSequenceClassification
+
+    tf.random.set_seed(seed)
+    config = RobertaConfig(
+        vocab_size=1000,
+        hidden_size=64,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        intermediate_size=128,
+        max_position_embeddings=settings.INFERENCE_MAX_LENGTH + 2,
+        num_labels=len(settings.SENTIMENT_LABELS),
+        pad_token_id=StubTokenizer.pad_token_id,
+    )
+    return TFEngine(
+        TFRobertaForSequenceClassification(config),
+        compiled=settings.TF_COMPILE,
+        jit_compile=settings.TF_JIT_COMPILE,
+        bucket_boundaries=settings.INFERENCE_BUCKET_BOUNDARIES,
+    )
+
+
+def use_offline_model(engine: str, token_cost: float = 0.0) -> None:
+    """
+    Points the shared model loader at the stub tokenizer and an offline engine,
+    "stub" or "tiny", and warms it up.
+    """
+    loader._tokenizer = StubTokenizer()
+    loader._engine = StubEngine(token_cost) if engine == "stub" else tiny_model_engine()
+    loader.warmup()
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """
+    One point of the benchmark grid.
+
+    Args:
+        batch_size: Texts per request (int).
+        lengths: The text length distribution, a key of ``TEXT_LENGTHS`` (str).
+        hit_ratio: Fraction of each request's texts already cached (float).
+        concurrency: Requests in flight at once (int).
+    """
+
+    batch_size: int
+    lengths: str
+    hit_ratio: float
+    concurrency: int
+
+    @property
+    def key(self) -> str:
+        return (
+            f"batch={self.batch_size} lengths={self.lengths} "
+            f"hits={self.hit_ratio:g} concurrency={self.concurrency}"
+        )
+
+
+def make_texts(count: int, lengths: str, rng: random.Random, prefix: str) -> list[str]:
+    """
+    Generates ``count`` distinct texts with word counts drawn from ``TEXT_LENGTHS``.
+    """
+    texts: list[str] = []
+    for index in range(count):
+        low, high = rng.choice(TEXT_LENGTHS[lengths])
+        words: list[str] = rng.choices(WORDS, k=rng.randint(low, high))
+        texts.append(f"{prefix}-{index} {' '.join(words)}")
+    return texts
+
+
+async def post_json(app: ASGIApp, path: str, body: bytes) -> int:
+    """
+    Sends a POST request straight to the ASGI application and returns the response
+    status once the whole body has been sent.
+    """
+    scope: dict[str, Any] = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"host", b"testserver"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ],
+        "client": ("127.0.0.1", 0),
+        "server": ("testserver", 80),
+    }
+    messages: list[dict[str, Any]] = [{"type": "http.request", "body": body}]
+    disconnected: asyncio.Event = asyncio.Event()
+    response_status: int = 0
+
+    async def receive() -> dict[str, Any]:
+        if messages:
+            return messages.pop(0)
+        # The handler listens for a disconnect while the view runs
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: dict[str, Any]) -> None:
+        nonlocal response_status
+        if message["type"] == "http.response.start":
+            response_status = message["status"]
+
+    await app(scope, receive, send)
+    disconnected.set()
+    return response_status
+
+
+def _reset_state() -> None:
+    Analysis.objects.all().delete()
+    SentimentRollup.objects.all().delete()
+    SentimentResult.objects.all().delete()
+    result_cache.local.clear()
+    cache.clear()
+
+
+@override_settings(CACHES=BENCHMARK_CACHES)
+async def run_scenario(
+    app: ASGIApp, scenario: Scenario, requests: int, seed: int = 0
+) -> dict[str, Any]:
+    """
+    Posts ``requests`` bulk analyses of ``scenario.batch_size`` texts to
+    ``/analyses/``, ``scenario.concurrency`` at a time, and measures them.
+
+    All stored analyses and cached results are cleared first. The first
+    ``hit_ratio`` of each request's texts are then cached, so they are served
+    from the result cache. Results are cached in ``BENCHMARK_CACHES``, so the
+    configured cache is never cleared or written to.
+
+    Args:
+        app: The ASGI application (ASGIApp).
+        scenario: The scenario to run (Scenario).
+        requests: The number of requests (int).
+        seed: Seeds the generated texts (int).
+
+    Returns:
+        The scenario with its throughput, latency percentiles and error count.
+    """
+    await sync_to_async(_reset_state)()
+
+    rng: random.Random = random.Random(f"{seed}:{scenario.key}")
+    bodies: list[bytes] = []
+    cached: dict[str, dict[str, Any]] = {}
+    hits_per_request: int = round(scenario.batch_size * scenario.hit_ratio)
+    for request_index in range(requests):
+        texts: list[str] = make_texts(
+            scenario.batch_size, scenario.lengths, rng, prefix=f"r{request_index}"
+        )
+        for text in texts[:hits_per_request]:
+            cached[make_cache_key(text)] = {"sentiment": "neutral", "confidence_score": 0.5}
+        bodies.append(ORJSONRenderer.dumps({"texts": texts}))
+    await result_cache.aset_many(cached)
+    # Only the shared and durable tiers should be warm, like a freshly started worker
+    result_cache.local.clear()
+
+    latencies: list[float] = []
+    errors: int = 0
+    slots: asyncio.Semaphore = asyncio.Semaphore(scenario.concurrency)
+
+    async def _request(body: bytes) -> None:
+        nonlocal errors
+        async with slots:
+            start: float = time.perf_counter()
+            response_status: int = await post_json(app, "/analyses/", body)
+            latencies.append(time.perf_counter() - start)
+            if response_status != 201:
+                errors += 1
+
+    start: float = time.perf_counter()
+    await asyncio.gather(*(_request(body) for body in bodies))
+    seconds: float = time.perf_counter() - start
+
+    p50, p99 = np.percentile(latencies, [50, 99])
+    return {
+        **asdict(scenario),
+        "key": scenario.key,
+        "requests": requests,
+        "texts": requests * scenario.batch_size,
+        "errors": errors,
+        "seconds": round(seconds, 4),
+        "texts_per_second": round(requests * scenario.batch_size / seconds, 2),
+        "latency_ms": {
+            "p50": round(p50 * 1000, 3),
+            "p99": round(p99 * 1000, 3),
+            "mean": round(float(np.mean(latencies)) * 1000, 3),
+        },
+    }
+
+
+def run_metadata(engine: str) -> dict[str, Any]:
+    """
+    Describes the code and configuration a run was made with.
+    """
+    try:
+        commit: Optional[str] = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "commit": commit,
+        "engine": engine,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "settings": {
+            name: getattr(settings, name)
+            for name in (
+                "MAX_BATCH_SIZE",
+                "MAX_BATCH_WAIT_MS",
+                "TOKENIZER_WORKERS",
+                "INFERENCE_WORKERS",
+                "PIPELINE_QUEUE_SIZE",
+                "INFERENCE_BATCH_SIZE",
+                "INFERENCE_MAX_BATCH_TOKENS",
+                "INFERENCE_BUCKET_BOUNDARIES",
+                "TF_COMPILE",
+            )
+        },
+    }
+
+
+def compare_runs(
+    baseline: dict[str, Any], current: dict[str, Any], tolerance: float
+) -> list[str]:
+    """
+    Compares two benchmark runs scenario by scenario.
+
+    Args:
+        baseline: The earlier run, as written by the benchmark command (dict).
+        current: The new run (dict).
+        tolerance: The accepted relative slowdown, e.g. 0.1 for 10% (float).
+
+    Returns:
+        A description of each regression: lower throughput or a higher p99
+        latency than the baseline allows.
+    """
+    baseline_results: dict[str, dict[str, Any]] = {
+        result["key"]: result for result in baseline["results"]
+    }
+    regressions: list[str] = []
+    for result in current["results"]:
+        previous: Optional[dict[str, Any]] = baseline_results.get(result["key"])
+        if previous is None:
+            continue
+        if result["texts_per_second"] < previous["texts_per_second"] * (1 - tolerance):
+            regressions.append(
+                f"{result['key']}: {result['texts_per_second']} texts/s "
+                f"(was {previous['texts_per_second']})"
+            )
+        if result["latency_ms"]["p99"] > previous["latency_ms"]["p99"] * (1 + tolerance):
+            regressions.append(
+                f"{result['key']}: p99 {result['latency_ms']['p99']} ms "
+                f"(was {previous['latency_ms']['p99']})"
+            )
+    return regressions
+
@@ -0,0 +1,346 @@
+import hashlib
+import logging
+import sys
+import threading
+import time
+import unicodedata
+
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .batching import BatchHandler
+from .metrics import STAGE_SECONDS, TEXTS_REQUESTED, registry
+from .models import SentimentResult
+
+
+def build_model_id() -> str:
+    """
+    Builds the id of the model which produces results with the current settings.
+
+    Besides the model name and version, the id names the inference engine and its
+    precision, as the int8-quantized ONNX export does not return the same scores
+    as the TensorFlow model, and the long-text settings when that mode is on.
+
+    Returns:
+        The model id (str).
+    """
+    model_id: str = f"{settings.MODEL_NAME}:{settings.MODEL_VERSION}"
+    if settings.SENTIMENT_ENGINE == "onnx":
+        # export_onnx writes the quantized copy of the model to model.int8.onnx
+        precision: str = "int8" if ".int8." in Path(settings.ONNX_MODEL_PATH).name else "fp32"
+        model_id += f":onnx-{precision}"
+    else:
+        model_id += ":tf-fp32"
+    if settings.LONG_TEXT_MODE:
+        # Long texts get different results in long-text mode, so they are kept apart
+        model_id += (
+            f":long-{settings.LONG_TEXT_AGGREGATION}-{settings.LONG_TEXT_WINDOW_OVERLAP}"
+            f"x{settings.LONG_TEXT_MAX_WINDOWS}"
+        )
+    return model_id
+
+
+# Identifies the model which produced a result in cache keys and stored results
+MODEL_ID: str = build_model_id()
+CACHE_KEY_PREFIX: str = f"sentiment:{MODEL_ID}"
+
+
+def normalise_text(text: str) -> str:
+    """
+    Normalises a text so that trivially different copies share a cache entry.
+
+    Args:
+        text: The text to normalise (str).
+
+    Returns:
+        The NFC-normalised text without leading or trailing whitespace (str).
+    """
+    return unicodedata.normalize("NFC", text).strip()
+
+
+def text_hash(text: str) -> str:
+    """
+    Computes the fixed-length content hash of a text.
+
+    Args:
+        text: The text to hash (str).
+
+    Returns:
+        The SHA-256 hex digest of the normalised text (str).
+    """
+    return hashlib.sha256(normalise_text(text).encode("utf-8")).hexdigest()
+
+
+def make_cache_key(text: str) -> str:
+    """
+    Builds the cache key of a text's sentiment result.
+
+    Keys are namespaced by the model id, so swapping the model or the engine
+    never serves results computed by the previous one.
+
+    Args:
+        text: The analyzed text (str).
+
+    Returns:
+        The cache key (str).
+    """
+    return f"{CACHE_KEY_PREFIX}:{text_hash(text)}"
+
+
+def cache_key_hash(key: str) -> str:
+    """
+    Returns the text hash a cache key was built from.
+
+    Args:
+        key: A key built by ``make_cache_key`` (str).
+
+    Returns:
+        The SHA-256 hex digest of the normalised text (str).
+    """
+    return key.rpartition(":")[2]
+
+
+def _approximate_size(key: str, value: Any) -> int:
+    size: int = sys.getsizeof(key) + sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in value.items())
+    return size
+
+
+class LocalCache:
+    """
+    Bounded, per-process LRU cache with TTL-based eviction.
+
+    Entries are evicted least recently used first once either ``max_entries`` or
+    the approximate ``max_bytes`` is exceeded, and are dropped on access once
+    older than ``timeout`` seconds.
+
+    Args:
+        max_entries: Maximum number of cached entries (int).
+        max_bytes: Maximum approximate size of the cached keys and values (int).
+        timeout: Number of seconds an entry stays valid (float).
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, timeout: float) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.size: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+
+        # key -> (expiry time, approximate size, value), least recently used first
+        self._entries: OrderedDict[str, tuple[float, int, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_many(self, keys: list[str]) -> dict[str, Any]:
+        now: float = time.monotonic()
+        results: dict[str, Any] = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                expires_at, size, value = entry
+                if expires_at <= now:
+                    del self._entries[key]
+                    self.size -= size
+                    continue
+                self._entries.move_to_end(key)
+                results[key] = value
+
+            self.hits += len(results)
+            self.misses += len(keys) - len(results)
+        return results
+
+    def set_many(self, data: dict[str, Any]) -> None:
+        expires_at: float = time.monotonic() + self.timeout
+        with self._lock:
+            for key, value in data.items():
+                size: int = _approximate_size(key, value)
+                previous = self._entries.pop(key, None)
+                if previous is not None:
+                    self.size -= previous[1]
+                self._entries[key] = (expires_at, size, value)
+                self.size += size
+
+            while self._entries and (
+                len(self._entries) > self.max_entries or self.size > self.max_bytes
+            ):
+                _, (_, size, _) = self._entries.popitem(last=False)
+                self.size -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+class ResultCache:
+    """
+    Tiered sentiment result cache.
+
+    Lookups go to the per-process ``LocalCache`` first and only the remaining keys
+    are fetched from the shared Django (Redis) cache, with a single ``get_many``.
+    With ``durable`` set, keys missing from Redis are then looked up by text hash
+    in the ``SentimentResult`` table with a single query, so results survive Redis
+    evictions and restarts. Hits are copied into the faster tiers and hits and
+    misses are counted per tier.
+
+    Args:
+        local: The in-process cache tier (LocalCache).
+        timeout: Number of seconds results stay in the shared cache (int).
+        durable: Whether to store and look up results in Postgres (bool).
+    """
+
+    def __init__(self, local: LocalCache, timeout: int, durable: bool = False) -> None:
+        self.local = local
+        self.timeout = timeout
+        self.durable = durable
+        self.shared_hits: int = 0
+        self.shared_misses: int = 0
+        self.durable_hits: int = 0
+        self.durable_misses: int = 0
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """Returns the hit and miss counters of each tier."""
+        stats: dict[str, dict[str, int]] = {
+            "local": {"hits": self.local.hits, "misses": self.local.misses},
+            "shared": {"hits": self.shared_hits, "misses": self.shared_misses},
+        }
+        if self.durable:
+            stats["durable"] = {"hits": self.durable_hits, "misses": self.durable_misses}
+        return stats
+
+    async def aget_many(self, keys: list[str]) -> dict[str, Any]:
+        results: dict[str, Any] = self.local.get_many(keys)
+        missing_keys: list[str] = [key for key in keys if key not in results]
+        if not missing_keys:
+            return results
+
+        shared_results: dict[str, Any] = await cache.aget_many(missing_keys)
+        self.shared_hits += len(shared_results)
+        self.shared_misses += len(missing_keys) - len(shared_results)
+
+        self.local.set_many(shared_results)
+        results.update(shared_results)
+
+        missing_keys = [key for key in missing_keys if key not in shared_results]
+        if self.durable and missing_keys:
+            stored_results: dict[str, Any] = await self._aget_stored(missing_keys)
+            self.durable_hits += len(stored_results)
+            self.durable_misses += len(missing_keys) - len(stored_results)
+            if stored_results:
+                self.local.set_many(stored_results)
+                await cache.aset_many(stored_results, timeout=self.timeout)
+                results.update(stored_results)
+
+        return results
+
+    async def aset_many(self, data: dict[str, Any]) -> None:
+        if not data:
+            return
+        self.local.set_many(data)
+        await cache.aset_many(data, timeout=self.timeout)
+        if self.durable:
+            await SentimentResult.objects.abulk_create(
+                [
+                    SentimentResult(
+                        text_hash=cache_key_hash(key),
+                        model=MODEL_ID,
+                        sentiment=result["sentiment"],
+                        confidence_score=result["confidence_score"],
+                    )
+                    for key, result in data.items()
+                ],
+                # Concurrent requests may have stored the same text in the meantime
+                ignore_conflicts=True,
+            )
+
+    async def _aget_stored(self, keys: list[str]) -> dict[str, Any]:
+        keys_by_hash: dict[str, str] = {cache_key_hash(key): key for key in keys}
+        stored_results: dict[str, Any] = {}
+        rows = SentimentResult.objects.filter(
+            model=MODEL_ID, text_hash__in=keys_by_hash
+        ).values_list("text_hash", "sentiment", "confidence_score")
+        async for stored_hash, sentiment, confidence_score in rows:
+            stored_results[keys_by_hash[stored_hash]] = {
+                "sentiment": sentiment,
+                "confidence_score": confidence_score,
+            }
+        return stored_results
+
+
+result_cache: ResultCache = ResultCache(
+    LocalCache(
+        max_entries=settings.LOCAL_CACHE_MAX_ENTRIES,
+        max_bytes=settings.LOCAL_CACHE_MAX_BYTES,
+        timeout=settings.LOCAL_CACHE_TIMEOUT,
+    ),
+    timeout=settings.SENTIMENT_CACHE_TIMEOUT,
+    durable=True,
+)
+
+
+async def get_sentiment_results(
+    texts: list[str], analyse: BatchHandler
+) -> list[dict[str, float]]:
+    """
+    Looks up the sentiment of each text in the result cache and analyses the misses.
+
+    Texts are deduplicated by cache key and looked up in every tier of
+    ``result_cache``. Successful new results are stored with a single ``set_many``.
+
+    Args:
+        texts: The texts to analyse (list[str]).
+        analyse: Coroutine function analysing the texts missing from the cache
+            (BatchHandler).
+
+    Returns:
+        A list of sentiment results in the same order as ``texts``.
+    """
+    cache_keys: list[str] = [make_cache_key(text) for text in texts]
+    unique_texts: dict[str, str] = {}
+    for cache_key, text in zip(cache_keys, texts):
+        unique_texts.setdefault(cache_key, text)
+
+    TEXTS_REQUESTED.inc(len(texts))
+    with STAGE_SECONDS.time(stage="cache_lookup"):
+        results: dict[str, dict[str, float]] = await result_cache.aget_many(
+            list(unique_texts)
+        )
+    logging.info(
+        f"{len(results)} of {len(unique_texts)} sentiment results retrieved from cache."
+    )
+
+    uncached_keys: list[str] = [key for key in unique_texts if key not in results]
+    if uncached_keys:
+        analysed_results: list[dict[str, float]] = await analyse(
+            [unique_texts[key] for key in uncached_keys]
+        )
+        new_results: dict[str, dict[str, float]] = dict(zip(uncached_keys, analysed_results))
+        results.update(new_results)
+        await result_cache.aset_many(
+            {key: result for key, result in new_results.items() if "error" not in result}
+        )
+
+    return [results[cache_key] for cache_key in cache_keys]
+
+
+registry.callback(
+    "sentiment_cache_lookups_total",
+    "Result cache lookups per tier and result.",
+    "counter",
+    lambda: [
+        ({"tier": tier, "result": result}, counts["hits" if result == "hit" else "misses"])
+        for tier, counts in result_cache.stats().items()
+        for result in ("hit", "miss")
+    ],
+)
@@ -0,0 +1,325 @@
+import logging
+import threading
+
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Optional, Protocol, Union
+
+import numpy as np
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+if TYPE_CHECKING:
+    import onnxruntime
+    from transformers import TFAutoModelForSequenceClassification
+
+
+class InferenceError(Exception):
+    """Raised when an inference engine fails to run a batch."""
+
+
+class InferenceEngine(Protocol):
+    """
+    Runs padded batches of encoded texts through a sentiment model.
+
+    ``predict`` takes a dict of int32 arrays of shape (batch size, sequence length)
+    keyed by model input name and returns the index of the top label and its
+    probability for each row. ``predict_logits`` returns the logits of every label
+    instead, for results which are combined from several rows.
+    """
+
+    name: str
+
+    def predict(self, batch: dict[str, np.ndarray]) -> tuple[np.ndarray, np.ndarray]: ...
+
+    def predict_logits(self, batch: dict[str, np.ndarray]) -> np.ndarray: ...
+
+
+class TFEngine:
+    """
+    Runs the TensorFlow model.
+
+    With ``compiled`` set, batches are run through a ``tf.function`` per length
+    bucket instead of eager Keras dispatch. Each batch is padded up to the smallest
+    of ``bucket_boundaries`` that fits it, so only one input signature per bucket is
+    ever traced, and softmax and argmax run inside the graph so only the label index
+    and score are copied back to Python. ``trace_count`` counts every (re)trace,
+    and ``trace_counts`` the traces per padded sequence length.
+
+    Args:
+        model: The loaded sequence classification model.
+        compiled: Whether to run batches through compiled graphs (bool).
+        jit_compile: Whether to compile the graphs with XLA (bool).
+        bucket_boundaries: The sequence lengths batches are padded to (list[int]).
+    """
+
+    name: str = "tf"
+
+    def __init__(
+        self,
+        model: "TFAutoModelForSequenceClassification",
+        compiled: bool = False,
+        jit_compile: bool = False,
+        bucket_boundaries: Optional[list[int]] = None,
+    ) -> None:
+        self.model = model
+        self.compiled = compiled
+        self.jit_compile = jit_compile
+        self.bucket_boundaries: list[int] = sorted(bucket_boundaries or [])
+        self.trace_count: int = 0
+        self.trace_counts: dict[int, int] = {}
+
+        self._functions: dict[tuple[int, bool], Callable] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_pretrained(cls, model_name: str) -> "TFEngine":
+        import tensorflow as tf
+        from transformers import TFAutoModelForSequenceClassification
+
+        # Must be configured before TensorFlow runs its first operation
+        try:
+            if settings.TF_INTRA_OP_THREADS:
+                tf.config.threading.set_intra_op_parallelism_threads(
+                    settings.TF_INTRA_OP_THREADS
+                )
+            if settings.TF_INTER_OP_THREADS:
+                tf.config.threading.set_inter_op_parallelism_threads(
+                    settings.TF_INTER_OP_THREADS
+                )
+        except RuntimeError as e:
+            logging.warning("Could not configure TensorFlow threads: %s", e)
+
+        logging.info("Loading TensorFlow sentiment model '%s'.", model_name)
+        return cls(
+            TFAutoModelForSequenceClassification.from_pretrained(model_name),
+            compiled=settings.TF_COMPILE,
+            jit_compile=settings.TF_JIT_COMPILE,
+            bucket_boundaries=settings.INFERENCE_BUCKET_BOUNDARIES,
+        )
+
+    def predict(self, batch: dict[str, np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+        import tensorflow as tf
+
+        try:
+            if self.compiled:
+                batch = self._pad_to_bucket(batch)
+                function: Callable = self._get_function(batch)
+                top_indices, top_predictions = function(
+                    {name: tf.constant(values) for name, values in batch.items()}
+                )
+                return top_indices.numpy(), top_predictions.numpy()
+
+            outputs: dict = self.model(
+                {name: tf.constant(values) for name, values in batch.items()}
+            )
+            predictions: tf.Tensor = tf.nn.softmax(outputs.logits, axis=-1)
+            top_predictions, top_indices = tf.nn.top_k(predictions, k=1)
+        except (tf.errors.OutOfRangeError, tf.errors.InvalidArgumentError) as e:
+            # Handle potential TensorFlow errors (e.g., out-of-range tensor indices)
+            raise InferenceError("TensorFlow error") from e
+
+        return top_indices.numpy()[:, 0], top_predictions.numpy()[:, 0]
+
+    def predict_logits(self, batch: dict[str, np.ndarray]) -> np.ndarray:
+        import tensorflow as tf
+
+        try:
+            if self.compiled:
+                batch = self._pad_to_bucket(batch)
+                function: Callable = self._get_function(batch, logits=True)
+                logits: tf.Tensor = function(
+                    {name: tf.constant(values) for name, values in batch.items()}
+                )
+                return logits.numpy()
+
+            outputs: dict = self.model(
+                {name: tf.constant(values) for name, values in batch.items()}
+            )
+        except (tf.errors.OutOfRangeError, tf.errors.InvalidArgumentError) as e:
+            raise InferenceError("TensorFlow error") from e
+
+        return outputs.logits.numpy()
+
+    def _pad_to_bucket(self, batch: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+        width: int = batch["input_ids"].shape[1]
+        bucket_width: int = next(
+            (boundary for boundary in self.bucket_boundaries if boundary >= width), width
+        )
+        if bucket_width == width:
+            return batch
+
+        padded: dict[str, np.ndarray] = {}
+        for name, values in batch.items():
+            pad_value: int = self.model.config.pad_token_id if name == "input_ids" else 0
+            padded[name] = np.pad(
+                values, ((0, 0), (0, bucket_width - width)), constant_values=pad_value
+            )
+        return padded
+
+    def _get_function(self, batch: dict[str, np.ndarray], logits: bool = False) -> Callable:
+        key: tuple[int, bool] = (batch["input_ids"].shape[1], logits)
+        if key not in self._functions:
+            with self._lock:
+                if key not in self._functions:
+                    self._functions[key] = self._compile(list(batch), *key)
+        return self._functions[key]
+
+    def _compile(self, input_names: list[str], width: int, logits: bool = False) -> Callable:
+        import tensorflow as tf
+
+        def serve(inputs: dict[str, tf.Tensor]) -> Union[tf.Tensor, tuple[tf.Tensor, tf.Tensor]]:
+            # Python side effects only run while tracing
+            self.trace_count += 1
+            self.trace_counts[width] = self.trace_counts.get(width, 0) + 1
+            logging.info("Tracing sentiment model graph for sequence length %d.", width)
+
+            outputs: tf.Tensor = self.model(inputs, training=False).logits
+            if logits:
+                return outputs
+            predictions: tf.Tensor = tf.nn.softmax(outputs, axis=-1)
+            return (
+                tf.argmax(predictions, axis=-1, output_type=tf.int32),
+                tf.reduce_max(predictions, axis=-1),
+            )
+
+        input_signature: dict[str, tf.TensorSpec] = {
+            name: tf.TensorSpec((None, width), tf.int32, name=name) for name in input_names
+        }
+        return tf.function(
+            serve,
+            input_signature=[input_signature],
+            jit_compile=self.jit_compile,
+            autograph=False,
+        )
+
+
+class ONNXEngine:
+    """
+    Runs an ONNX export of the model, usually int8-quantized, with ONNX Runtime on
+    the CPU. See the ``export_onnx`` management command.
+
+    With ``shared_weights`` set, the weights are memory-mapped read-only from the
+    external data file next to the model (see ``save_external_weights``) instead of
+    being copied into each process, so all web workers on a host share one copy in
+    the page cache.
+
+    Args:
+        session: The ONNX Runtime inference session.
+    """
+
+    name: str = "onnx"
+
+    def __init__(self, session: "onnxruntime.InferenceSession") -> None:
+        self.session = session
+        self.input_names: list[str] = [
+            model_input.name for model_input in session.get_inputs()
+        ]
+
+    @classmethod
+    def from_path(cls, model_path: str, shared_weights: bool = False) -> "ONNXEngine":
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImproperlyConfigured(
+                'SENTIMENT_ENGINE "onnx" requires the onnxruntime package.'
+            ) from e
+
+        options = onnxruntime.SessionOptions()
+        if settings.TF_INTRA_OP_THREADS:
+            options.intra_op_num_threads = settings.TF_INTRA_OP_THREADS
+        if settings.TF_INTER_OP_THREADS:
+            options.inter_op_num_threads = settings.TF_INTER_OP_THREADS
+        if shared_weights:
+            if not Path(f"{model_path}.data").exists():
+                raise ImproperlyConfigured(
+                    f"SHARED_MODEL_WEIGHTS requires the weights of {model_path} in "
+                    f"{model_path}.data. Run manage.py export_onnx --shared-weights."
+                )
+            # Pre-packing copies weights into the layout of the fastest kernels,
+            # which would give every process its own copy again
+            options.add_session_config_entry("session.disable_prepacking", "1")
+
+        logging.info("Loading ONNX sentiment model '%s'.", model_path)
+        return cls(
+            onnxruntime.InferenceSession(
+                model_path, sess_options=options, providers=["CPUExecutionProvider"]
+            )
+        )
+
+    def predict(self, batch: dict[str, np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+        logits: np.ndarray = self.predict_logits(batch)
+        exponents: np.ndarray = np.exp(logits - logits.max(axis=-1, keepdims=True))
+        predictions: np.ndarray = exponents / exponents.sum(axis=-1, keepdims=True)
+        top_indices: np.ndarray = predictions.argmax(axis=-1)
+        return top_indices, predictions[np.arange(len(predictions)), top_indices]
+
+    def predict_logits(self, batch: dict[str, np.ndarray]) -> np.ndarray:
+        from onnxruntime.capi.onnxruntime_pybind11_state import (
+            Fail,
+            InvalidArgument,
+            RuntimeException,
+        )
+
+        try:
+            (logits,) = self.session.run(
+                ["logits"], {name: batch[name] for name in self.input_names}
+            )
+        except (Fail, InvalidArgument, RuntimeException) as e:
+            raise InferenceError("ONNX Runtime error") from e
+        return logits
+
+
+def save_external_weights(model_path: str) -> str:
+    """
+    Moves the weights of an ONNX model out of the model file into
+    ``<model_path>.data`` next to it.
+
+    ONNX Runtime memory-maps external weights rather than reading them into the
+    process, which lets every worker share them (see ``SHARED_MODEL_WEIGHTS``).
+    Small tensors, such as shapes, stay in the model file.
+
+    Args:
+        model_path: The ONNX model to rewrite (str).
+
+    Returns:
+        The path of the weights file (str).
+    """
+    import onnx
+
+    model = onnx.load(model_path)
+    weights_path = Path(f"{model_path}.data")
+    # Tensors are appended to an existing weights file
+    weights_path.unlink(missing_ok=True)
+    onnx.save(
+        model,
+        model_path,
+        save_as_external_data=True,
+        all_tensors_to_one_file=True,
+        location=weights_path.name,
+    )
+    return str(weights_path)
+
+
+def load_engine(engine: str) -> InferenceEngine:
+    """
+    Loads the inference engine selected by the ``SENTIMENT_ENGINE`` setting.
+
+    Args:
+        engine: The engine name, "tf" or "onnx" (str).
+
+    Returns:
+        The loaded engine (InferenceEngine).
+    """
+    if engine == TFEngine.name:
+        if settings.SHARED_MODEL_WEIGHTS:
+            raise ImproperlyConfigured(
+                'SHARED_MODEL_WEIGHTS requires SENTIMENT_ENGINE "onnx", TensorFlow '
+                "keeps a copy of the weights in every process."
+            )
+        return TFEngine.from_pretrained(settings.MODEL_NAME)
+    if engine == ONNXEngine.name:
+        return ONNXEngine.from_path(
+            settings.ONNX_MODEL_PATH, shared_weights=settings.SHARED_MODEL_WEIGHTS
+        )
+    raise ImproperlyConfigured(f'Unknown SENTIMENT_ENGINE "{engine}".')
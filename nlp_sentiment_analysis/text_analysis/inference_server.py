@@ -0,0 +1,371 @@
+import asyncio
+import logging
+import os
+import stat
+import struct
+import time
+
+from typing import Any, Callable, Optional
+
+from django.conf import settings
+
+from .batching import BatchHandler, QueueFull
+from .metrics import registry
+
+PROTOCOL_VERSION: int = 1
+
+OP_ANALYSE: int = 1
+OP_PING: int = 2
+
+STATUS_OK: int = 0
+STATUS_QUEUE_FULL: int = 1
+STATUS_ERROR: int = 2
+STATUS_NOT_READY: int = 3
+
+# Stands in for the label index of results which are errors
+ERROR_LABEL: int = 255
+
+# Every message is prefixed with the length of its payload
+_FRAME = struct.Struct("!I")
+# Protocol version, operation and number of texts, followed by the byte length of
+# each text and then the UTF-8 encoded texts
+_REQUEST_HEADER = struct.Struct("!BBI")
+# Label index and confidence score, followed by the length and UTF-8 encoded
+# message for errors
+_RESULT = struct.Struct("!Bf")
+_ERROR_LENGTH = struct.Struct("!H")
+
+REMOTE_FALLBACKS = registry.counter(
+    "sentiment_inference_server_fallbacks_total",
+    "Texts analysed in-process because the inference server was unavailable.",
+)
+
+
+class ProtocolError(Exception):
+    """Raised for messages which do not follow the inference server protocol."""
+
+
+class RemoteEngineError(Exception):
+    """Raised when the inference server cannot be reached or does not answer."""
+
+
+def encode_request(op: int, texts: list[str]) -> bytes:
+    encoded: list[bytes] = [text.encode() for text in texts]
+    return b"".join(
+        [
+            _REQUEST_HEADER.pack(PROTOCOL_VERSION, op, len(encoded)),
+            struct.pack(f"!{len(encoded)}I", *map(len, encoded)),
+            *encoded,
+        ]
+    )
+
+
+def decode_request(payload: bytes) -> tuple[int, list[str]]:
+    try:
+        version, op, count = _REQUEST_HEADER.unpack_from(payload)
+        if version != PROTOCOL_VERSION:
+            raise ProtocolError(f"Unsupported protocol version {version}.")
+        lengths: tuple[int, ...] = struct.unpack_from(
+            f"!{count}I", payload, _REQUEST_HEADER.size
+        )
+        texts: list[str] = []
+        offset: int = _REQUEST_HEADER.size + 4 * count
+        for length in lengths:
+            texts.append(payload[offset : offset + length].decode())
+            offset += length
+    except (struct.error, UnicodeDecodeError) as e:
+        raise ProtocolError(f"Malformed request: {e}") from e
+    if offset != len(payload):
+        raise ProtocolError("Malformed request: the texts do not match their lengths.")
+    return op, texts
+
+
+def encode_results(results: list[dict[str, Any]]) -> bytes:
+    parts: list[bytes] = []
+    for result in results:
+        if "error" in result:
+            message: bytes = str(result["error"]).encode()[:65535]
+            parts.append(_RESULT.pack(ERROR_LABEL, 0.0))
+            parts.append(_ERROR_LENGTH.pack(len(message)) + message)
+        else:
+            label: int = settings.SENTIMENT_LABELS.index(result["sentiment"])
+            parts.append(_RESULT.pack(label, result["confidence_score"]))
+    return b"".join(parts)
+
+
+def decode_results(payload: bytes) -> list[dict[str, Any]]:
+    results: list[dict[str, Any]] = []
+    offset: int = 0
+    try:
+        while offset < len(payload):
+            label, score = _RESULT.unpack_from(payload, offset)
+            offset += _RESULT.size
+            if label == ERROR_LABEL:
+                (length,) = _ERROR_LENGTH.unpack_from(payload, offset)
+                offset += _ERROR_LENGTH.size
+                results.append({"error": payload[offset : offset + length].decode()})
+                offset += length
+            else:
+                results.append(
+                    {"sentiment": settings.SENTIMENT_LABELS[label], "confidence_score": score}
+                )
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise ProtocolError(f"Malformed response: {e}") from e
+    return results
+
+
+def frame(payload: bytes) -> bytes:
+    return _FRAME.pack(len(payload)) + payload
+
+
+async def read_frame(reader: asyncio.StreamReader, max_bytes: Optional[int] = None) -> bytes:
+    """
+    Reads the payload of one message.
+
+    Raises:
+        asyncio.IncompleteReadError: If the connection is closed first.
+        ProtocolError: If the payload is larger than ``max_bytes``.
+    """
+    (length,) = _FRAME.unpack(await reader.readexactly(_FRAME.size))
+    if max_bytes is not None and length > max_bytes:
+        raise ProtocolError(f"Message of {length} bytes exceeds {max_bytes} bytes.")
+    return await reader.readexactly(length)
+
+
+class InferenceServer:
+    """
+    Analyses texts for the web workers of a host over a Unix domain socket.
+
+    Each connection carries one request at a time. Texts of all connections are
+    passed to the same handler, usually the ``submit`` method of the process's
+    batch scheduler, so texts from different web workers share forward passes.
+    Pings are answered as soon as ``is_ready`` returns True.
+
+    Args:
+        handler: Coroutine function analysing a list of texts (BatchHandler).
+        socket_path: The path of the Unix domain socket (str).
+        is_ready: Whether the model has been loaded (Callable[[], bool]).
+        max_frame_bytes: The size limit of requests, ``MAX_REQUEST_BODY_BYTES`` by
+            default (Optional[int]).
+    """
+
+    def __init__(
+        self,
+        handler: BatchHandler,
+        socket_path: str,
+        is_ready: Callable[[], bool] = lambda: True,
+        max_frame_bytes: Optional[int] = None,
+    ) -> None:
+        self.handler = handler
+        self.socket_path = socket_path
+        self.is_ready = is_ready
+        self.max_frame_bytes: int = max_frame_bytes or settings.MAX_REQUEST_BODY_BYTES
+
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: set[asyncio.Task] = set()
+
+    async def start(self) -> None:
+        # Remove the socket of a server which was not shut down cleanly
+        if os.path.exists(self.socket_path) and stat.S_ISSOCK(
+            os.stat(self.socket_path).st_mode
+        ):
+            os.unlink(self.socket_path)
+        self._server = await asyncio.start_unix_server(
+            self._handle_connection, path=self.socket_path
+        )
+
+    async def close(self) -> None:
+        if self._server is None:
+            return
+        self._server.close()
+        # Pooled connections stay open until the server closes them, and
+        # requests still being analysed are abandoned
+        connections: list[asyncio.Task] = list(self._connections)
+        for task in connections:
+            task.cancel()
+        await asyncio.gather(*connections, return_exceptions=True)
+        await self._server.wait_closed()
+        self._server = None
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        task: Optional[asyncio.Task] = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                try:
+                    payload: bytes = await read_frame(reader, self.max_frame_bytes)
+                except asyncio.IncompleteReadError:
+                    break
+                except ProtocolError as e:
+                    # The rest of the message is still unread, so the connection is lost
+                    writer.write(frame(bytes([STATUS_ERROR]) + str(e).encode()))
+                    await writer.drain()
+                    break
+
+                writer.write(frame(await self._respond(payload)))
+                await writer.drain()
+        except ConnectionError as e:
+            logging.warning("An inference server connection failed: %s", e)
+        except asyncio.CancelledError:
+            # Only raised by close, which waits for the connection to end
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def _respond(self, payload: bytes) -> bytes:
+        try:
+            op, texts = decode_request(payload)
+        except ProtocolError as e:
+            return bytes([STATUS_ERROR]) + str(e).encode()
+
+        if op == OP_PING:
+            return bytes([STATUS_OK if self.is_ready() else STATUS_NOT_READY])
+        if op != OP_ANALYSE:
+            return bytes([STATUS_ERROR]) + f"Unknown operation {op}.".encode()
+
+        try:
+            results: list[dict[str, Any]] = await self.handler(texts)
+        except QueueFull as e:
+            return bytes([STATUS_QUEUE_FULL]) + str(e).encode()
+        except Exception as e:
+            logging.error("An error occurred while serving an analysis: %s", e)
+            return bytes([STATUS_ERROR]) + str(e).encode()
+        return bytes([STATUS_OK]) + encode_results(results)
+
+
+class RemoteEngine:
+    """
+    Analyses texts on the inference server (see the ``run_inference_server``
+    management command) instead of in this process.
+
+    Up to ``pool_size`` connections are opened and kept for later requests, each
+    carrying one request at a time. Requests which are not answered within
+    ``timeout`` seconds fail with ``RemoteEngineError``. After a failure, the
+    engine reports itself as unavailable for ``retry_after`` seconds, so callers
+    can fall back to in-process inference without waiting for every request to
+    time out.
+
+    Args:
+        socket_path: The path of the server's Unix domain socket (str).
+        pool_size: The maximum number of open connections (int).
+        timeout: Seconds to wait for a response (float).
+        retry_after: Seconds to skip the server after a failure (float).
+    """
+
+    name: str = "remote"
+
+    def __init__(
+        self, socket_path: str, pool_size: int, timeout: float, retry_after: float
+    ) -> None:
+        self.socket_path = socket_path
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retry_after = retry_after
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._idle: list[tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._down_until: float = 0.0
+
+    @property
+    def available(self) -> bool:
+        """False for ``retry_after`` seconds after a failed request."""
+        return time.monotonic() >= self._down_until
+
+    async def analyse(self, texts: list[str]) -> list[dict[str, Any]]:
+        """
+        Analyses texts on the server.
+
+        Args:
+            texts: The texts to analyze (list[str]).
+
+        Returns:
+            A list of sentiment results in the same order as ``texts``.
+
+        Raises:
+            QueueFull: If the server's inference queue cannot take the texts.
+            RemoteEngineError: If the server is unavailable or fails.
+        """
+        response: bytes = await self._request(encode_request(OP_ANALYSE, texts))
+        status: int = response[0]
+        if status == STATUS_QUEUE_FULL:
+            raise QueueFull(response[1:].decode())
+        if status != STATUS_OK:
+            raise RemoteEngineError(f"The inference server failed: {response[1:].decode()}")
+
+        try:
+            results: list[dict[str, Any]] = decode_results(response[1:])
+        except ProtocolError as e:
+            raise RemoteEngineError(str(e)) from e
+        if len(results) != len(texts):
+            raise RemoteEngineError(
+                f"The inference server returned {len(results)} results for {len(texts)} texts."
+            )
+        return results
+
+    async def ping(self) -> bool:
+        """Whether the server is reachable and has loaded its model."""
+        try:
+            response: bytes = await self._request(encode_request(OP_PING, []))
+        except RemoteEngineError:
+            return False
+        return response[:1] == bytes([STATUS_OK])
+
+    async def _request(self, request: bytes) -> bytes:
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Connections and semaphores are bound to the loop they were created on
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.pool_size)
+            self._idle = []
+
+        async with self._slots:
+            while True:
+                reused: bool = bool(self._idle)
+                try:
+                    connection: tuple[asyncio.StreamReader, asyncio.StreamWriter] = (
+                        self._idle.pop()
+                        if reused
+                        else await asyncio.wait_for(
+                            asyncio.open_unix_connection(self.socket_path), self.timeout
+                        )
+                    )
+                except (OSError, asyncio.TimeoutError) as e:
+                    raise self._failed(e)
+
+                try:
+                    response: bytes = await asyncio.wait_for(
+                        self._exchange(connection, request), self.timeout
+                    )
+                except (OSError, EOFError, asyncio.TimeoutError, ProtocolError) as e:
+                    connection[1].close()
+                    # Pooled connections go stale when the server restarts
+                    if reused and isinstance(e, (ConnectionError, EOFError)):
+                        continue
+                    raise self._failed(e)
+                except BaseException:
+                    # A cancelled request leaves the connection in an unknown state
+                    connection[1].close()
+                    raise
+
+                self._idle.append(connection)
+                return response
+
+    async def _exchange(
+        self, connection: tuple[asyncio.StreamReader, asyncio.StreamWriter], request: bytes
+    ) -> bytes:
+        reader, writer = connection
+        writer.write(frame(request))
+        await writer.drain()
+        return await read_frame(reader)
+
+    def _failed(self, error: Exception) -> RemoteEngineError:
+        self._down_until = time.monotonic() + self.retry_after
+        return RemoteEngineError(
+            f"The inference server at {self.socket_path} is unavailable: {error!r}"
+        )
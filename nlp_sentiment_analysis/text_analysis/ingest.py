@@ -0,0 +1,180 @@
+import csv
+import io
+import json
+
+from datetime import datetime
+from pathlib import Path
+from typing import Any, BinaryIO, Iterator, Optional
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+
+# This module is imported by spawned worker processes before Django is set up, so
+# models and the model loader are only imported inside functions.
+
+
+def init_worker() -> None:
+    """Sets up Django and loads the model once per worker process."""
+    import django
+
+    django.setup()
+
+    from .analysis import loader
+
+    loader.engine
+
+
+def analyse_batch(texts: list[str]) -> list[dict[str, float]]:
+    """Analyses a batch of texts in a worker process."""
+    from .analysis import predict_sentiments
+
+    return predict_sentiments(texts)
+
+
+def _read_lines(file: BinaryIO, position: list[int]) -> Iterator[str]:
+    """
+    Yields the decoded lines of a file, keeping ``position[0]`` at the byte offset
+    after the last line yielded.
+    """
+    while line := file.readline():
+        position[0] = file.tell()
+        yield line.decode("utf-8")
+
+
+def read_texts(
+    path: Path, file_format: str, text_field: str, offset: int = 0
+) -> Iterator[tuple[str, int]]:
+    """
+    Streams the texts of a CSV or JSON Lines file without reading it into memory.
+
+    Args:
+        path: The file to read (Path).
+        file_format: "csv" or "jsonl" (str).
+        text_field: The CSV column or JSON key holding the text (str).
+        offset: The byte offset to resume reading from, 0 for the start (int).
+
+    Returns:
+        An iterator of (text, byte offset after the text's record) tuples.
+    """
+    with open(path, "rb") as file:
+        position: list[int] = [0]
+        lines: Iterator[str] = _read_lines(file, position)
+
+        if file_format == "csv":
+            # The header is needed to find the text column when resuming
+            header: list[str] = next(csv.reader(lines))
+            if text_field not in header:
+                raise ValueError(f'Column "{text_field}" not found in {path}.')
+            column: int = header.index(text_field)
+            if offset:
+                file.seek(offset)
+            # The reader only pulls lines as it needs them, so position stays at the
+            # end of the record it has just returned
+            for row in csv.reader(lines):
+                if row and row[column]:
+                    yield row[column], position[0]
+            return
+
+        if offset:
+            file.seek(offset)
+        start: int = offset
+        for line in lines:
+            if line.strip():
+                record: Any = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError(f"The line at byte {start} of {path} is not a JSON object.")
+                text: Optional[str] = record.get(text_field)
+                if text:
+                    yield text, position[0]
+            start = position[0]
+
+
+def batched_texts(
+    texts: Iterator[tuple[str, int]], batch_size: int
+) -> Iterator[tuple[list[str], int]]:
+    """
+    Groups streamed texts into batches.
+
+    Args:
+        texts: The (text, offset) tuples returned by ``read_texts``.
+        batch_size: The maximum number of texts per batch (int).
+
+    Returns:
+        An iterator of (texts, byte offset after the batch's last record) tuples.
+    """
+    batch: list[str] = []
+    offset: int = 0
+    for text, offset in texts:
+        batch.append(text)
+        if len(batch) >= batch_size:
+            yield batch, offset
+            batch = []
+    if batch:
+        yield batch, offset
+
+
+def copy_analyses(texts: list[str], sentiment_results: list[dict[str, float]]) -> None:
+    """
+    Inserts analyses with a single Postgres ``COPY``, which is considerably faster
+    than ``INSERT`` statements for large backfills, and adds them to the sentiment
+    rollup in the same transaction. Texts whose analysis failed are not saved.
+
+    Args:
+        texts: The analysed texts (list[str]).
+        sentiment_results: The sentiment result of each text (list[dict[str, float]]).
+    """
+    from .models import Analysis
+    from .rollups import update_rollups
+    from .storage import build_analyses
+
+    analyses: list[Analysis] = build_analyses(texts, sentiment_results)
+    created_at: datetime = timezone.now()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for analysis in analyses:
+        analysis.created_at = created_at
+        writer.writerow(
+            [
+                analysis.text,
+                analysis.sentiment,
+                analysis.confidence_score,
+                created_at.isoformat(),
+                analysis.text_hash,
+                analysis.model,
+            ]
+        )
+    buffer.seek(0)
+
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {Analysis._meta.db_table} "
+                "(text, sentiment, confidence_score, created_at, text_hash, model) "
+                "FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+        update_rollups(analyses)
+
+
+def read_checkpoint(name: str) -> int:
+    """
+    Returns the byte offset recorded in a checkpoint, 0 if there is none.
+    """
+    from .models import IngestCheckpoint
+
+    checkpoint: Optional[IngestCheckpoint] = IngestCheckpoint.objects.filter(name=name).first()
+    return checkpoint.offset if checkpoint is not None else 0
+
+
+def write_checkpoint(name: str, offset: int, rows: int) -> None:
+    """
+    Records the byte offset up to which the input has been persisted. Called in
+    the transaction which copies the analyses of a batch, so the checkpoint never
+    gets ahead of, or falls behind, the saved analyses.
+    """
+    from .models import IngestCheckpoint
+
+    IngestCheckpoint.objects.update_or_create(
+        name=name, defaults={"offset": offset, "rows": rows}
+    )
@@ -0,0 +1,221 @@
+import logging
+
+from collections import defaultdict
+from datetime import timedelta
+from itertools import islice
+from typing import Any, Iterable, Iterator
+
+from asgiref.sync import async_to_sync, sync_to_async
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .analysis import infer_sentiments, tokenize_texts
+from .caching import get_sentiment_results
+from .models import AnalysisJob, QueuedText
+from .storage import build_analyses, save_analyses
+
+
+@transaction.atomic
+def create_job(texts: Iterable[str]) -> AnalysisJob:
+    """
+    Creates a background analysis job and queues its texts.
+
+    Texts are inserted ``JOB_INSERT_BATCH_SIZE`` at a time, so an iterator, such as
+    the texts of an NDJSON body, is never read into a list.
+
+    Args:
+        texts: The texts to analyse (Iterable[str]).
+
+    Returns:
+        The created job (AnalysisJob).
+    """
+    job: AnalysisJob = AnalysisJob.objects.create()
+    iterator: Iterator[str] = iter(texts)
+    while batch := list(islice(iterator, settings.JOB_INSERT_BATCH_SIZE)):
+        QueuedText.objects.bulk_create(QueuedText(job=job, text=text) for text in batch)
+        job.total += len(batch)
+
+    job.save(update_fields=["total"])
+    logging.info(f"Queued analysis job {job.pk} with {job.total} texts.")
+    return job
+
+
+def claim_texts(batch_size: int) -> list[QueuedText]:
+    """
+    Claims up to ``batch_size`` queued texts for this worker.
+
+    The texts are selected with ``SELECT ... FOR UPDATE SKIP LOCKED`` and marked as
+    claimed in one short transaction, so workers running in parallel, on any
+    number of nodes, never claim the same text, and no row stays locked while the
+    texts are analysed. If a worker dies mid-batch, its texts are claimed again by
+    another worker once ``JOB_CLAIM_TIMEOUT`` has passed.
+
+    Args:
+        batch_size: The maximum number of texts to claim (int).
+
+    Returns:
+        The claimed texts, oldest first (list[QueuedText]).
+    """
+    now = timezone.now()
+    expired = now - timedelta(seconds=settings.JOB_CLAIM_TIMEOUT)
+    with transaction.atomic():
+        queued_texts: list[QueuedText] = list(
+            QueuedText.objects.select_for_update(skip_locked=True)
+            .filter(Q(claimed_at__isnull=True) | Q(claimed_at__lt=expired))
+            .order_by("id")[:batch_size]
+        )
+        if not queued_texts:
+            return []
+
+        QueuedText.objects.filter(pk__in=[queued.pk for queued in queued_texts]).update(
+            claimed_at=now
+        )
+        AnalysisJob.objects.filter(
+            pk__in=sorted({queued.job_id for queued in queued_texts}),
+            status=AnalysisJob.StatusChoices.PENDING,
+        ).update(status=AnalysisJob.StatusChoices.RUNNING, started_at=now)
+
+    for queued in queued_texts:
+        queued.claimed_at = now
+    return queued_texts
+
+
+def analyse_texts(texts: list[str]) -> list[dict[str, float]]:
+    """
+    Analyses texts like ``predict_sentiments``, but raises errors of the tokenizer
+    or the inference engine instead of returning them as the result of every
+    text, so the worker can tell them apart and retry the texts later.
+
+    Args:
+        texts: The texts to analyse (list[str]).
+
+    Returns:
+        A list with one dict per text, in the same order as ``texts``, containing
+        the predicted sentiment label and its confidence score.
+    """
+    return infer_sentiments(tokenize_texts(texts))
+
+
+def process_batch(batch_size: int) -> int:
+    """
+    Claims up to ``batch_size`` queued texts, analyses them and saves the results.
+
+    Texts are looked up in the result cache and only the misses are run through
+    the model, outside of any transaction. The texts of each job are saved
+    separately. If analysing or saving them raises, e.g. because the model could
+    not be loaded, the texts keep their claim and are retried once it expires, up
+    to ``JOB_MAX_ATTEMPTS`` times. Texts which still cannot be analysed are
+    counted as failed in their job and dropped from the queue, like texts for
+    which an error is returned, while the other texts of the job are saved.
+
+    Args:
+        batch_size: The maximum number of texts to claim (int).
+
+    Returns:
+        The number of texts processed, 0 once the queue is empty (int).
+    """
+    queued_texts: list[QueuedText] = claim_texts(batch_size)
+    if not queued_texts:
+        return 0
+
+    texts_by_job: defaultdict[int, list[QueuedText]] = defaultdict(list)
+    for queued in queued_texts:
+        texts_by_job[queued.job_id].append(queued)
+
+    for job_id, job_texts in sorted(texts_by_job.items()):
+        try:
+            _process_job_texts(job_id, job_texts)
+        except Exception as e:
+            logging.error(f"Analysing {len(job_texts)} texts of job {job_id} failed: {e}")
+            _retry_job_texts(job_id, job_texts, e)
+
+    logging.info(f"Processed {len(queued_texts)} queued texts of jobs {sorted(texts_by_job)}.")
+    return len(queued_texts)
+
+
+def _process_job_texts(job_id: int, queued_texts: list[QueuedText]) -> None:
+    """
+    Analyses the claimed texts of a job and saves their analyses, unless another
+    worker has taken over the claim in the meantime. Texts for which an error is
+    returned are counted as failed instead.
+    """
+    sentiment_results: list[dict[str, float]] = async_to_sync(get_sentiment_results)(
+        [queued.text for queued in queued_texts], sync_to_async(analyse_texts)
+    )
+
+    with transaction.atomic():
+        # Texts whose claim has expired are left to the worker which took them over
+        claimed: set[int] = _lock_claimed(queued_texts)
+        handled: list[tuple[QueuedText, dict[str, float]]] = [
+            (queued, result)
+            for queued, result in zip(queued_texts, sentiment_results)
+            if queued.pk in claimed
+        ]
+        if not handled:
+            return
+
+        saved = [(queued, result) for queued, result in handled if "error" not in result]
+        errors: list[str] = [result["error"] for _, result in handled if "error" in result]
+        save_analyses(
+            build_analyses(
+                [queued.text for queued, _ in saved],
+                [result for _, result in saved],
+                job_id=job_id,
+            )
+        )
+        QueuedText.objects.filter(pk__in=claimed).delete()
+        _update_job(job_id, processed=len(handled), errors=errors)
+
+
+def _retry_job_texts(job_id: int, queued_texts: list[QueuedText], error: Exception) -> None:
+    """
+    Counts a failed attempt for the claimed texts of a job, which are claimed again
+    once their claim expires. Texts which have run out of attempts are counted as
+    failed and dropped from the queue.
+    """
+    with transaction.atomic():
+        claimed: set[int] = _lock_claimed(queued_texts)
+        exhausted: set[int] = {
+            queued.pk
+            for queued in queued_texts
+            if queued.pk in claimed and queued.attempts + 1 >= settings.JOB_MAX_ATTEMPTS
+        }
+        QueuedText.objects.filter(pk__in=claimed - exhausted).update(attempts=F("attempts") + 1)
+        if exhausted:
+            QueuedText.objects.filter(pk__in=exhausted).delete()
+            _update_job(job_id, processed=len(exhausted), errors=[str(error)] * len(exhausted))
+
+
+def _lock_claimed(queued_texts: list[QueuedText]) -> set[int]:
+    """Locks the texts which are still claimed by this worker and returns their keys."""
+    return set(
+        QueuedText.objects.select_for_update()
+        .filter(
+            pk__in=[queued.pk for queued in queued_texts],
+            claimed_at=queued_texts[0].claimed_at,
+        )
+        .values_list("pk", flat=True)
+    )
+
+
+def _update_job(job_id: int, processed: int, errors: list[str]) -> None:
+    """
+    Adds processed and failed texts to the progress of a job, and finishes it once
+    all of its texts are processed. Jobs none of whose texts could be analysed are
+    marked as failed.
+    """
+    updates: dict[str, Any] = {"processed": F("processed") + processed}
+    if errors:
+        updates.update(failed=F("failed") + len(errors), error=errors[-1])
+    AnalysisJob.objects.filter(pk=job_id).update(**updates)
+
+    finished = AnalysisJob.objects.filter(
+        pk=job_id, status=AnalysisJob.StatusChoices.RUNNING, processed__gte=F("total")
+    )
+    finished.filter(failed__gte=F("total")).update(
+        status=AnalysisJob.StatusChoices.FAILED, finished_at=timezone.now()
+    )
+    finished.update(status=AnalysisJob.StatusChoices.DONE, finished_at=timezone.now())
@@ -0,0 +1,159 @@
+import multiprocessing
+import time
+
+from collections import deque
+from multiprocessing.pool import AsyncResult, Pool
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import transaction
+
+from ...ingest import (
+    analyse_batch,
+    batched_texts,
+    copy_analyses,
+    read_checkpoint,
+    read_texts,
+    init_worker,
+    write_checkpoint,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Analyses the texts of a CSV or JSON Lines file and saves the results. The "
+        "file is streamed, so it can be arbitrarily large, and an interrupted run "
+        "resumes from its last checkpoint."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("path", type=Path, help="CSV or JSON Lines file to analyse.")
+        parser.add_argument(
+            "--format",
+            choices=["csv", "jsonl"],
+            help="Input format. Guessed from the file extension by default.",
+        )
+        parser.add_argument(
+            "--text-field",
+            default="text",
+            help="CSV column or JSON key holding the text.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of worker processes, each loading its own copy of the model.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.JOB_BATCH_SIZE,
+            help="Number of texts analysed and saved at once.",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="Checkpoint name. Defaults to the absolute input path.",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore an existing checkpoint and start from the beginning.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Analyse the texts without saving the results or a checkpoint.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        path: Path = options["path"]
+        if not path.is_file():
+            raise CommandError(f"{path} does not exist.")
+        file_format: str = options["format"] or path.suffix.lstrip(".").lower()
+        if file_format == "json":
+            file_format = "jsonl"
+        if file_format not in ("csv", "jsonl"):
+            raise CommandError(f"Cannot guess the format of {path}, pass --format.")
+
+        dry_run: bool = options["dry_run"]
+        checkpoint: str = options["checkpoint"] or str(path.resolve())
+        offset: int = 0 if options["restart"] else read_checkpoint(checkpoint)
+        if offset:
+            self.stdout.write(f"Resuming {path} from byte {offset}.")
+
+        batches: Iterator[tuple[list[str], int]] = batched_texts(
+            read_texts(path, file_format, options["text_field"], offset),
+            options["batch_size"],
+        )
+
+        workers: int = options["workers"]
+        pool: Optional[Pool] = None
+        if workers > 1:
+            # Spawned rather than forked, as TensorFlow is not fork-safe
+            pool = multiprocessing.get_context("spawn").Pool(
+                workers, initializer=init_worker
+            )
+
+        rows: int = 0
+        failed: int = 0
+        started: float = time.monotonic()
+        try:
+            for texts, end_offset, sentiment_results in self._analyse_batches(
+                batches, pool, workers
+            ):
+                if not dry_run:
+                    with transaction.atomic():
+                        copy_analyses(texts, sentiment_results)
+                        write_checkpoint(checkpoint, end_offset, rows + len(texts))
+
+                rows += len(texts)
+                failed += sum("error" in result for result in sentiment_results)
+                elapsed: float = time.monotonic() - started
+                self.stdout.write(f"{rows} rows, {rows / elapsed:.1f} rows/sec", ending="\r")
+        except ValueError as e:
+            raise CommandError(str(e)) from e
+        finally:
+            if pool is not None:
+                pool.terminate()
+
+        elapsed = time.monotonic() - started
+        rate: float = rows / elapsed if elapsed else 0.0
+        self.stdout.write("")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Analysed {rows} rows in {elapsed:.1f}s ({rate:.1f} rows/sec)"
+                + (" without saving them." if dry_run else ".")
+            )
+        )
+        if failed:
+            self.stdout.write(
+                self.style.WARNING(f"{failed} rows could not be analysed and were skipped.")
+            )
+
+    def _analyse_batches(
+        self, batches: Iterator[tuple[list[str], int]], pool: Optional[Pool], workers: int
+    ) -> Iterator[tuple[list[str], int, list[dict[str, float]]]]:
+        """
+        Analyses batches in the worker pool, or in this process without one, and
+        yields them in input order.
+
+        At most two batches per worker are read ahead, so memory stays bounded
+        however large the input is.
+        """
+        if pool is None:
+            for texts, end_offset in batches:
+                yield texts, end_offset, analyse_batch(texts)
+            return
+
+        pending: deque[tuple[list[str], int, AsyncResult]] = deque()
+        for texts, end_offset in batches:
+            result: AsyncResult = pool.apply_async(analyse_batch, (texts,))
+            pending.append((texts, end_offset, result))
+            if len(pending) >= 2 * workers:
+                texts, end_offset, result = pending.popleft()
+                yield texts, end_offset, result.get()
+        while pending:
+            texts, end_offset, result = pending.popleft()
+            yield texts, end_offset, result.get()
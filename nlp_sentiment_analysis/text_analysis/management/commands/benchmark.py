@@ -0,0 +1,165 @@
+import asyncio
+import itertools
+import json
+
+from pathlib import Path
+from typing import Any, Callable
+
+from asgiref.sync import sync_to_async
+
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import connections
+from django.test import override_settings
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases
+
+from ...benchmark import (
+    TEXT_LENGTHS,
+    Scenario,
+    compare_runs,
+    run_metadata,
+    run_scenario,
+    use_offline_model,
+)
+
+
+def _list_of(cast: Callable[[str], Any]) -> Callable[[str], list[Any]]:
+    return lambda value: [cast(item) for item in value.split(",")]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks bulk analyses against the ASGI application in-process, offline, "
+        "over a grid of batch sizes, text lengths, cache hit ratios and concurrency "
+        "levels, and writes texts/sec and latency percentiles as JSON. Runs against "
+        "a temporary test database."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--engine",
+            choices=["stub", "tiny"],
+            default="stub",
+            help=(
+                "stub: a deterministic stand-in for the model. tiny: a randomly "
+                "initialised two-layer RoBERTa run with TensorFlow."
+            ),
+        )
+        parser.add_argument(
+            "--token-cost-us",
+            type=float,
+            default=2.0,
+            help="Simulated microseconds per padded token of the stub engine.",
+        )
+        parser.add_argument(
+            "--batch-sizes",
+            type=_list_of(int),
+            default=[1, 16, 128],
+            help="Comma-separated numbers of texts per request.",
+        )
+        parser.add_argument(
+            "--lengths",
+            type=_list_of(str),
+            default=["short", "mixed"],
+            help=f"Comma-separated text length distributions: {', '.join(TEXT_LENGTHS)}.",
+        )
+        parser.add_argument(
+            "--hit-ratios",
+            type=_list_of(float),
+            default=[0.0, 0.9],
+            help="Comma-separated fractions of texts served from the result cache.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=_list_of(int),
+            default=[1, 16],
+            help="Comma-separated numbers of requests in flight at once.",
+        )
+        parser.add_argument(
+            "--requests", type=int, default=32, help="Requests per scenario."
+        )
+        parser.add_argument("--seed", type=int, default=0, help="Seeds the generated texts.")
+        parser.add_argument(
+            "--output",
+            type=Path,
+            help="JSON file to write the results to. Printed to stdout by default.",
+        )
+        parser.add_argument(
+            "--compare",
+            type=Path,
+            help="Earlier results to compare against. Fails on any regression.",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.1,
+            help="Accepted relative slowdown when comparing, e.g. 0.1 for 10%%.",
+        )
+        parser.add_argument(
+            "--keepdb", action="store_true", help="Keep the test database between runs."
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        unknown: set[str] = set(options["lengths"]) - set(TEXT_LENGTHS)
+        if unknown:
+            raise CommandError(f"Unknown text lengths: {', '.join(sorted(unknown))}.")
+
+        scenarios: list[Scenario] = [
+            Scenario(batch_size, lengths, hit_ratio, concurrency)
+            for batch_size, lengths, hit_ratio, concurrency in itertools.product(
+                options["batch_sizes"],
+                options["lengths"],
+                options["hit_ratios"],
+                options["concurrency"],
+            )
+        ]
+
+        use_offline_model(options["engine"], options["token_cost_us"] / 1_000_000)
+
+        setup_test_environment()
+        old_config = setup_databases(
+            verbosity=0, interactive=False, keepdb=options["keepdb"]
+        )
+        try:
+            # Measures the pipeline, so all texts come from one client without a limit
+            with override_settings(RATE_LIMIT_TEXTS_PER_SECOND=0):
+                results: list[dict[str, Any]] = asyncio.run(
+                    self._run(scenarios, options["requests"], options["seed"])
+                )
+        finally:
+            teardown_databases(old_config, verbosity=0, keepdb=options["keepdb"])
+
+        run: dict[str, Any] = {**run_metadata(options["engine"]), "results": results}
+        rendered: str = json.dumps(run, indent=2)
+        if options["output"]:
+            options["output"].write_text(rendered + "\n")
+            self.stdout.write(f"Wrote {len(results)} results to {options['output']}.")
+        else:
+            self.stdout.write(rendered)
+
+        if options["compare"]:
+            baseline: dict[str, Any] = json.loads(options["compare"].read_text())
+            regressions: list[str] = compare_runs(baseline, run, options["tolerance"])
+            if regressions:
+                raise CommandError(
+                    f"{len(regressions)} regressions against {baseline.get('commit')}:\n"
+                    + "\n".join(regressions)
+                )
+            self.stdout.write(f"No regressions against {baseline.get('commit')}.")
+
+    async def _run(
+        self, scenarios: list[Scenario], requests: int, seed: int
+    ) -> list[dict[str, Any]]:
+        app = get_asgi_application()
+        results: list[dict[str, Any]] = []
+        for scenario in scenarios:
+            result: dict[str, Any] = await run_scenario(app, scenario, requests, seed)
+            self.stderr.write(
+                f"{scenario.key}: {result['texts_per_second']} texts/s, "
+                f"p50 {result['latency_ms']['p50']} ms, p99 {result['latency_ms']['p99']} ms"
+            )
+            results.append(result)
+
+        # Close the connections opened by the views so the test database can be dropped
+        await sync_to_async(connections.close_all)()
+        return results
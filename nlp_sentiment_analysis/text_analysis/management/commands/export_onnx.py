@@ -0,0 +1,93 @@
+from pathlib import Path
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from ...engines import save_external_weights
+
+
+class Command(BaseCommand):
+    help = (
+        "Exports the sentiment model to ONNX and writes a dynamically int8-quantized "
+        "copy for the ONNX Runtime engine."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--model",
+            default=settings.MODEL_NAME,
+            help="Name or local directory of the TensorFlow model to export.",
+        )
+        parser.add_argument(
+            "--output-dir",
+            default=str(settings.ML_MODELS_DIR),
+            help="Directory to write model.onnx and model.int8.onnx to.",
+        )
+        parser.add_argument("--opset", type=int, default=17, help="ONNX opset version.")
+        parser.add_argument(
+            "--no-quantize",
+            action="store_true",
+            help="Only write the float32 export.",
+        )
+        parser.add_argument(
+            "--shared-weights",
+            action="store_true",
+            help=(
+                "Write the weights to a .data file next to each model, which workers "
+                "share with SHARED_MODEL_WEIGHTS=true."
+            ),
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        try:
+            import tensorflow as tf
+            import tf2onnx
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            from transformers import TFAutoModelForSequenceClassification
+        except ImportError as e:
+            raise CommandError(
+                f"Exporting to ONNX requires tf2onnx and onnxruntime: {e}"
+            ) from e
+
+        output_dir = Path(options["output_dir"])
+        output_dir.mkdir(parents=True, exist_ok=True)
+        model_path: Path = output_dir / "model.onnx"
+
+        model = TFAutoModelForSequenceClassification.from_pretrained(options["model"])
+        # Batch size and sequence length stay dynamic so padded batches of any shape fit
+        input_signature = (
+            tf.TensorSpec((None, None), tf.int32, name="input_ids"),
+            tf.TensorSpec((None, None), tf.int32, name="attention_mask"),
+        )
+
+        @tf.function(input_signature=input_signature, autograph=False)
+        def serving(input_ids: tf.Tensor, attention_mask: tf.Tensor) -> dict[str, tf.Tensor]:
+            outputs = model(input_ids=input_ids, attention_mask=attention_mask)
+            return {"logits": outputs.logits}
+
+        tf2onnx.convert.from_function(
+            serving,
+            input_signature=input_signature,
+            opset=options["opset"],
+            output_path=str(model_path),
+        )
+        self.stdout.write(f"Exported {options['model']} to {model_path}")
+
+        written: list[Path] = [model_path]
+        if not options["no_quantize"]:
+            quantized_path: Path = output_dir / "model.int8.onnx"
+            quantize_dynamic(
+                str(model_path), str(quantized_path), weight_type=QuantType.QInt8
+            )
+            self.stdout.write(f"Wrote int8-quantized model to {quantized_path}")
+            written.append(quantized_path)
+
+        if options["shared_weights"]:
+            for path in written:
+                weights_path: str = save_external_weights(str(path))
+                self.stdout.write(f"Moved the weights of {path} to {weights_path}")
+
+        self.stdout.write(
+            self.style.SUCCESS("Set SENTIMENT_ENGINE=onnx to serve the export.")
+        )
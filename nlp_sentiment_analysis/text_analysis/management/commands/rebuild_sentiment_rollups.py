@@ -0,0 +1,16 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand
+
+from ...rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the hourly sentiment rollup from all saved analyses, e.g. after "
+        "deploying the rollup table or deleting analyses."
+    )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        rows: int = rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} sentiment rollup rows."))
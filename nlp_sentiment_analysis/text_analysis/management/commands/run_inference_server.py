@@ -0,0 +1,48 @@
+import asyncio
+import signal
+
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from ...analysis import loader, scheduler
+from ...inference_server import InferenceServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs the sentiment model in a standalone process which analyses texts for "
+        "all web workers on this host over a Unix domain socket, batching texts of "
+        "all workers together. Web workers use it when INFERENCE_SERVER_SOCKET is set."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--socket",
+            default=settings.INFERENCE_SERVER_SOCKET,
+            help="Path of the Unix domain socket. Defaults to INFERENCE_SERVER_SOCKET.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        if not options["socket"]:
+            raise CommandError("Pass --socket or set INFERENCE_SERVER_SOCKET.")
+
+        # Pings report the server as not ready until the model is warmed up
+        loader.start_warmup()
+        server = InferenceServer(scheduler.submit, options["socket"], loader.ready.is_set)
+        asyncio.run(self._serve(server))
+        self.stdout.write(self.style.SUCCESS("The inference server has stopped."))
+
+    async def _serve(self, server: InferenceServer) -> None:
+        stopped: asyncio.Event = asyncio.Event()
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signal_number, stopped.set)
+
+        await server.start()
+        self.stdout.write(f"Serving sentiment analyses on {server.socket_path}.")
+        try:
+            await stopped.wait()
+        finally:
+            await server.close()
@@ -0,0 +1,45 @@
+import time
+
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+
+from ...jobs import process_batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Analyses the texts of queued background jobs in batches. Any number of "
+        "workers can run in parallel."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.JOB_BATCH_SIZE,
+            help="Maximum number of texts claimed and analysed at once.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=settings.JOB_POLL_INTERVAL,
+            help="Seconds to wait before polling an empty queue again.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the queue is empty instead of polling for new jobs.",
+        )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        self.stdout.write("Waiting for queued analysis jobs.")
+        while True:
+            processed: int = process_batch(options["batch_size"])
+            if processed:
+                continue
+            if options["once"]:
+                break
+            time.sleep(options["poll_interval"])
+        self.stdout.write(self.style.SUCCESS("The job queue is empty."))
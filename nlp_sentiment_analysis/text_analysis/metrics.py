@@ -0,0 +1,229 @@
+import threading
+import time
+
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+
+Labels = tuple[tuple[str, str], ...]
+
+# Seconds, from a cache lookup to a large inference batch
+DEFAULT_BUCKETS: list[float] = [
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+]
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped: list[str] = [
+        '{}="{}"'.format(
+            name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        )
+        for name, value in labels
+    ]
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """
+    Base class of the metrics kept by a ``MetricsRegistry``.
+
+    Samples are kept per combination of label values, passed as keyword arguments.
+    Updates take a lock, so metrics can be updated from the inference threads.
+
+    Args:
+        name: The metric name (str).
+        documentation: The help text (str).
+    """
+
+    type: str = "untyped"
+
+    def __init__(self, name: str, documentation: str) -> None:
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+
+    def samples(self) -> Iterator[tuple[str, Labels, float]]:
+        """Yields a (name suffix, labels, value) tuple per sample."""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines: list[str] = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """A value which only goes up, such as the number of texts analysed."""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str) -> None:
+        super().__init__(name, documentation)
+        self._values: dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key: Labels = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> Iterator[tuple[str, Labels, float]]:
+        with self._lock:
+            values: dict[Labels, float] = dict(self._values)
+        for labels, value in values.items():
+            yield "", labels, value
+
+
+class Histogram(Metric):
+    """
+    Counts observations, such as stage durations, into cumulative buckets.
+
+    Args:
+        name: The metric name (str).
+        documentation: The help text (str).
+        buckets: The upper bounds of the buckets (list[float]).
+    """
+
+    type = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, buckets: Optional[list[float]] = None
+    ) -> None:
+        super().__init__(name, documentation)
+        self.buckets: list[float] = [*sorted(buckets or DEFAULT_BUCKETS), float("inf")]
+        self._counts: dict[Labels, list[int]] = {}
+        self._sums: dict[Labels, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key: Labels = tuple(sorted(labels.items()))
+        with self._lock:
+            counts: list[int] = self._counts.setdefault(key, [0] * len(self.buckets))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observes the number of seconds spent in the ``with`` block."""
+        start: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> Iterator[tuple[str, Labels, float]]:
+        with self._lock:
+            counts: dict[Labels, list[int]] = {
+                labels: list(values) for labels, values in self._counts.items()
+            }
+            sums: dict[Labels, float] = dict(self._sums)
+        for labels, values in counts.items():
+            for bound, count in zip(self.buckets, values):
+                yield "_bucket", (*labels, ("le", _format_value(bound))), count
+            yield "_sum", labels, sums[labels]
+            yield "_count", labels, values[-1]
+
+
+class CallbackMetric(Metric):
+    """
+    Reads its samples from a function at scrape time, for values which are already
+    tracked elsewhere, such as the queue depth of the batch scheduler.
+
+    Args:
+        name: The metric name (str).
+        documentation: The help text (str).
+        type: The Prometheus type, "gauge" or "counter" (str).
+        function: Returns a list of (labels, value) pairs.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        type: str,
+        function: Callable[[], list[tuple[dict[str, str], float]]],
+    ) -> None:
+        super().__init__(name, documentation)
+        self.type = type
+        self.function = function
+
+    def samples(self) -> Iterator[tuple[str, Labels, float]]:
+        for labels, value in self.function():
+            yield "", tuple(sorted(labels.items())), value
+
+
+class MetricsRegistry:
+    """
+    Holds the metrics of this process and renders them in the Prometheus text
+    exposition format.
+
+    Every web worker keeps its own registry, so each worker has to be scraped
+    separately and the series aggregated in Prometheus.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> None:
+        self._metrics[metric.name] = metric
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        metric: Counter = Counter(name, documentation)
+        self.register(metric)
+        return metric
+
+    def histogram(
+        self, name: str, documentation: str, buckets: Optional[list[float]] = None
+    ) -> Histogram:
+        metric: Histogram = Histogram(name, documentation, buckets)
+        self.register(metric)
+        return metric
+
+    def callback(
+        self,
+        name: str,
+        documentation: str,
+        type: str,
+        function: Callable[[], list[tuple[dict[str, str], float]]],
+    ) -> CallbackMetric:
+        metric: CallbackMetric = CallbackMetric(name, documentation, type, function)
+        self.register(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+registry: MetricsRegistry = MetricsRegistry()
+
+STAGE_SECONDS: Histogram = registry.histogram(
+    "sentiment_stage_seconds",
+    "Time spent per request or batch in each stage of the analysis pipeline.",
+)
+STAGE_WAIT_SECONDS: Histogram = registry.histogram(
+    "sentiment_stage_wait_seconds",
+    "Time batches wait for a worker of each stage of the inference pipeline.",
+)
+TEXTS_ANALYSED: Counter = registry.counter(
+    "sentiment_texts_analysed_total", "Texts run through the sentiment model."
+)
+TEXTS_REQUESTED: Counter = registry.counter(
+    "sentiment_texts_requested_total", "Texts submitted for analysis, cached or not."
+)
+BATCH_TEXTS: Histogram = registry.histogram(
+    "sentiment_batch_size",
+    "Number of texts per batch passed to the inference threads.",
+    buckets=[1, 2, 4, 8, 16, 32, 64, 128, 256, 512],
+)
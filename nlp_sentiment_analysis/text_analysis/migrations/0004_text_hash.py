@@ -0,0 +1,35 @@
+# Generated by Django 5.1 on 2026-10-17 19:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # The column is added without an index, so existing rows are not rewritten
+    # and the table is only locked briefly. Hashes are backfilled and indexed in
+    # 0009 and 0010.
+
+    dependencies = [
+        ('text_analysis', '0003_analysisjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysis',
+            name='text_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.CreateModel(
+            name='SentimentResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text_hash', models.CharField(max_length=64)),
+                ('model', models.CharField(max_length=255)),
+                ('sentiment', models.CharField(choices=[('positive', 'Positive'), ('negative', 'Negative'), ('neutral', 'Neutral')], max_length=8)),
+                ('confidence_score', models.FloatField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('text_hash', 'model'), name='unique_sentiment_result')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1 on 2026-10-17 19:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('text_analysis', '0004_text_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysis',
+            name='model',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.CreateModel(
+            name='SentimentRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField()),
+                ('sentiment', models.CharField(choices=[('positive', 'Positive'), ('negative', 'Negative'), ('neutral', 'Neutral')], max_length=8)),
+                ('model', models.CharField(blank=True, max_length=255)),
+                ('count', models.PositiveBigIntegerField(default=0)),
+                ('confidence_sum', models.FloatField(default=0.0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('bucket_start', 'sentiment', 'model'), name='unique_sentiment_rollup')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1 on 2026-10-17 19:46
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the indexes without blocking writes to the analysis table
+    atomic = False
+
+    dependencies = [
+        ('text_analysis', '0005_sentimentrollup'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='analysis',
+            index=models.Index(fields=['-created_at', '-id'], name='analysis_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='analysis',
+            index=models.Index(fields=['sentiment', '-created_at', '-id'], name='analysis_sentiment_created_idx'),
+        ),
+    ]
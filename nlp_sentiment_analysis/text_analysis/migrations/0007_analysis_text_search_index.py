@@ -0,0 +1,22 @@
+# Generated by Django 5.1 on 2026-10-17 19:47
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Build the index without blocking writes to the analysis table
+    atomic = False
+
+    dependencies = [
+        ('text_analysis', '0006_analysis_list_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='analysis',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('text', config='english'), name='analysis_text_search_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-17 20:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('text_analysis', '0007_analysis_text_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='queuedtext',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
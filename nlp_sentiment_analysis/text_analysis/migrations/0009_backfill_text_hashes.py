@@ -0,0 +1,43 @@
+import hashlib
+import unicodedata
+
+from django.db import migrations, transaction
+
+
+BATCH_SIZE = 2000
+
+
+def backfill_text_hashes(apps, schema_editor):
+    Analysis = apps.get_model("text_analysis", "Analysis")
+
+    # Each batch is committed on its own, so rows are only locked while their
+    # batch is updated. Batches are read in primary key order, using its index.
+    last_id = 0
+    while True:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            batch = list(
+                Analysis.objects.filter(id__gt=last_id, text_hash__isnull=True)
+                .order_by("id")
+                .only("id", "text")[:BATCH_SIZE]
+            )
+            if not batch:
+                return
+            for analysis in batch:
+                normalised_text = unicodedata.normalize("NFC", analysis.text).strip()
+                analysis.text_hash = hashlib.sha256(normalised_text.encode("utf-8")).hexdigest()
+            Analysis.objects.bulk_update(batch, ["text_hash"])
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+    # Commit the backfill batch by batch instead of rewriting the whole table in
+    # one transaction
+    atomic = False
+
+    dependencies = [
+        ('text_analysis', '0008_queuedtext_claimed_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_text_hashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the index without blocking writes to the analysis table
+    atomic = False
+
+    dependencies = [
+        ('text_analysis', '0009_backfill_text_hashes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='analysis',
+            index=models.Index(fields=['text_hash'], name='analysis_text_hash_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1 on 2026-10-17 20:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('text_analysis', '0010_analysis_text_hash_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisjob',
+            name='failed',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='queuedtext',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
@@ -1,6 +1,77 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
 from django.db import models
 
 
+# Text search configuration of the full-text index on analyses. Searches must use
+# the same configuration for the index to be used. Changing it needs a migration
+# which rebuilds the index.
+SEARCH_CONFIG: str = "english"
+
+
+class AnalysisJob(models.Model):
+    """
+    A bulk sentiment analysis job processed in the background by
+    ``manage.py run_sentiment_worker``.
+
+    Fields:
+        status (StatusChoices): The processing state of the job.
+        total (int): The number of texts submitted with the job.
+        processed (int): The number of texts analysed so far, including failed ones.
+        failed (int): The number of texts which could not be analysed.
+        error (str, optional): The last error for which a text could not be analysed.
+        created_at (datetime.datetime): The timestamp when the job was submitted.
+        started_at (datetime.datetime, optional): The timestamp when the first
+            batch was picked up by a worker.
+        finished_at (datetime.datetime, optional): The timestamp when the last
+            batch was processed.
+    """
+
+    class StatusChoices(models.TextChoices):
+        PENDING = "pending"
+        RUNNING = "running"
+        DONE = "done"
+        FAILED = "failed"
+
+    status = models.CharField(
+        choices=StatusChoices, max_length=7, default=StatusChoices.PENDING
+    )
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self) -> str:
+        return f"Job {self.pk} ({self.status}, {self.processed}/{self.total})"
+
+
+class QueuedText(models.Model):
+    """
+    A text of an ``AnalysisJob`` waiting to be analysed.
+
+    Rows are the work queue of the job workers: they are claimed in batches with
+    ``SELECT ... FOR UPDATE SKIP LOCKED`` and deleted once their analysis is saved.
+
+    Fields:
+        job (AnalysisJob): The job the text was submitted with.
+        text (str): The text to analyse.
+        claimed_at (datetime.datetime, optional): When a worker claimed the text.
+            Claims older than ``JOB_CLAIM_TIMEOUT`` are taken over by other workers.
+        attempts (int): The number of times analysing the text has failed.
+    """
+
+    job = models.ForeignKey(AnalysisJob, on_delete=models.CASCADE, related_name="queue")
+    text = models.TextField(blank=False, null=False)
+    claimed_at = models.DateTimeField(blank=True, null=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"{self.text[:20]}..." if self.text is not None else ""
+
+
 class Analysis(models.Model):
     """
     Stores the results of text sentiment analysis.
@@ -12,6 +83,12 @@ class Analysis(models.Model):
             with the sentiment prediction (between 0.0 and 1.0).
         created_at (datetime.datetime): The timestamp when the analysis was
             created (automatically set on creation).
+        text_hash (str, optional): The SHA-256 hex digest of the normalised text,
+            indexed to find earlier analyses of the same text.
+        model (str, optional): The id (name, version and engine) of the model
+            which produced the result.
+        job (AnalysisJob, optional): The background job the text was submitted
+            with, if any.
     """
 
     class SentimentChoices(models.TextChoices):
@@ -25,6 +102,123 @@ class Analysis(models.Model):
     )
     confidence_score = models.FloatField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    text_hash = models.CharField(max_length=64, blank=True, null=True)
+    model = models.CharField(max_length=255, blank=True, null=True)
+    job = models.ForeignKey(
+        AnalysisJob,
+        on_delete=models.SET_NULL,
+        related_name="analyses",
+        blank=True,
+        null=True,
+    )
+
+    class Meta:
+        # Back lookups by text hash, the keyset-paginated list, newest first,
+        # with and without a sentiment filter, and full-text search over the text
+        indexes = [
+            models.Index(fields=["text_hash"], name="analysis_text_hash_idx"),
+            models.Index(fields=["-created_at", "-id"], name="analysis_created_idx"),
+            models.Index(
+                fields=["sentiment", "-created_at", "-id"],
+                name="analysis_sentiment_created_idx",
+            ),
+            GinIndex(
+                SearchVector("text", config=SEARCH_CONFIG),
+                name="analysis_text_search_idx",
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"{self.text[:20]}..." if self.text is not None else ""
+
+
+class SentimentResult(models.Model):
+    """
+    Stores one sentiment result per distinct text and model.
+
+    This is the durable tier of the result cache: texts missing from Redis are
+    looked up here by hash before they are run through the model.
+
+    Fields:
+        text_hash (str): The SHA-256 hex digest of the normalised text.
+        model (str): The id (name, version and engine) of the model which produced
+            the result.
+        sentiment (SentimentChoices): The overall sentiment of the text.
+        confidence_score (float): The confidence score of the prediction.
+        created_at (datetime.datetime): The timestamp when the result was stored.
+    """
+
+    text_hash = models.CharField(max_length=64)
+    model = models.CharField(max_length=255)
+    sentiment = models.CharField(choices=Analysis.SentimentChoices, max_length=8)
+    confidence_score = models.FloatField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["text_hash", "model"], name="unique_sentiment_result"
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.text_hash[:12]} ({self.model}): {self.sentiment}"
+
+
+class SentimentRollup(models.Model):
+    """
+    Stores the number of analyses and the sum of their confidence scores per hour,
+    sentiment and model.
+
+    Rows are incremented in the same transaction as the analyses are saved, so
+    time series can be read without scanning the ``Analysis`` table. See
+    ``rollups.py``.
+
+    Fields:
+        bucket_start (datetime.datetime): The start of the hour.
+        sentiment (SentimentChoices): The sentiment of the analyses.
+        model (str): The id of the model, empty for analyses saved
+            before it was recorded.
+        count (int): The number of analyses.
+        confidence_sum (float): The sum of their confidence scores.
+    """
+
+    bucket_start = models.DateTimeField()
+    sentiment = models.CharField(choices=Analysis.SentimentChoices, max_length=8)
+    model = models.CharField(max_length=255, blank=True)
+    count = models.PositiveBigIntegerField(default=0)
+    confidence_sum = models.FloatField(default=0.0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["bucket_start", "sentiment", "model"],
+                name="unique_sentiment_rollup",
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.bucket_start:%Y-%m-%d %H:00} {self.sentiment}: {self.count}"
+
+
+class IngestCheckpoint(models.Model):
+    """
+    Records how far ``manage.py analyse_file`` has got through an input file.
+
+    The row is updated in the same transaction as the analyses of each batch are
+    copied, so an interrupted run resumes right after the last saved batch.
+
+    Fields:
+        name (str): The checkpoint name, by default the absolute input path.
+        offset (int): The byte offset up to which the input has been saved.
+        rows (int): The number of rows read up to that offset.
+        updated_at (datetime.datetime): When the last batch was saved.
+    """
+
+    name = models.CharField(max_length=1024, unique=True)
+    offset = models.PositiveBigIntegerField(default=0)
+    rows = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"{self.name} ({self.rows} rows)"
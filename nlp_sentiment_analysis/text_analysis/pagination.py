@@ -0,0 +1,127 @@
+import base64
+import binascii
+
+from datetime import datetime
+from typing import Any, Optional
+
+from django.conf import settings
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Forward-only keyset pagination over ``(ordering_field, id)``, descending.
+
+    Instead of an offset, the cursor holds the sort key of the last row of the
+    previous page, and the next page is read with
+    ``WHERE key <= :key AND (key < :key OR id < :id)``. With an index on
+    ``(created_at, id)``, the default ordering, every page costs the same however
+    deep into the table it is.
+
+    Pages are read with the async ORM through ``apaginate_queryset``.
+    """
+
+    ordering_field: str = "created_at"
+    page_size: int = settings.ANALYSIS_PAGE_SIZE
+    max_page_size: int = settings.ANALYSIS_MAX_PAGE_SIZE
+    page_size_query_param: str = "page_size"
+    cursor_query_param: str = "cursor"
+    invalid_cursor_message: str = "Invalid cursor"
+
+    def __init__(self) -> None:
+        self.request: Optional[Request] = None
+        self.next_cursor: Optional[str] = None
+
+    def get_page_size(self, request: Request) -> int:
+        try:
+            page_size: int = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def encode_key(self, key: Any) -> str:
+        return key.isoformat()
+
+    def decode_key(self, key: str) -> Any:
+        return datetime.fromisoformat(key)
+
+    def encode_cursor(self, key: Any, pk: int) -> str:
+        position: str = f"{self.encode_key(key)}|{pk}"
+        return base64.urlsafe_b64encode(position.encode("utf-8")).decode("ascii")
+
+    def decode_cursor(self, cursor: str) -> tuple[Any, int]:
+        try:
+            key, pk = base64.urlsafe_b64decode(cursor.encode("ascii")).decode(
+                "utf-8"
+            ).split("|")
+            return self.decode_key(key), int(pk)
+        except (binascii.Error, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    async def apaginate_queryset(self, queryset: QuerySet, request: Request) -> list[Any]:
+        self.request = request
+        page_size: int = self.get_page_size(request)
+
+        cursor: Optional[str] = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            key, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(**{f"{self.ordering_field}__lte": key})
+                & (Q(**{f"{self.ordering_field}__lt": key}) | Q(pk__lt=pk))
+            )
+
+        # One extra row tells whether there is a next page
+        rows: list[Any] = [
+            row
+            async for row in queryset.order_by(f"-{self.ordering_field}", "-pk")[
+                : page_size + 1
+            ]
+        ]
+        self.next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            self.next_cursor = self.encode_cursor(
+                getattr(rows[-1], self.ordering_field), rows[-1].pk
+            )
+        return rows
+
+    def get_next_link(self) -> Optional[str]:
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, self.next_cursor
+        )
+
+    def get_paginated_response(self, data: list[Any]) -> Response:
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema: dict) -> dict:
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+class SearchRankPagination(KeysetPagination):
+    """
+    Keyset pagination over ``(rank, id)`` for ranked search results, best match
+    first. ``rank`` must be annotated on the queryset.
+    """
+
+    ordering_field: str = "rank"
+
+    def encode_key(self, key: float) -> str:
+        # repr round-trips floats exactly, so ties on the rank are split on the id
+        return repr(key)
+
+    def decode_key(self, key: str) -> float:
+        return float(key)
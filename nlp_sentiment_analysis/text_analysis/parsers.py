@@ -0,0 +1,175 @@
+import io
+import itertools
+import json
+
+from typing import IO, Any, Iterable, Iterator, Optional
+
+from django.conf import settings
+
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+
+class RequestTooLarge(APIException):
+    """Raised when a request body exceeds ``MAX_REQUEST_BODY_BYTES``."""
+
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "Request body is too large."
+    default_code = "request_too_large"
+
+
+def _body_limit(parser_context: Optional[dict[str, Any]]) -> int:
+    """
+    Returns ``MAX_REQUEST_BODY_BYTES``, rejecting requests whose ``Content-Length``
+    already exceeds it before any of the body is read.
+    """
+    limit: int = settings.MAX_REQUEST_BODY_BYTES
+    request = (parser_context or {}).get("request")
+    content_length: str = request.META.get("CONTENT_LENGTH", "") if request else ""
+    if content_length.isdigit() and int(content_length) > limit:
+        raise RequestTooLarge(f"Request body exceeds {limit} bytes.")
+    return limit
+
+
+def _read_body(stream: IO[bytes], parser_context: Optional[dict[str, Any]]) -> bytes:
+    """
+    Reads the whole body, which is also limited when sent without a ``Content-Length``.
+    """
+    limit: int = _body_limit(parser_context)
+    body: bytes = stream.read(limit + 1)
+    if len(body) > limit:
+        raise RequestTooLarge(f"Request body exceeds {limit} bytes.")
+    return body
+
+
+class ORJSONParser(JSONParser):
+    """
+    Parses JSON with orjson, which is faster and allocates less than the standard
+    library decoder, and rejects bodies over ``MAX_REQUEST_BODY_BYTES`` with a 413.
+    """
+
+    def parse(
+        self,
+        stream: IO[bytes],
+        media_type: Optional[str] = None,
+        parser_context: Optional[dict[str, Any]] = None,
+    ) -> Any:
+        body: bytes = _read_body(stream, parser_context)
+        if orjson is None:  # pragma: no cover
+            return super().parse(io.BytesIO(body), media_type, parser_context)
+
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError as e:
+            raise ParseError(f"JSON parse error - {e}")
+
+
+class MessagePackParser(BaseParser):
+    """
+    Parses MessagePack bodies, the binary equivalent of the JSON requests.
+    Requires the msgpack package.
+    """
+
+    media_type = "application/msgpack"
+
+    def parse(
+        self,
+        stream: IO[bytes],
+        media_type: Optional[str] = None,
+        parser_context: Optional[dict[str, Any]] = None,
+    ) -> Any:
+        body: bytes = _read_body(stream, parser_context)
+        try:
+            return msgpack.unpackb(body, raw=False)
+        except (ValueError, msgpack.UnpackException) as e:
+            raise ParseError(f"MessagePack parse error - {e}")
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parses newline-delimited JSON with one text per line, either as a JSON string
+    or as an object with a "text" field.
+
+    The body is returned as ``{"texts": <iterator>}``. Lines are only read and
+    decoded as the iterator is consumed, so texts can be analysed batch by batch
+    without ever holding the whole list. Parse errors and the size limit are
+    raised from the iterator when the offending line is reached.
+    """
+
+    media_type = "application/x-ndjson"
+
+    def parse(
+        self,
+        stream: IO[bytes],
+        media_type: Optional[str] = None,
+        parser_context: Optional[dict[str, Any]] = None,
+    ) -> dict[str, Iterator[str]]:
+        return {"texts": self.iter_texts(stream, _body_limit(parser_context))}
+
+    @staticmethod
+    def iter_texts(stream: IO[bytes], limit: int) -> Iterator[str]:
+        loads = orjson.loads if orjson is not None else json.loads
+        consumed: int = 0
+        for line_number in itertools.count(1):
+            # A single line can never be read past the limit
+            line: bytes = stream.readline(limit - consumed + 1)
+            if not line:
+                return
+            consumed += len(line)
+            if consumed > limit:
+                raise RequestTooLarge(f"Request body exceeds {limit} bytes.")
+
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item: Any = loads(line)
+            except ValueError as e:
+                raise ParseError(f"NDJSON parse error on line {line_number} - {e}")
+
+            text: Any = item.get("text") if isinstance(item, dict) else item
+            if not isinstance(text, str):
+                raise ParseError(
+                    f'Line {line_number} is not a string or an object with a "text" string.'
+                )
+            yield text
+
+
+def optional_parser_classes() -> list[type[BaseParser]]:
+    """
+    Returns the parsers whose optional dependencies are installed.
+    """
+    return [MessagePackParser] if msgpack is not None else []
+
+
+def peek_texts(texts: Iterable[str]) -> Iterable[str]:
+    """
+    Returns ``texts``, or an empty list if it is an iterator that yields nothing.
+
+    Reads the first text of an iterator, such as the texts of an NDJSON body, so
+    an empty body can be rejected up front without consuming the rest.
+
+    Args:
+        texts: The parsed texts (Iterable[str]).
+
+    Returns:
+        The same texts (Iterable[str]).
+    """
+    if not isinstance(texts, Iterator):
+        return texts
+
+    first: Optional[str] = next(texts, None)
+    if first is None:
+        return []
+    return itertools.chain([first], texts)
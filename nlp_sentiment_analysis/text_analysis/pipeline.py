@@ -0,0 +1,132 @@
+import asyncio
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from .metrics import STAGE_WAIT_SECONDS
+
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    One step of a ``StagedPipeline``.
+
+    Args:
+        name: Labels the stage's threads and metrics (str).
+        function: The blocking function run on each item (Callable).
+        workers: The number of threads running the stage (int).
+    """
+
+    name: str
+    function: Callable[[Any], Any]
+    workers: int
+
+
+class StagedPipeline:
+    """
+    Runs items through a sequence of blocking stages, each on its own thread pool.
+
+    An item moves on to the next stage as soon as it has left the previous one, so
+    while one batch runs through the model the next one is already being
+    tokenized. Tokenizers and inference engines release the GIL while they run,
+    so the stages keep separate cores busy.
+
+    Between two stages, at most ``queue_size`` items wait for a free worker. An
+    item which cannot be handed over holds on to its place in the stage it has
+    finished, so a slow stage holds back the stages before it instead of letting
+    work pile up in front of it.
+
+    Args:
+        stages: The stages, in order (list[Stage]).
+        queue_size: The number of items waiting between two stages (int).
+    """
+
+    def __init__(self, stages: list[Stage], queue_size: int) -> None:
+        self.stages = stages
+        self.queue_size = queue_size
+        self.executors: dict[str, ThreadPoolExecutor] = {
+            stage.name: ThreadPoolExecutor(
+                max_workers=stage.workers, thread_name_prefix=f"sentiment-{stage.name}"
+            )
+            for stage in stages
+        }
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: list[asyncio.Semaphore] = []
+        self._counts: dict[tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self) -> int:
+        """The number of items the pipeline holds at once, running or waiting."""
+        return sum(stage.workers for stage in self.stages) + self.queue_size * (
+            len(self.stages) - 1
+        )
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """The number of items waiting for and running in each stage."""
+        with self._lock:
+            return {
+                stage.name: {
+                    state: self._counts.get((stage.name, state), 0)
+                    for state in ("waiting", "running")
+                }
+                for stage in self.stages
+            }
+
+    async def run(self, item: Any) -> Any:
+        """
+        Runs an item through every stage.
+
+        Args:
+            item: The input of the first stage.
+
+        Returns:
+            The output of the last stage. Exceptions raised by a stage are raised
+            here and skip the remaining stages.
+        """
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Semaphores are bound to the loop they were first used on
+            self._loop = loop
+            self._slots = [
+                asyncio.Semaphore(stage.workers + (self.queue_size if index else 0))
+                for index, stage in enumerate(self.stages)
+            ]
+
+        held: Optional[asyncio.Semaphore] = None
+        try:
+            for stage, slots in zip(self.stages, self._slots):
+                queued_at: float = time.perf_counter()
+                self._count(stage.name, "waiting", 1)
+                try:
+                    await slots.acquire()
+                except BaseException:
+                    self._count(stage.name, "waiting", -1)
+                    raise
+                if held is not None:
+                    held.release()
+                held = slots
+                item = await loop.run_in_executor(
+                    self.executors[stage.name], self._run_stage, stage, item, queued_at
+                )
+        finally:
+            if held is not None:
+                held.release()
+        return item
+
+    def _run_stage(self, stage: Stage, item: Any, queued_at: float) -> Any:
+        STAGE_WAIT_SECONDS.observe(time.perf_counter() - queued_at, stage=stage.name)
+        self._count(stage.name, "waiting", -1)
+        self._count(stage.name, "running", 1)
+        try:
+            return stage.function(item)
+        finally:
+            self._count(stage.name, "running", -1)
+
+    def _count(self, stage: str, state: str, change: int) -> None:
+        with self._lock:
+            self._counts[stage, state] = self._counts.get((stage, state), 0) + change
@@ -0,0 +1,99 @@
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+from typing import Iterable
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Coalesce, TruncHour
+
+from .models import Analysis, SentimentRollup
+
+
+def bucket_start(timestamp: datetime) -> datetime:
+    """
+    Returns the start of the hourly rollup bucket of a timestamp, in UTC.
+    """
+    return timestamp.astimezone(dt_timezone.utc).replace(
+        minute=0, second=0, microsecond=0
+    )
+
+
+def update_rollups(analyses: Iterable[Analysis]) -> None:
+    """
+    Adds saved analyses to the hourly rollup with a single upsert.
+
+    Must run in the transaction which saves the analyses, so the rollup never
+    counts analyses which were rolled back. Analyses without a sentiment are not
+    counted.
+
+    Args:
+        analyses: The saved analyses (Iterable[Analysis]).
+    """
+    totals: defaultdict[tuple[datetime, str, str], list[float]] = defaultdict(
+        lambda: [0, 0.0]
+    )
+    for analysis in analyses:
+        if not analysis.sentiment:
+            continue
+        total: list[float] = totals[
+            (bucket_start(analysis.created_at), analysis.sentiment, analysis.model or "")
+        ]
+        total[0] += 1
+        total[1] += analysis.confidence_score or 0.0
+    if not totals:
+        return
+
+    # Rows are upserted in key order so that concurrent writers cannot deadlock
+    rows: list[tuple] = [
+        (*key, int(count), confidence_sum)
+        for key, (count, confidence_sum) in sorted(totals.items())
+    ]
+    table: str = SentimentRollup._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (bucket_start, sentiment, model, count, confidence_sum) "
+            f"VALUES {', '.join(['(%s, %s, %s, %s, %s)'] * len(rows))} "
+            "ON CONFLICT (bucket_start, sentiment, model) DO UPDATE SET "
+            f"count = {table}.count + EXCLUDED.count, "
+            f"confidence_sum = {table}.confidence_sum + EXCLUDED.confidence_sum",
+            [value for row in rows for value in row],
+        )
+
+
+@transaction.atomic
+def rebuild_rollups() -> int:
+    """
+    Recomputes the hourly rollup from all saved analyses.
+
+    The rollup table is locked for the duration of the rebuild, so analyses saved
+    in the meantime are added once it has finished and are not counted twice.
+
+    Returns:
+        The number of rollup rows written (int).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"LOCK TABLE {SentimentRollup._meta.db_table} IN EXCLUSIVE MODE")
+    SentimentRollup.objects.all().delete()
+
+    buckets = (
+        Analysis.objects.exclude(sentiment=None)
+        .annotate(
+            bucket=TruncHour("created_at", tzinfo=dt_timezone.utc),
+            model_id=Coalesce(F("model"), Value("")),
+        )
+        .values("bucket", "sentiment", "model_id")
+        .annotate(total=Count("id"), score_sum=Coalesce(Sum("confidence_score"), 0.0))
+        .order_by()
+    )
+    rollups: list[SentimentRollup] = [
+        SentimentRollup(
+            bucket_start=bucket["bucket"],
+            sentiment=bucket["sentiment"],
+            model=bucket["model_id"],
+            count=bucket["total"],
+            confidence_sum=bucket["score_sum"],
+        )
+        for bucket in buckets.iterator()
+    ]
+    SentimentRollup.objects.bulk_create(rollups, batch_size=5000)
+    return len(rollups)
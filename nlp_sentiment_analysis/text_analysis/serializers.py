@@ -1,13 +1,191 @@
-from rest_framework import serializers
+from datetime import datetime, tzinfo
+from typing import Any, Iterable, Optional, Union
 
-from .models import Analysis
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.reverse import reverse
+from rest_framework.settings import api_settings
+
+from .models import Analysis, AnalysisJob
 
 
 class AnalysisSerializer(serializers.ModelSerializer):
     """
     Serializer class for the Analysis model.
+
+    Args:
+        fields: Only serialize these fields, e.g. to leave out the text
+            (Optional[Iterable[str]]).
     """
 
     class Meta:
         model = Analysis
+        # The text hash, model id and job are internal, so they are not exposed
+        fields = ["id", "text", "sentiment", "confidence_score", "created_at"]
+
+    def __init__(
+        self, *args: Any, fields: Optional[Iterable[str]] = None, **kwargs: Any
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+def _datetime_representation(value: datetime, tz: tzinfo) -> str:
+    """
+    Formats a datetime as DRF's ``DateTimeField`` does with its default ISO 8601
+    format, without its per-value overhead.
+    """
+    if settings.USE_TZ and timezone.is_aware(value):
+        value = value.astimezone(tz)
+    representation: str = value.isoformat()
+    if representation.endswith("+00:00"):
+        representation = representation[:-6] + "Z"
+    return representation
+
+
+# (serialized name, model attribute, whether the value is a datetime)
+_ANALYSIS_FIELDS: list[tuple[str, str, bool]] = [
+    (name, model_field.attname, isinstance(model_field, models.DateTimeField))
+    for name, model_field in (
+        (name, Analysis._meta.pk if name == "id" else Analysis._meta.get_field(name))
+        for name in AnalysisSerializer().fields
+    )
+]
+
+
+def serialize_analyses(analyses: Iterable[Analysis]) -> list[dict[str, Any]]:
+    """
+    Serializes analyses to the same data as ``AnalysisSerializer``, without DRF's
+    per-field machinery, for large bulk responses.
+
+    Args:
+        analyses: The saved analyses (Iterable[Analysis]).
+
+    Returns:
+        One dict per analysis, with the fields of ``AnalysisSerializer`` in the
+        same order (list[dict[str, Any]]).
+    """
+    if api_settings.DATETIME_FORMAT != ISO_8601:
+        return AnalysisSerializer(analyses, many=True).data
+
+    tz: tzinfo = timezone.get_current_timezone()
+    results: list[dict[str, Any]] = []
+    for analysis in analyses:
+        result: dict[str, Any] = {}
+        for name, attname, is_datetime in _ANALYSIS_FIELDS:
+            value: Any = getattr(analysis, attname)
+            if is_datetime and value is not None:
+                value = _datetime_representation(value, tz)
+            result[name] = value
+        results.append(result)
+    return results
+
+
+def serialize_results(results: list[Union[Analysis, dict[str, Any]]]) -> list[dict[str, Any]]:
+    """
+    Serializes the results of a bulk analysis in order: saved analyses as
+    ``serialize_analyses`` does, and the ``{"text": ..., "error": ...}`` items of
+    texts whose analysis failed as they are.
+
+    Args:
+        results: The saved analyses and error items (list[Union[Analysis, dict]]).
+
+    Returns:
+        One dict per result (list[dict[str, Any]]).
+    """
+    serialized: Iterable[dict[str, Any]] = iter(
+        serialize_analyses(result for result in results if isinstance(result, Analysis))
+    )
+    return [result if isinstance(result, dict) else next(serialized) for result in results]
+
+
+class AnalysisFilterSerializer(serializers.Serializer):
+    """
+    Validates the query parameters filtering the list of stored analyses.
+    """
+
+    sentiment = serializers.ChoiceField(choices=Analysis.SentimentChoices, required=False)
+    min_confidence = serializers.FloatField(min_value=0.0, max_value=1.0, required=False)
+    max_confidence = serializers.FloatField(min_value=0.0, max_value=1.0, required=False)
+    fields = serializers.CharField(required=False)
+
+    def validate_fields(self, value: str) -> list[str]:
+        fields: list[str] = [name.strip() for name in value.split(",") if name.strip()]
+        unknown: list[str] = [
+            name for name in fields if name not in AnalysisSerializer().fields
+        ]
+        if unknown:
+            raise serializers.ValidationError(f"Unknown fields: {', '.join(unknown)}.")
+        return fields
+
+
+class AnalysisJobSerializer(serializers.ModelSerializer):
+    """
+    Serializer class for the AnalysisJob model.
+
+    Adds the throughput of the job in texts per second and a link to its results.
+    """
+
+    throughput = serializers.SerializerMethodField()
+    results = serializers.SerializerMethodField()
+
+    class Meta:
+        model = AnalysisJob
         fields = "__all__"
+
+    def get_throughput(self, job: AnalysisJob) -> Optional[float]:
+        if job.started_at is None:
+            return None
+        elapsed: float = ((job.finished_at or timezone.now()) - job.started_at).total_seconds()
+        return round(job.processed / elapsed, 2) if elapsed > 0 else None
+
+    def get_results(self, job: AnalysisJob) -> str:
+        return reverse(
+            "jobs-results", kwargs={"pk": job.pk}, request=self.context.get("request")
+        )
+
+
+class AnalysisSearchSerializer(serializers.Serializer):
+    """
+    Validates the query parameters of the analysis search.
+    """
+
+    q = serializers.CharField(max_length=1000)
+    sentiment = serializers.ChoiceField(choices=Analysis.SentimentChoices, required=False)
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+    fields = serializers.CharField(required=False)
+
+    validate_fields = AnalysisFilterSerializer.validate_fields
+
+
+class AggregateQuerySerializer(serializers.Serializer):
+    """
+    Validates the query parameters of the sentiment aggregates endpoint.
+    """
+
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField()
+    interval = serializers.ChoiceField(choices=["hour", "day"], default="hour")
+    model = serializers.CharField(required=False)
+
+    def validate(self, attrs: dict) -> dict:
+        if attrs["start"] >= attrs["end"]:
+            raise serializers.ValidationError("start must be before end.")
+        return attrs
+
+
+class SentimentAggregateSerializer(serializers.Serializer):
+    """
+    Serializer class for the analysis count and mean confidence of one sentiment
+    in one time bucket.
+    """
+
+    bucket_start = serializers.DateTimeField()
+    sentiment = serializers.CharField()
+    count = serializers.IntegerField()
+    mean_confidence = serializers.FloatField()
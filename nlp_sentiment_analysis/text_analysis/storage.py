@@ -0,0 +1,57 @@
+from typing import Optional
+
+from django.db import transaction
+
+from .caching import MODEL_ID, text_hash
+from .models import Analysis
+from .rollups import update_rollups
+
+
+def build_analyses(
+    texts: list[str],
+    sentiment_results: list[dict[str, float]],
+    job_id: Optional[int] = None,
+) -> list[Analysis]:
+    """
+    Builds unsaved analysis objects from sentiment results.
+
+    Texts whose analysis failed are skipped, so no analysis is ever saved without
+    a sentiment. Callers report them from ``sentiment_results`` instead.
+
+    Args:
+        texts: The analysed texts (list[str]).
+        sentiment_results: The sentiment result of each text (list[dict[str, float]]).
+        job_id: The background job the texts were submitted with, if any (int).
+
+    Returns:
+        One analysis per successfully analysed text, in the order of ``texts``
+        (list[Analysis]).
+    """
+    return [
+        Analysis(
+            text=text,
+            sentiment=result["sentiment"],
+            confidence_score=result["confidence_score"],
+            text_hash=text_hash(text),
+            model=MODEL_ID,
+            job_id=job_id,
+        )
+        for text, result in zip(texts, sentiment_results)
+        if "error" not in result
+    ]
+
+
+@transaction.atomic
+def save_analyses(analyses: list[Analysis]) -> list[Analysis]:
+    """
+    Bulk-creates analyses and adds them to the sentiment rollup in one transaction.
+
+    Args:
+        analyses: The unsaved analyses (list[Analysis]).
+
+    Returns:
+        The saved analyses (list[Analysis]).
+    """
+    Analysis.objects.bulk_create(analyses)
+    update_rollups(analyses)
+    return analyses
@@ -1,3 +1,15 @@
 from .analysis import *
+from .batching import *
+from .benchmark import *
 from .caching import *
+from .engines import *
+from .inference_server import *
+from .ingest import *
+from .jobs import *
+from .metrics import *
+from .parsers import *
+from .pipeline import *
+from .renderers import *
+from .rollups import *
+from .throttling import *
 from .views import *
@@ -1,10 +1,52 @@
-from unittest.mock import AsyncMock, patch
-from typing import Union, Optional
+import math
 
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import tensorflow as tf
+
+from django.core.exceptions import ImproperlyConfigured
 from django.test import TestCase
 
-# from ..analysis import analyse_sentiment_async
-# from ..views import BulkAnalysisViewSet
+from .. import analysis
+from ..analysis import analyse_sentiment_async, analyse_sentiments_async
+from ..engines import TFEngine
+
+
+def _softmax(logits: list[float]) -> list[float]:
+    exponents: list[float] = [math.exp(logit) for logit in logits]
+    return [exponent / sum(exponents) for exponent in exponents]
+
+
+def _encode(texts: list[str], **kwargs) -> dict[str, list[list[int]]]:
+    """
+    Encodes each text as one token per word, the first holding the position of the
+    text in the batch.
+    """
+    input_ids: list[list[int]] = [
+        [index] + [2] * (len(text.split()) - 1) for index, text in enumerate(texts)
+    ]
+    return {
+        "input_ids": input_ids,
+        "attention_mask": [[1] * len(ids) for ids in input_ids],
+    }
+
+
+def _mock_tokenizer() -> MagicMock:
+    mock_tokenizer = MagicMock(side_effect=_encode)
+    mock_tokenizer.pad_token_id = 1
+    return mock_tokenizer
+
+
+def _mock_model(logits: list[list[float]]) -> MagicMock:
+    """Returns a model mock which looks up the logits row for each input id."""
+
+    def _call(batch: dict[str, tf.Tensor]) -> SimpleNamespace:
+        rows: list[list[float]] = [logits[row[0]] for row in batch["input_ids"].numpy()]
+        return SimpleNamespace(logits=tf.constant(rows))
+
+    return MagicMock(side_effect=_call)
 
 
 class SentimentAnalysisTest(TestCase):
@@ -15,82 +57,119 @@ class SentimentAnalysisTest(TestCase):
         Tests if the sentiment analysis function correctly identifies positive sentiment.
         Mock the tokenizer and model calls
         """
-        mock_tokenizer = AsyncMock()
-        mock_model = AsyncMock()
+        logits: list[float] = [0.0, 0.5, 3.0]
 
-        with patch.object(analyse_sentiment_async, "tokenizer", mock_tokenizer):
-            with patch.object(analyse_sentiment_async.model, "__call__", mock_model):
+        with patch.object(analysis.loader, "_tokenizer", _mock_tokenizer()):
+            with patch.object(analysis.loader, "_engine", TFEngine(_mock_model([logits]))):
                 text = "This movie is absolutely fantastic!"
                 sentiment_result = await analyse_sentiment_async(text)
 
-                mock_tokenizer.assert_awaited_once_with.return_value = {"encoded_text": "encoded"}
-                mock_model.assert_awaited_once_with.return_value = {
-                    "logits": tf.Tensor([0.9, 0.1, 0.0])
-                }
                 expected_sentiment: str = "positive"
-                expected_confidence: float = 0.9
+                expected_confidence: float = _softmax(logits)[2]
                 self.assertEqual(sentiment_result["sentiment"], expected_sentiment)
-                self.assertAlmostEqual(sentiment_result["confidence_score"], expected_confidence)
+                self.assertAlmostEqual(
+                    sentiment_result["confidence_score"], expected_confidence, places=5
+                )
 
     async def test_negative_sentiment(self):
         """
         Tests if the sentiment analysis function correctly identifies negative sentiment.
         """
+        logits: list[float] = [2.5, 0.5, 0.0]
 
-        mock_tokenizer = AsyncMock()
-        mock_model = AsyncMock()
-
-        with patch.object(analyse_sentiment_async, "tokenizer", mock_tokenizer):
-            with patch.object(analyse_sentiment_async.model, "__call__", mock_model):
+        with patch.object(analysis.loader, "_tokenizer", _mock_tokenizer()):
+            with patch.object(analysis.loader, "_engine", TFEngine(_mock_model([logits]))):
                 text = "This product is a complete waste of money."
                 sentiment_result = await analyse_sentiment_async(text)
 
-                # Assert expected calls and return values
-                mock_tokenizer.assert_awaited_once_with.return_value = {"encoded_text": "encoded"}
-                mock_model.assert_awaited_once_with.return_value = {
-                    "logits": tf.Tensor([0.1, 0.8, 0.1])
-                }
                 expected_sentiment: str = "negative"
-                expected_confidence: float = 0.8
+                expected_confidence: float = _softmax(logits)[0]
                 self.assertEqual(sentiment_result["sentiment"], expected_sentiment)
-                self.assertAlmostEqual(sentiment_result["confidence_score"], expected_confidence)
-
+                self.assertAlmostEqual(
+                    sentiment_result["confidence_score"], expected_confidence, places=5
+                )
 
     async def test_neutral_sentiment(self):
         """
         Tests if the sentiment analysis function correctly identifies neutral sentiment.
         """
+        logits: list[float] = [0.3, 0.9, 0.3]
 
-        mock_tokenizer = AsyncMock()
-        mock_model = AsyncMock()
-
-        with patch.object(analyse_sentiment_async, "tokenizer", mock_tokenizer):
-            with patch.object(analyse_sentiment_async.model, "__call__", mock_model):
+        with patch.object(analysis.loader, "_tokenizer", _mock_tokenizer()):
+            with patch.object(analysis.loader, "_engine", TFEngine(_mock_model([logits]))):
                 text = "This movie is just okay, nothing special."
                 sentiment_result = await analyse_sentiment_async(text)
 
-                # Assert expected calls and return values
-                mock_tokenizer.assert_awaited_once_with.return_value = {"encoded_text": "encoded"}
-                mock_model.assert_awaited_once_with.return_value = {
-                    "logits": tf.Tensor([0.3, 0.3, 0.4])
-                }
-                expected_sentiment: str = "neutral"  # Adjust based on your model's logic
-                # Consider a threshold for confidence score to define neutral sentiment
-                expected_confidence: float = None  # Or a specific value for neutral range
+                expected_sentiment: str = "neutral"
+                expected_confidence: float = _softmax(logits)[1]
                 self.assertEqual(sentiment_result["sentiment"], expected_sentiment)
-                if expected_confidence is not None:
-                    self.assertAlmostEqual(sentiment_result["confidence_score"], expected_confidence)
+                self.assertAlmostEqual(
+                    sentiment_result["confidence_score"], expected_confidence, places=5
+                )
+
+    async def test_batched_analysis(self):
+        """
+        Tests if a list of texts is tokenized once, run through the model in batches
+        of ``INFERENCE_BATCH_SIZE`` and returned in input order.
+        """
+        logits: list[list[float]] = [
+            [3.0, 0.0, 0.0],
+            [0.0, 3.0, 0.0],
+            [0.0, 0.0, 3.0],
+        ]
+        mock_tokenizer = _mock_tokenizer()
+        mock_model = _mock_model(logits)
+
+        with patch.object(analysis.loader, "_tokenizer", mock_tokenizer):
+            with patch.object(analysis.loader, "_engine", TFEngine(mock_model)):
+                with patch.object(analysis, "BATCH_SIZE", 2):
+                    texts: list[str] = ["Awful.", "It is fine.", "Wonderful!"]
+                    sentiment_results = await analyse_sentiments_async(texts)
+
+        mock_tokenizer.assert_called_once()
+        self.assertEqual(mock_model.call_count, 2)
+        self.assertEqual(
+            [result["sentiment"] for result in sentiment_results],
+            ["negative", "neutral", "positive"],
+        )
+
+    async def test_length_bucketed_batches(self):
+        """
+        Tests if texts are batched by token count, padded only to the longest text
+        of their batch and returned in input order.
+        """
+        logits: list[list[float]] = [
+            [3.0, 0.0, 0.0],
+            [0.0, 3.0, 0.0],
+            [0.0, 0.0, 3.0],
+        ]
+        mock_tokenizer = _mock_tokenizer()
+        mock_model = _mock_model(logits)
+
+        with patch.object(analysis.loader, "_tokenizer", mock_tokenizer):
+            with patch.object(analysis.loader, "_engine", TFEngine(mock_model)):
+                with patch.object(analysis, "BUCKET_BOUNDARIES", [2, 4]):
+                    texts: list[str] = ["one two three", "one", "one two"]
+                    sentiment_results = await analyse_sentiments_async(texts)
 
+        padded_shapes: list[list[int]] = [
+            call.args[0]["input_ids"].shape.as_list() for call in mock_model.call_args_list
+        ]
+        self.assertEqual(padded_shapes, [[2, 2], [1, 3]])
+        self.assertEqual(
+            [result["sentiment"] for result in sentiment_results],
+            ["negative", "neutral", "positive"],
+        )
 
     async def test_preprocessing_error(self):
         """
         Tests if the sentiment analysis function handles preprocessing errors gracefully.
         Mock the tokenizer to raise an error
         """
-        mock_tokenizer = AsyncMock()
+        mock_tokenizer = MagicMock()
         mock_tokenizer.side_effect = ValueError("Invalid input text")
 
-        with patch.object(analyse_sentiment_async, "tokenizer", mock_tokenizer):
+        with patch.object(analysis.loader, "_tokenizer", mock_tokenizer):
             text = "This text has an error"
             sentiment_result = await analyse_sentiment_async(text)
             self.assertEqual(sentiment_result["error"], "Preprocessing error")
@@ -101,19 +180,174 @@ class SentimentAnalysisTest(TestCase):
         Tests if the sentiment analysis function handles TensorFlow errors gracefully.
         Mock the model call to raise an error
         """
-        mock_model = AsyncMock()
-        mock_model.side_effect = tf.errors.OutOfRangeError("Out of range error")
+        mock_model = MagicMock()
+        mock_model.side_effect = tf.errors.OutOfRangeError(None, None, "Out of range error")
 
-        with patch.object(analyse_sentiment_async.model, "__call__", mock_model):
-            text = "Another error"
-            sentiment_result = await analyse_sentiment_async(text)
-            self.assertEqual(sentiment_result["error"], "TensorFlow error")
-            self.assertIsInstance(sentiment_result, dict)
+        with patch.object(analysis.loader, "_tokenizer", _mock_tokenizer()):
+            with patch.object(analysis.loader, "_engine", TFEngine(mock_model)):
+                text = "Another error"
+                sentiment_result = await analyse_sentiment_async(text)
+                self.assertEqual(sentiment_result["error"], "TensorFlow error")
+                self.assertIsInstance(sentiment_result, dict)
 
     async def test_unexpected_error(self):
         """
         Tests if the sentiment analysis function handles unexpected errors gracefully.
         """
-        text = "Unexpected error"
-        with self.assertRaises(Exception):
-            await analyse_sentiment_async(text)
+        mock_model = MagicMock()
+        mock_model.side_effect = RuntimeError("Unexpected error")
+
+        with patch.object(analysis.loader, "_tokenizer", _mock_tokenizer()):
+            with patch.object(analysis.loader, "_engine", TFEngine(mock_model)):
+                text = "Unexpected error"
+                sentiment_result = await analyse_sentiment_async(text)
+                self.assertEqual(sentiment_result["error"], "Unexpected error")
+
+
+def _encode_numbers(texts: list[str], **kwargs) -> dict[str, list[list[int]]]:
+    """Encodes each text of space-separated numbers as those token ids."""
+    input_ids: list[list[int]] = [[0, *map(int, text.split()), 2] for text in texts]
+    return {
+        "input_ids": input_ids,
+        "attention_mask": [[1] * len(ids) for ids in input_ids],
+    }
+
+
+@patch.multiple(
+    analysis,
+    LONG_TEXT_MODE=True,
+    MAX_LENGTH=6,
+    LONG_TEXT_WINDOW_OVERLAP=1,
+    LONG_TEXT_MAX_WINDOWS=8,
+    LONG_TEXT_AGGREGATION="mean",
+)
+class LongTextTest(TestCase):
+    """Tests for analysing texts longer than ``MAX_LENGTH`` in overlapping windows."""
+
+    # Logits per token id, looked up by the first token after the start token
+    LOGITS: list[list[float]] = [
+        [0.0, 0.0, 0.0],
+        [0.0, 0.0, 0.0],
+        [0.0, 0.0, 0.0],
+        [3.0, 0.0, 0.0],
+        [0.0, 0.0, 1.0],
+        [0.0, 2.0, 0.0],
+    ]
+
+    def setUp(self) -> None:
+        self.mock_tokenizer = _mock_tokenizer()
+        self.mock_tokenizer.side_effect = _encode_numbers
+
+        def _call(batch: dict[str, tf.Tensor]) -> SimpleNamespace:
+            rows = [self.LOGITS[row[1]] for row in batch["input_ids"].numpy()]
+            return SimpleNamespace(logits=tf.constant(rows))
+
+        self.mock_model = MagicMock(side_effect=_call)
+
+    def _predict(self, texts: list[str]) -> list[dict[str, float]]:
+        with patch.object(analysis.loader, "_tokenizer", self.mock_tokenizer), patch.object(
+            analysis.loader, "_engine", TFEngine(self.mock_model)
+        ):
+            return analysis.predict_sentiments(texts)
+
+    def test_windows(self) -> None:
+        """
+        Tests if long texts are tokenized without truncation and split into
+        overlapping windows, which are batched together with the short texts.
+        """
+        results: list[dict[str, float]] = self._predict(["3 3 3 4 4 4 4", "5"])
+
+        self.assertFalse(self.mock_tokenizer.call_args.kwargs["truncation"])
+        self.mock_model.assert_called_once()
+        self.assertEqual(
+            self.mock_model.call_args.args[0]["input_ids"].numpy().tolist(),
+            [[0, 5, 2, 1, 1, 1], [0, 3, 3, 3, 4, 2], [0, 4, 4, 4, 4, 2]],
+        )
+        self.assertEqual(
+            [result["sentiment"] for result in results], ["negative", "neutral"]
+        )
+        # The mean of [3, 0, 0] and [0, 0, 1]
+        self.assertAlmostEqual(
+            results[0]["confidence_score"], _softmax([1.5, 0, 0.5])[0], places=5
+        )
+        self.assertAlmostEqual(results[1]["confidence_score"], _softmax([0, 2, 0])[1], places=5)
+
+    def test_max_windows(self) -> None:
+        """
+        Tests if only the first ``LONG_TEXT_MAX_WINDOWS`` windows of a text are
+        analysed.
+        """
+        with patch.object(analysis, "LONG_TEXT_MAX_WINDOWS", 1):
+            results: list[dict[str, float]] = self._predict(["4 4 4 4 3 3 3 3 3 3"])
+
+        self.assertEqual(self.mock_model.call_args.args[0]["input_ids"].shape[0], 1)
+        self.assertEqual(results[0]["sentiment"], "positive")
+
+    def test_aggregation(self) -> None:
+        """
+        Tests if window logits are averaged, weighted by token count or taken from
+        the most confident window, depending on ``LONG_TEXT_AGGREGATION``.
+        """
+        logits: np.ndarray = np.array(
+            [[3.0, 0.0, 0.0], [0.0, 0.0, 1.0], [0.0, 0.0, 1.0], [0.0, 1.0, 0.0]],
+            dtype=np.float32,
+        )
+        owners: list[int] = [0, 0, 0, 1]
+        lengths: list[int] = [2, 10, 10, 3]
+
+        expected: dict[str, list[int]] = {
+            "mean": [0, 1],
+            "weighted": [2, 1],
+            "max": [0, 1],
+        }
+        for aggregation, label_ids in expected.items():
+            with self.subTest(aggregation=aggregation), patch.object(
+                analysis, "LONG_TEXT_AGGREGATION", aggregation
+            ):
+                predicted, scores = analysis._aggregate_windows(logits, owners, lengths, 2)
+                self.assertEqual(predicted.tolist(), label_ids)
+
+        with patch.object(analysis, "LONG_TEXT_AGGREGATION", "max"):
+            _, scores = analysis._aggregate_windows(logits, owners, lengths, 2)
+        self.assertAlmostEqual(float(scores[0]), _softmax([3.0, 0.0, 0.0])[0], places=5)
+
+        with patch.object(analysis, "LONG_TEXT_AGGREGATION", "median"):
+            with self.assertRaises(ImproperlyConfigured):
+                analysis._aggregate_windows(logits, owners, lengths, 2)
+
+
+class ModelLoaderTest(TestCase):
+    """Tests for lazy model loading and warmup."""
+
+    def test_warmup(self):
+        """
+        Tests if warmup runs one batch per length bucket through the model and marks
+        the loader as ready.
+        """
+        mock_model = _mock_model([[0.0, 0.0, 1.0]] * 3)
+        loader = analysis.ModelLoader("unused", "tf")
+        loader._tokenizer = _mock_tokenizer()
+        loader._engine = TFEngine(mock_model)
+
+        with patch.object(analysis, "loader", loader):
+            loader.start_warmup().join()
+
+        self.assertTrue(loader.ready.is_set())
+        padded_widths: list[int] = [
+            call.args[0]["input_ids"].shape[1] for call in mock_model.call_args_list
+        ]
+        self.assertEqual(padded_widths, analysis.BUCKET_BOUNDARIES)
+
+    def test_warmup_error(self):
+        """
+        Tests if a failed warmup leaves the loader not ready and records the error.
+        """
+        loader = analysis.ModelLoader("unused", "tf")
+        loader._tokenizer = _mock_tokenizer()
+        loader._engine = TFEngine(MagicMock(side_effect=RuntimeError("Out of memory")))
+
+        with patch.object(analysis, "loader", loader):
+            loader.start_warmup().join()
+
+        self.assertFalse(loader.ready.is_set())
+        self.assertEqual(loader.error, "Out of memory")
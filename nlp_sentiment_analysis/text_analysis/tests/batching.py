@@ -0,0 +1,108 @@
+import asyncio
+
+from django.test import TestCase
+
+from ..batching import BatchScheduler, QueueFull
+
+
+class BatchSchedulerTest(TestCase):
+    """Tests for the cross-request micro-batching scheduler."""
+
+    def setUp(self) -> None:
+        self.batches: list[list[str]] = []
+
+        async def handler(texts: list[str]) -> list[dict[str, str]]:
+            self.batches.append(texts)
+            return [{"sentiment": text} for text in texts]
+
+        self.handler = handler
+
+    async def test_concurrent_requests_share_a_batch(self) -> None:
+        """
+        Tests if texts submitted by concurrent callers are analysed in one batch and
+        every caller receives its own results in order.
+        """
+        scheduler = BatchScheduler(self.handler, max_batch_size=10, max_wait_ms=50)
+
+        first, second = await asyncio.gather(
+            scheduler.submit(["a", "b"]), scheduler.submit(["c"])
+        )
+
+        self.assertEqual(self.batches, [["a", "b", "c"]])
+        self.assertEqual(first, [{"sentiment": "a"}, {"sentiment": "b"}])
+        self.assertEqual(second, [{"sentiment": "c"}])
+
+    async def test_max_batch_size(self) -> None:
+        """
+        Tests if no batch passed to the handler exceeds ``max_batch_size``.
+        """
+        scheduler = BatchScheduler(self.handler, max_batch_size=2, max_wait_ms=50)
+
+        results = await scheduler.submit(["a", "b", "c", "d", "e"])
+
+        self.assertEqual(self.batches, [["a", "b"], ["c", "d"], ["e"]])
+        self.assertEqual([result["sentiment"] for result in results], list("abcde"))
+
+    async def test_bounded_wait(self) -> None:
+        """
+        Tests if a partial batch is analysed once ``max_wait_ms`` has passed.
+        """
+        scheduler = BatchScheduler(self.handler, max_batch_size=10, max_wait_ms=10)
+
+        results = await asyncio.wait_for(scheduler.submit(["a"]), timeout=1)
+
+        self.assertEqual(results, [{"sentiment": "a"}])
+        self.assertEqual(scheduler.queue_depth, 0)
+
+    async def test_handler_error(self) -> None:
+        """
+        Tests if an error raised by the handler is propagated to every caller.
+        """
+
+        async def failing_handler(texts: list[str]) -> list[dict[str, str]]:
+            raise RuntimeError("Model failure")
+
+        scheduler = BatchScheduler(failing_handler, max_batch_size=10, max_wait_ms=1)
+
+        with self.assertRaises(RuntimeError):
+            await scheduler.submit(["a"])
+
+    async def test_max_concurrent_batches(self) -> None:
+        """
+        Tests if up to ``max_concurrent_batches`` batches are handled at the same time.
+        """
+        in_flight: list[int] = [0]
+        peak: list[int] = [0]
+
+        async def slow_handler(texts: list[str]) -> list[dict[str, str]]:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+            await asyncio.sleep(0.01)
+            in_flight[0] -= 1
+            return [{"sentiment": text} for text in texts]
+
+        scheduler = BatchScheduler(
+            slow_handler, max_batch_size=1, max_wait_ms=0, max_concurrent_batches=2
+        )
+
+        results = await scheduler.submit(["a", "b", "c", "d"])
+
+        self.assertEqual(peak[0], 2)
+        self.assertEqual([result["sentiment"] for result in results], list("abcd"))
+
+    async def test_max_queue_size(self) -> None:
+        """
+        Tests if submissions which would grow the queue past ``max_queue_size`` are
+        rejected, while an empty queue accepts any submission.
+        """
+        scheduler = BatchScheduler(
+            self.handler, max_batch_size=10, max_wait_ms=50, max_queue_size=3
+        )
+
+        first = asyncio.ensure_future(scheduler.submit(["a", "b", "c", "d"]))
+        await asyncio.sleep(0)
+        with self.assertRaises(QueueFull):
+            await scheduler.submit(["e"])
+
+        self.assertEqual(len(await first), 4)
+        self.assertEqual(self.batches, [["a", "b", "c", "d"]])
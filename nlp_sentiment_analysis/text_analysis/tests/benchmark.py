@@ -0,0 +1,89 @@
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+
+from django.core.asgi import get_asgi_application
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase
+
+from .. import analysis
+from ..benchmark import Scenario, StubEngine, StubTokenizer, compare_runs, run_scenario
+from ..models import Analysis
+
+
+class StubModelTest(TestCase):
+    """Tests for the offline stand-ins for the tokenizer and model."""
+
+    def test_deterministic(self) -> None:
+        """
+        Tests if the stub tokenizer and engine give the same results in every run,
+        independent of padding.
+        """
+        tokenizer = StubTokenizer()
+        encoded: dict[str, list[list[int]]] = tokenizer(["great product", "awful"])
+        self.assertEqual(encoded, StubTokenizer()(["great product", "awful"]))
+        self.assertEqual([len(ids) for ids in encoded["input_ids"]], [4, 3])
+
+        batch: dict[str, np.ndarray] = {
+            "input_ids": np.array([encoded["input_ids"][1] + [1]], dtype=np.int32),
+            "attention_mask": np.array([[1, 1, 1, 0]], dtype=np.int32),
+        }
+        unpadded: dict[str, np.ndarray] = {
+            name: values[:, :3] for name, values in batch.items()
+        }
+        labels, scores = StubEngine().predict(batch)
+        self.assertEqual(
+            (labels.tolist(), scores.tolist()),
+            tuple(values.tolist() for values in StubEngine().predict(unpadded)),
+        )
+
+    def test_compare_runs(self) -> None:
+        """
+        Tests if scenarios slower than the baseline by more than the tolerance are
+        reported as regressions.
+        """
+
+        def _run(texts_per_second: float, p99: float) -> dict:
+            return {
+                "results": [
+                    {
+                        "key": "batch=1",
+                        "texts_per_second": texts_per_second,
+                        "latency_ms": {"p99": p99},
+                    }
+                ]
+            }
+
+        self.assertEqual(compare_runs(_run(100, 10), _run(95, 10.5), tolerance=0.1), [])
+        self.assertEqual(len(compare_runs(_run(100, 10), _run(80, 20), tolerance=0.1)), 2)
+
+
+class BenchmarkScenarioTest(TransactionTestCase):
+    """Tests for running benchmark scenarios against the ASGI application."""
+
+    async def test_run_scenario(self) -> None:
+        """
+        Tests if every request of a scenario is analysed, cached texts are not
+        analysed again and the results are reported, without touching the
+        configured cache.
+        """
+        await cache.aset("unrelated", "kept")
+        scenario = Scenario(batch_size=4, lengths="mixed", hit_ratio=0.5, concurrency=2)
+
+        mock_tokenizer = MagicMock(wraps=StubTokenizer())
+        mock_tokenizer.pad_token_id = StubTokenizer.pad_token_id
+
+        with patch.object(analysis.loader, "_tokenizer", mock_tokenizer), patch.object(
+            analysis.loader, "_engine", StubEngine()
+        ):
+            result: dict = await run_scenario(get_asgi_application(), scenario, requests=3)
+
+        self.assertEqual(result["key"], scenario.key)
+        self.assertEqual((result["texts"], result["errors"]), (12, 0))
+        self.assertGreater(result["texts_per_second"], 0)
+        self.assertLessEqual(result["latency_ms"]["p50"], result["latency_ms"]["p99"])
+        self.assertEqual(
+            sum(len(call.args[0]) for call in mock_tokenizer.call_args_list), 6
+        )
+        self.assertEqual(await Analysis.objects.acount(), 12)
+        self.assertEqual(await cache.aget("unrelated"), "kept")
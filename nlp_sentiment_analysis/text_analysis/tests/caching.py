@@ -1,71 +1,245 @@
 from unittest.mock import AsyncMock, patch
-from typing import Union, Optional
 
-from django.test import TestCase
+from django.conf import settings
+from django.test import TestCase, override_settings
 from django.core.cache import cache
 
-from ..analysis import analyse_sentiment_async
+from ..caching import (
+    CACHE_KEY_PREFIX,
+    MODEL_ID,
+    LocalCache,
+    ResultCache,
+    build_model_id,
+    make_cache_key,
+    result_cache,
+    text_hash,
+)
+from ..models import SentimentResult
 from ..views import BulkAnalysisViewSet
 
 
 class CacheTest(TestCase):
     """Tests for the caching functionality in BulkAnalysisViewSet."""
 
-    @patch.object(cache, "get")
-    def test_cache_hit(self, mock_cache_get: AsyncMock) -> None:
+    def setUp(self) -> None:
+        result_cache.local.clear()
+
+    def test_cache_key(self) -> None:
+        """
+        Tests if cache keys are fixed-length digests of the normalised text,
+        namespaced by the model id.
+        """
+        key: str = make_cache_key("This movie is fantastic!")
+
+        self.assertTrue(key.startswith(f"{CACHE_KEY_PREFIX}:"))
+        self.assertEqual(len(key), len(make_cache_key("x" * 10_000)))
+        self.assertEqual(key, make_cache_key("  This movie is fantastic!\n"))
+        self.assertNotEqual(key, make_cache_key("This movie is terrible!"))
+
+    @override_settings(LONG_TEXT_MODE=False)
+    def test_model_id(self) -> None:
+        """
+        Tests if results of each engine and precision are kept apart.
+        """
+        with override_settings(SENTIMENT_ENGINE="tf"):
+            tf_id: str = build_model_id()
+        with override_settings(SENTIMENT_ENGINE="onnx", ONNX_MODEL_PATH="/models/model.onnx"):
+            onnx_id: str = build_model_id()
+        with override_settings(
+            SENTIMENT_ENGINE="onnx", ONNX_MODEL_PATH="/models/model.int8.onnx"
+        ):
+            int8_id: str = build_model_id()
+
+        self.assertTrue(tf_id.startswith(f"{settings.MODEL_NAME}:{settings.MODEL_VERSION}:"))
+        self.assertEqual(
+            [tf_id.rpartition(":")[2], onnx_id.rpartition(":")[2], int8_id.rpartition(":")[2]],
+            ["tf-fp32", "onnx-fp32", "onnx-int8"],
+        )
+
+    @patch.object(cache, "aset_many", new_callable=AsyncMock)
+    @patch.object(cache, "aget_many", new_callable=AsyncMock)
+    async def test_cache_hit(self, mock_cache_get_many: AsyncMock, mock_cache_set_many: AsyncMock) -> None:
         """
         Tests if the viewset retrieves sentiment results from the cache when a hit occurs.
 
         Mocks the cache to return a pre-existing sentiment result and asserts that the
-        cached value is returned and the cache lookup is performed with the correct key.
+        cached value is returned, the lookup is performed with the hashed key in a
+        single round-trip and no analysis is performed.
         """
-
-        mock_cache_get.return_value = {"sentiment": "positive", "confidence_score": 0.8}
         text: str = "This movie is fantastic!"
+        mock_cache_get_many.return_value = {
+            make_cache_key(text): {"sentiment": "positive", "confidence_score": 0.8}
+        }
 
         view = BulkAnalysisViewSet()
-        sentiment_results: list[dict[str, float]] = view._get_sentiment_results_from_cache([text])
+        with patch.object(view, "analyse_texts", new_callable=AsyncMock) as mock_analyse:
+            sentiment_results: list[dict[str, float]] = await view._get_sentiment_results([text])
 
-        mock_cache_get.assert_called_once_with(f"sentiment:{text}")
+        mock_cache_get_many.assert_awaited_once_with([make_cache_key(text)])
+        mock_analyse.assert_not_awaited()
+        mock_cache_set_many.assert_not_awaited()
         self.assertEqual(sentiment_results, [{"sentiment": "positive", "confidence_score": 0.8}])
 
-    @patch.object(cache, "get")
-    def test_cache_miss(self, mock_cache_get: AsyncMock) -> None:
+    @patch.object(cache, "aset_many", new_callable=AsyncMock)
+    @patch.object(cache, "aget_many", new_callable=AsyncMock)
+    async def test_cache_miss(self, mock_cache_get_many: AsyncMock, mock_cache_set_many: AsyncMock) -> None:
         """
         Tests if the viewset performs sentiment analysis when a cache miss occurs.
 
-        Mocks the cache to return None and asserts that the cache is looked up with the
-        correct key and an empty list is returned.
+        Mocks the cache to return no results and asserts that only the missing texts
+        are analysed.
         """
-
-        mock_cache_get.return_value = None
+        cached_text: str = "This movie is fantastic!"
         text: str = "This product is a disappointment."
+        mock_cache_get_many.return_value = {
+            make_cache_key(cached_text): {"sentiment": "positive", "confidence_score": 0.8}
+        }
 
         view = BulkAnalysisViewSet()
-        sentiment_results: list[dict[str, float]] = view._get_sentiment_results_from_cache([text])
-
-        mock_cache_get.assert_called_once_with(f"sentiment:{text}")
-        self.assertEqual(sentiment_results, [])
-
-    @patch.object(cache, "set")
-    def test_cache_update(self, mock_cache_set: AsyncMock) -> None:
+        with patch.object(view, "analyse_texts", new_callable=AsyncMock) as mock_analyse:
+            mock_analyse.return_value = [{"sentiment": "negative", "confidence_score": 0.7}]
+            sentiment_results: list[dict[str, float]] = await view._get_sentiment_results(
+                [cached_text, text]
+            )
+
+        mock_analyse.assert_awaited_once_with([text])
+        self.assertEqual(
+            sentiment_results,
+            [
+                {"sentiment": "positive", "confidence_score": 0.8},
+                {"sentiment": "negative", "confidence_score": 0.7},
+            ],
+        )
+
+    @patch.object(cache, "aset_many", new_callable=AsyncMock)
+    @patch.object(cache, "aget_many", new_callable=AsyncMock)
+    async def test_cache_update(self, mock_cache_get_many: AsyncMock, mock_cache_set_many: AsyncMock) -> None:
         """
         Tests if the viewset updates the cache with analyzed sentiment results.
 
-        Mocks the sentiment analysis to return a result and simulates the internal logic
-        of the view when a cache miss occurs. Asserts that the cache is updated with the
-        analyzed sentiment result using the correct key and no timeout is set.
-
-        Simulate calling the private method with mocked sentiment analysis
+        Asserts that the new results are written with a single ``set_many`` and that
+        failed analyses are not cached.
         """
-
+        mock_cache_get_many.return_value = {}
         sentiment_result: dict[str, float] = {"sentiment": "negative", "confidence_score": 0.7}
+        text: str = "This service is terrible."
 
-        def mock_analyse_sentiment(text: str) -> dict[str, float]:
-            return sentiment_result
+        view = BulkAnalysisViewSet()
+        with patch.object(view, "analyse_texts", new_callable=AsyncMock) as mock_analyse:
+            mock_analyse.return_value = [sentiment_result, {"error": "Unexpected error"}]
+            await view._get_sentiment_results([text, "Unexpected error"])
+
+        mock_cache_set_many.assert_awaited_once_with(
+            {make_cache_key(text): sentiment_result}, timeout=settings.SENTIMENT_CACHE_TIMEOUT
+        )
 
+    @patch.object(cache, "aset_many", new_callable=AsyncMock)
+    @patch.object(cache, "aget_many", new_callable=AsyncMock)
+    async def test_duplicate_texts(self, mock_cache_get_many: AsyncMock, mock_cache_set_many: AsyncMock) -> None:
+        """
+        Tests if texts repeated within one request are looked up and analysed once.
+        """
+        mock_cache_get_many.return_value = {}
         text: str = "This service is terrible."
+
         view = BulkAnalysisViewSet()
-        view._get_sentiment_results_from_cache([text], mock_analyse_sentiment)
+        with patch.object(view, "analyse_texts", new_callable=AsyncMock) as mock_analyse:
+            mock_analyse.return_value = [{"sentiment": "negative", "confidence_score": 0.7}]
+            sentiment_results: list[dict[str, float]] = await view._get_sentiment_results(
+                [text, text, f" {text} "]
+            )
+
+        mock_cache_get_many.assert_awaited_once_with([make_cache_key(text)])
+        mock_analyse.assert_awaited_once_with([text])
+        self.assertEqual(len(sentiment_results), 3)
+
+
+class LocalCacheTest(TestCase):
+    """Tests for the in-process LRU tier of the result cache."""
 
-        mock_cache_set.assert_called_once_with(f"sentiment:{text}", sentiment_result, timeout=None)
+    def test_entry_bound(self) -> None:
+        """
+        Tests if the least recently used entry is evicted once ``max_entries`` is reached.
+        """
+        local = LocalCache(max_entries=2, max_bytes=1024 * 1024, timeout=60)
+        local.set_many({"a": 1, "b": 2})
+        local.get_many(["a"])
+        local.set_many({"c": 3})
+
+        self.assertEqual(local.get_many(["a", "b", "c"]), {"a": 1, "c": 3})
+
+    def test_byte_bound(self) -> None:
+        """
+        Tests if entries are evicted once their approximate size exceeds ``max_bytes``.
+        """
+        local = LocalCache(max_entries=100, max_bytes=1000, timeout=60)
+        local.set_many({str(index): "x" * 200 for index in range(10)})
+
+        self.assertLessEqual(local.size, 1000)
+        self.assertLess(len(local), 10)
+        self.assertIn("9", local.get_many(["9"]))
+
+    def test_timeout(self) -> None:
+        """
+        Tests if expired entries are no longer returned.
+        """
+        local = LocalCache(max_entries=100, max_bytes=1024 * 1024, timeout=0)
+        local.set_many({"a": 1})
+
+        self.assertEqual(local.get_many(["a"]), {})
+        self.assertEqual(len(local), 0)
+
+    @patch.object(cache, "aget_many", new_callable=AsyncMock)
+    async def test_tiers(self, mock_cache_get_many: AsyncMock) -> None:
+        """
+        Tests if shared cache hits are promoted to the local tier and counted per tier.
+        """
+        mock_cache_get_many.return_value = {"a": 1}
+        tiered = ResultCache(LocalCache(max_entries=10, max_bytes=1024 * 1024, timeout=60), 60)
+
+        self.assertEqual(await tiered.aget_many(["a", "b"]), {"a": 1})
+        self.assertEqual(await tiered.aget_many(["a"]), {"a": 1})
+
+        mock_cache_get_many.assert_awaited_once_with(["a", "b"])
+        self.assertEqual(
+            tiered.stats(),
+            {"local": {"hits": 1, "misses": 2}, "shared": {"hits": 1, "misses": 1}},
+        )
+
+
+class DurableCacheTest(TestCase):
+    """Tests for the Postgres tier of the result cache."""
+
+    def setUp(self) -> None:
+        self.cache = ResultCache(
+            LocalCache(max_entries=10, max_bytes=1024 * 1024, timeout=60), 60, durable=True
+        )
+
+    @patch.object(cache, "aset_many", new_callable=AsyncMock)
+    @patch.object(cache, "aget_many", new_callable=AsyncMock)
+    async def test_stored_results(
+        self, mock_cache_get_many: AsyncMock, mock_cache_set_many: AsyncMock
+    ) -> None:
+        """
+        Tests if new results are stored once per text hash and model, and texts
+        missing from Redis are found in Postgres and copied back into Redis.
+        """
+        mock_cache_get_many.return_value = {}
+        key: str = make_cache_key("This service is terrible.")
+        result: dict[str, float] = {"sentiment": "negative", "confidence_score": 0.7}
+
+        await self.cache.aset_many({key: result})
+        await self.cache.aset_many({key: result})
+        self.cache.local.clear()
+
+        self.assertEqual(
+            await SentimentResult.objects.filter(
+                text_hash=text_hash("This service is terrible."), model=MODEL_ID
+            ).acount(),
+            1,
+        )
+        self.assertEqual(
+            await self.cache.aget_many([key, make_cache_key("Unseen text")]), {key: result}
+        )
+        mock_cache_set_many.assert_awaited_with({key: result}, timeout=60)
+        self.assertEqual(self.cache.stats()["durable"], {"hits": 1, "misses": 1})
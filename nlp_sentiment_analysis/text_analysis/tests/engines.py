@@ -0,0 +1,253 @@
+import importlib.util
+import multiprocessing
+import tempfile
+
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import skipUnless
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import tensorflow as tf
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+
+from .. import analysis
+from ..analysis import ModelLoader, predict_sentiments
+from ..engines import ONNXEngine, TFEngine, load_engine, save_external_weights
+
+
+CORPUS_PATH: Path = Path(__file__).parent / "fixtures" / "sentiment_corpus.txt"
+
+
+class _FakeModel:
+    """Predicts the label given by the first input id of each row."""
+
+    config = SimpleNamespace(pad_token_id=1)
+
+    def __init__(self) -> None:
+        self.widths: list[int] = []
+
+    def __call__(self, inputs: dict[str, tf.Tensor], training: bool = False) -> SimpleNamespace:
+        self.widths.append(inputs["input_ids"].shape[1])
+        return SimpleNamespace(logits=tf.one_hot(inputs["input_ids"][:, 0], 3) * 4.0)
+
+
+class TFEngineTest(TestCase):
+    """Tests for the compiled TensorFlow engine."""
+
+    def test_compiled_buckets(self) -> None:
+        """
+        Tests if batches are padded to their length bucket so each bucket is traced
+        once, whatever the batch size or unpadded length.
+        """
+        model = _FakeModel()
+        engine = TFEngine(model, compiled=True, bucket_boundaries=[4, 8])
+
+        for batch_size, width in [(2, 3), (5, 2), (1, 6), (3, 8)]:
+            batch: dict[str, np.ndarray] = {
+                "input_ids": np.full((batch_size, width), 2, dtype=np.int32),
+                "attention_mask": np.ones((batch_size, width), dtype=np.int32),
+            }
+            label_ids, scores = engine.predict(batch)
+
+            self.assertEqual(label_ids.tolist(), [2] * batch_size)
+            np.testing.assert_allclose(scores, [np.exp(4) / (np.exp(4) + 2)] * batch_size, rtol=1e-5)
+
+        self.assertEqual(engine.trace_count, 2)
+        self.assertEqual(engine.trace_counts, {4: 1, 8: 1})
+        self.assertEqual(model.widths, [4, 8])
+
+    def test_compiled_logits(self) -> None:
+        """
+        Tests if logits are returned by their own compiled graph per length bucket.
+        """
+        engine = TFEngine(_FakeModel(), compiled=True, bucket_boundaries=[4, 8])
+        batch: dict[str, np.ndarray] = {
+            "input_ids": np.array([[0, 2, 2], [2, 2, 2]], dtype=np.int32),
+            "attention_mask": np.ones((2, 3), dtype=np.int32),
+        }
+
+        engine.predict(batch)
+        logits: np.ndarray = engine.predict_logits(batch)
+
+        np.testing.assert_allclose(logits, [[4.0, 0.0, 0.0], [0.0, 0.0, 4.0]])
+        self.assertEqual(engine.trace_count, 2)
+
+
+class ONNXEngineTest(TestCase):
+    """Tests for the ONNX Runtime inference engine."""
+
+    def test_predict(self) -> None:
+        """
+        Tests if the engine feeds the session's inputs and returns the top label and
+        its softmax probability for each row.
+        """
+        session = MagicMock()
+        session.get_inputs.return_value = [MagicMock(), MagicMock()]
+        session.get_inputs.return_value[0].name = "input_ids"
+        session.get_inputs.return_value[1].name = "attention_mask"
+        session.run.return_value = [np.array([[0.0, 0.0, 2.0], [1.0, 0.0, 0.0]])]
+        batch: dict[str, np.ndarray] = {
+            "input_ids": np.ones((2, 3), dtype=np.int32),
+            "attention_mask": np.ones((2, 3), dtype=np.int32),
+        }
+
+        label_ids, scores = ONNXEngine(session).predict(batch)
+
+        self.assertEqual(session.run.call_args.args[1].keys(), batch.keys())
+        self.assertEqual(label_ids.tolist(), [2, 0])
+        np.testing.assert_allclose(
+            scores, [np.exp(2) / (np.exp(2) + 2), np.e / (np.e + 2)], rtol=1e-6
+        )
+
+
+def _private_kb() -> int:
+    """The memory of this process not shared with any other, in kB."""
+    with open("/proc/self/smaps_rollup") as smaps:
+        fields: dict[str, str] = dict(
+            line.split(":", 1) for line in smaps.read().splitlines()[1:]
+        )
+    return sum(int(fields[name].split()[0]) for name in ("Private_Clean", "Private_Dirty"))
+
+
+def _run_worker(model_path: str, shared_weights: bool, barrier, results) -> None:
+    """Loads the engine like a web worker and reports the memory it took."""
+    try:
+        before: int = _private_kb()
+        engine = ONNXEngine.from_path(model_path, shared_weights=shared_weights)
+        engine.predict({"input_ids": np.ones((2, 8), dtype=np.int32)})
+        # Pages of a mapped file only count as shared while another process maps them
+        barrier.wait(60)
+        results.put(_private_kb() - before)
+        barrier.wait(60)
+    except Exception as e:
+        barrier.abort()
+        results.put(repr(e))
+
+
+@skipUnless(
+    importlib.util.find_spec("onnx") and importlib.util.find_spec("onnxruntime"),
+    "Requires the onnx and onnxruntime packages.",
+)
+@skipUnless(Path("/proc/self/smaps_rollup").exists(), "Requires Linux /proc.")
+class SharedWeightsTest(TestCase):
+    """Tests for sharing the ONNX weights across worker processes."""
+
+    WORKERS: int = 3
+    HIDDEN_SIZE: int = 2048
+
+    def setUp(self) -> None:
+        import onnx
+        from onnx import TensorProto, helper, numpy_helper
+
+        rng: np.random.Generator = np.random.default_rng(0)
+        weights: dict[str, np.ndarray] = {
+            "embeddings": rng.random((256, self.HIDDEN_SIZE), dtype=np.float32),
+            "dense": rng.random((self.HIDDEN_SIZE, 2 * self.HIDDEN_SIZE), dtype=np.float32),
+            "classifier": rng.random((2 * self.HIDDEN_SIZE, 3), dtype=np.float32),
+        }
+        self.weights_kb: int = sum(values.nbytes for values in weights.values()) // 1024
+        graph = helper.make_graph(
+            [
+                helper.make_node("Gather", ["embeddings", "input_ids"], ["embedded"]),
+                helper.make_node("ReduceMean", ["embedded"], ["pooled"], axes=[1], keepdims=0),
+                helper.make_node("MatMul", ["pooled", "dense"], ["hidden"]),
+                helper.make_node("MatMul", ["hidden", "classifier"], ["logits"]),
+            ],
+            "sentiment",
+            [helper.make_tensor_value_info("input_ids", TensorProto.INT32, [None, None])],
+            [helper.make_tensor_value_info("logits", TensorProto.FLOAT, [None, 3])],
+            [numpy_helper.from_array(values, name) for name, values in weights.items()],
+        )
+        model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 17)])
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.model_path: str = str(Path(self.directory.name) / "model.onnx")
+        onnx.save(model, self.model_path)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def _measure(self, shared_weights: bool) -> list[int]:
+        """
+        Forks ``WORKERS`` processes which each load the model, like gunicorn forks
+        its workers, and returns the private memory each one took for it in kB.
+        """
+        context = multiprocessing.get_context("fork")
+        barrier = context.Barrier(self.WORKERS)
+        results = context.Queue()
+        workers: list[multiprocessing.Process] = [
+            context.Process(
+                target=_run_worker, args=(self.model_path, shared_weights, barrier, results)
+            )
+            for _ in range(self.WORKERS)
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            private_kb: list = [results.get(timeout=120) for _ in workers]
+        finally:
+            for worker in workers:
+                worker.join(60)
+        for value in private_kb:
+            self.assertIsInstance(value, int, f"A worker failed: {value}")
+        return private_kb
+
+    def test_worker_memory(self) -> None:
+        """
+        Tests if each worker holds its own copy of the weights by default, but only
+        a small fraction of them once they are shared.
+        """
+        copied: list[int] = self._measure(shared_weights=False)
+        self.assertGreater(min(copied), self.weights_kb * 0.75)
+
+        save_external_weights(self.model_path)
+        self.assertTrue(Path(f"{self.model_path}.data").exists())
+        shared: list[int] = self._measure(shared_weights=True)
+        self.assertLess(max(shared), self.weights_kb * 0.25)
+
+    def test_requires_external_weights(self) -> None:
+        """
+        Tests if shared weights are refused for models which embed their weights,
+        and for the TensorFlow engine.
+        """
+        with self.assertRaises(ImproperlyConfigured):
+            ONNXEngine.from_path(self.model_path, shared_weights=True)
+
+        with override_settings(SHARED_MODEL_WEIGHTS=True):
+            with self.assertRaises(ImproperlyConfigured):
+                load_engine("tf")
+
+
+@skipUnless(
+    Path(settings.ONNX_MODEL_PATH).exists(),
+    "No ONNX model at ONNX_MODEL_PATH, run manage.py export_onnx first.",
+)
+class ONNXParityTest(TestCase):
+    """Checks that the ONNX export agrees with the TensorFlow model."""
+
+    # Quantization may flip a few borderline predictions
+    MIN_LABEL_AGREEMENT: float = 0.9
+
+    def test_label_agreement(self) -> None:
+        """
+        Tests if both engines predict the same labels for the fixture corpus.
+        """
+        texts: list[str] = CORPUS_PATH.read_text(encoding="utf-8").splitlines()
+
+        results: dict[str, list[dict[str, float]]] = {}
+        for engine_name in ("tf", "onnx"):
+            loader = ModelLoader(settings.MODEL_NAME, engine_name)
+            with patch.object(analysis, "loader", loader):
+                results[engine_name] = predict_sentiments(texts)
+
+        agreement: float = np.mean(
+            [
+                tf_result["sentiment"] == onnx_result["sentiment"]
+                for tf_result, onnx_result in zip(results["tf"], results["onnx"])
+            ]
+        )
+        self.assertGreaterEqual(agreement, self.MIN_LABEL_AGREEMENT)
@@ -0,0 +1,205 @@
+import asyncio
+import tempfile
+
+from pathlib import Path
+from typing import Any
+from unittest.mock import AsyncMock, patch
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from .. import analysis
+from ..analysis import analyse_sentiments_async
+from ..batching import QueueFull
+from ..inference_server import (
+    OP_ANALYSE,
+    InferenceServer,
+    ProtocolError,
+    RemoteEngine,
+    RemoteEngineError,
+    decode_request,
+    decode_results,
+    encode_request,
+    encode_results,
+)
+
+
+async def _analyse(texts: list[str]) -> list[dict[str, Any]]:
+    return [
+        {"sentiment": "positive", "confidence_score": 0.75}
+        if "good" in text
+        else {"error": "Preprocessing error"}
+        for text in texts
+    ]
+
+
+class ProtocolTest(TestCase):
+    """Tests for encoding messages between web workers and the inference server."""
+
+    def test_round_trip(self) -> None:
+        """
+        Tests if texts and results, including errors, are decoded as encoded.
+        """
+        texts: list[str] = ["A good day", "", "Ünïcødé ✓\nacross lines"]
+        self.assertEqual(decode_request(encode_request(OP_ANALYSE, texts)), (OP_ANALYSE, texts))
+
+        results: list[dict[str, Any]] = [
+            {"sentiment": "negative", "confidence_score": 0.5},
+            {"error": "TensorFlow error"},
+        ]
+        self.assertEqual(decode_results(encode_results(results)), results)
+
+    def test_malformed(self) -> None:
+        """
+        Tests if truncated requests and unknown protocol versions are rejected.
+        """
+        payload: bytes = encode_request(OP_ANALYSE, ["A good day"])
+        with self.assertRaises(ProtocolError):
+            decode_request(payload[:-1])
+        with self.assertRaises(ProtocolError):
+            decode_request(bytes([99]) + payload[1:])
+
+
+class InferenceServerTest(TestCase):
+    """Tests for analysing texts on the inference server over a Unix socket."""
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.socket_path: str = str(Path(self.directory.name) / "inference.sock")
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def _engine(self, **kwargs: Any) -> RemoteEngine:
+        options: dict[str, Any] = {"pool_size": 2, "timeout": 1.0, "retry_after": 60.0}
+        return RemoteEngine(self.socket_path, **{**options, **kwargs})
+
+    async def test_analyse(self) -> None:
+        """
+        Tests if concurrent requests are answered over at most ``pool_size``
+        connections, which are kept for later requests.
+        """
+        handler = AsyncMock(side_effect=_analyse)
+        server = InferenceServer(handler, self.socket_path)
+        await server.start()
+        engine: RemoteEngine = self._engine()
+        try:
+            results: list[list[dict[str, Any]]] = await asyncio.gather(
+                *(engine.analyse([f"good {index}", "bad"]) for index in range(4))
+            )
+            self.assertTrue(await engine.ping())
+            self.assertEqual(len(server._connections), 2)
+        finally:
+            await server.close()
+
+        self.assertEqual(handler.await_count, 4)
+        for result in results:
+            self.assertEqual(result[0], {"sentiment": "positive", "confidence_score": 0.75})
+            self.assertEqual(result[1], {"error": "Preprocessing error"})
+        self.assertFalse(Path(self.socket_path).exists())
+
+    async def test_not_ready(self) -> None:
+        """
+        Tests if pings fail until the server's model is ready.
+        """
+        server = InferenceServer(_analyse, self.socket_path, is_ready=lambda: False)
+        await server.start()
+        try:
+            self.assertFalse(await self._engine().ping())
+        finally:
+            await server.close()
+
+    async def test_queue_full(self) -> None:
+        """
+        Tests if a full inference queue on the server is raised as ``QueueFull``.
+        """
+        server = InferenceServer(
+            AsyncMock(side_effect=QueueFull("4096 texts are already queued.")),
+            self.socket_path,
+        )
+        await server.start()
+        engine: RemoteEngine = self._engine()
+        try:
+            with self.assertRaisesMessage(QueueFull, "4096 texts are already queued."):
+                await engine.analyse(["good"])
+        finally:
+            await server.close()
+        self.assertTrue(engine.available)
+
+    async def test_timeout(self) -> None:
+        """
+        Tests if requests which are not answered in time fail, and the server is
+        then skipped for ``retry_after`` seconds.
+        """
+
+        async def _slow(texts: list[str]) -> list[dict[str, Any]]:
+            await asyncio.sleep(5)
+            return await _analyse(texts)
+
+        server = InferenceServer(_slow, self.socket_path)
+        await server.start()
+        engine: RemoteEngine = self._engine(timeout=0.05)
+        try:
+            with self.assertRaises(RemoteEngineError):
+                await engine.analyse(["good"])
+        finally:
+            await server.close()
+        self.assertFalse(engine.available)
+
+    async def test_server_restart(self) -> None:
+        """
+        Tests if pooled connections to a restarted server are replaced.
+        """
+        engine: RemoteEngine = self._engine()
+        for _ in range(2):
+            server = InferenceServer(_analyse, self.socket_path)
+            await server.start()
+            try:
+                self.assertEqual(
+                    await engine.analyse(["good"]),
+                    [{"sentiment": "positive", "confidence_score": 0.75}],
+                )
+            finally:
+                await server.close()
+
+    async def test_fallback(self) -> None:
+        """
+        Tests if texts are analysed in-process while the server is unavailable,
+        unless the fallback is turned off.
+        """
+        engine: RemoteEngine = self._engine()
+        fallback: list[dict[str, Any]] = [{"sentiment": "neutral", "confidence_score": 0.5}]
+
+        with patch.object(analysis, "remote_engine", engine), patch.object(
+            analysis.scheduler, "submit", AsyncMock(return_value=fallback)
+        ) as mock_submit:
+            self.assertEqual(await analyse_sentiments_async(["good"]), fallback)
+            self.assertFalse(engine.available)
+
+            with override_settings(INFERENCE_SERVER_FALLBACK=False):
+                self.assertEqual(
+                    await analyse_sentiments_async(["good"]),
+                    [{"error": "Inference server unavailable"}],
+                )
+        mock_submit.assert_awaited_once_with(["good"])
+
+
+class RemoteReadinessTest(APITestCase):
+    """Tests for the readiness probe of web workers using an inference server."""
+
+    def test_ready(self) -> None:
+        """
+        Tests if workers are ready while the inference server is, even though
+        they have not loaded the model themselves.
+        """
+        engine = RemoteEngine("unused", pool_size=1, timeout=1.0, retry_after=0.0)
+
+        with patch.object(engine, "ping", AsyncMock(return_value=True)), patch(
+            "text_analysis.views.remote_engine", engine
+        ):
+            response = self.client.get(reverse("healthz-ready"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {"status": "ready", "engine": "remote"})
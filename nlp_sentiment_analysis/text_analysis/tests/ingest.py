@@ -0,0 +1,133 @@
+import json
+import tempfile
+
+from io import StringIO
+from pathlib import Path
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from .. import analysis
+from ..ingest import read_texts
+from ..management.commands import analyse_file
+from ..models import Analysis, IngestCheckpoint
+
+
+def _predict(texts: list[str]) -> list[dict[str, float]]:
+    return [{"sentiment": "negative", "confidence_score": 0.6} for _ in texts]
+
+
+class AnalyseFileTest(TestCase):
+    """Tests for the analyse_file management command."""
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def test_read_csv(self) -> None:
+        """
+        Tests if CSV records, including quoted multi-line texts, are streamed with
+        offsets which resume reading at the next record.
+        """
+        path: Path = self.directory / "texts.csv"
+        path.write_text('id,text\n1,First text\n2,"Second\ntext, quoted"\n3,Third text\n')
+
+        texts: list[tuple[str, int]] = list(read_texts(path, "csv", "text"))
+        self.assertEqual(
+            [text for text, _ in texts], ["First text", "Second\ntext, quoted", "Third text"]
+        )
+        self.assertEqual(
+            [text for text, _ in read_texts(path, "csv", "text", texts[1][1])], ["Third text"]
+        )
+
+    def test_analyse_file(self) -> None:
+        """
+        Tests if all texts are saved in batches and a second run resumes from the
+        checkpoint instead of analysing the file again.
+        """
+        path: Path = self.directory / "texts.jsonl"
+        path.write_text(
+            "".join(json.dumps({"text": f"Text number {index}"}) + "\n" for index in range(5))
+        )
+
+        with patch.object(analyse_file, "analyse_batch", side_effect=_predict) as mock_analyse:
+            call_command("analyse_file", str(path), "--batch-size", "2", stdout=StringIO())
+            self.assertEqual(mock_analyse.call_count, 3)
+
+            call_command("analyse_file", str(path), stdout=StringIO())
+            self.assertEqual(mock_analyse.call_count, 3)
+
+        self.assertEqual(
+            list(Analysis.objects.order_by("id").values_list("text", "sentiment")),
+            [(f"Text number {index}", "negative") for index in range(5)],
+        )
+        checkpoint: IngestCheckpoint = IngestCheckpoint.objects.get(name=str(path.resolve()))
+        self.assertEqual((checkpoint.offset, checkpoint.rows), (path.stat().st_size, 5))
+
+    def test_checkpoint_transaction(self) -> None:
+        """
+        Tests if the analyses of a batch are only saved together with its checkpoint.
+        """
+        path: Path = self.directory / "texts.csv"
+        path.write_text("text\nFirst text\n")
+
+        with patch.object(analyse_file, "analyse_batch", side_effect=_predict), patch.object(
+            analyse_file, "write_checkpoint", side_effect=RuntimeError("Disk full")
+        ):
+            with self.assertRaisesMessage(RuntimeError, "Disk full"):
+                call_command("analyse_file", str(path), stdout=StringIO())
+
+        self.assertFalse(Analysis.objects.exists())
+        self.assertFalse(IngestCheckpoint.objects.exists())
+
+    def test_invalid_record(self) -> None:
+        """
+        Tests if JSON Lines which are not objects are reported with their offset.
+        """
+        path: Path = self.directory / "texts.jsonl"
+        path.write_text('{"text": "First text"}\n["Second text"]\n')
+
+        with patch.object(analyse_file, "analyse_batch", side_effect=_predict):
+            with self.assertRaisesMessage(
+                CommandError, f"The line at byte 23 of {path} is not a JSON object."
+            ):
+                call_command("analyse_file", str(path), stdout=StringIO())
+
+    def test_dry_run(self) -> None:
+        """
+        Tests if a dry run analyses the texts without saving results or a checkpoint.
+        """
+        path: Path = self.directory / "texts.csv"
+        path.write_text("text\nFirst text\nSecond text\n")
+
+        with patch.object(analyse_file, "analyse_batch", side_effect=_predict) as mock_analyse:
+            call_command("analyse_file", str(path), "--dry-run", stdout=StringIO())
+
+        mock_analyse.assert_called_once_with(["First text", "Second text"])
+        self.assertFalse(Analysis.objects.exists())
+        self.assertFalse(IngestCheckpoint.objects.exists())
+
+    def test_failed_analysis(self) -> None:
+        """
+        Tests if texts whose analysis failed are skipped instead of being saved
+        without a sentiment, and are reported.
+        """
+        path: Path = self.directory / "texts.csv"
+        path.write_text("text\nFirst text\nSecond text\n")
+        results: list[dict] = [
+            {"error": "Preprocessing error"},
+            {"sentiment": "positive", "confidence_score": 0.7},
+        ]
+        stdout = StringIO()
+
+        with patch.object(analysis, "predict_sentiments", return_value=results):
+            call_command("analyse_file", str(path), stdout=stdout)
+
+        self.assertEqual(
+            list(Analysis.objects.values_list("text", "sentiment")),
+            [("Second text", "positive")],
+        )
+        self.assertIn("1 rows could not be analysed", stdout.getvalue())
@@ -0,0 +1,256 @@
+import threading
+
+from datetime import timedelta
+from io import StringIO
+
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from .. import jobs
+from ..caching import MODEL_ID, result_cache, text_hash
+from ..jobs import create_job, process_batch
+from ..models import Analysis, AnalysisJob, QueuedText, SentimentResult
+
+
+def _predict(texts: list[str]) -> list[dict[str, float]]:
+    return [{"sentiment": "positive", "confidence_score": 0.9} for _ in texts]
+
+
+class AnalysisJobTest(APITestCase):
+    """Tests for the AnalysisJobViewSet and the job worker."""
+
+    def setUp(self) -> None:
+        result_cache.local.clear()
+        cache.clear()
+
+    def test_create_job(self) -> None:
+        """
+        Tests if posting texts queues a job and returns it without analysing anything.
+        """
+        texts: list[str] = ["This movie is great!", "This product is a disappointment."]
+        with patch.object(jobs, "analyse_texts") as mock_predict:
+            response = self.client.post(reverse("jobs-list"), {"texts": texts}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        mock_predict.assert_not_called()
+        data = response.json()
+        self.assertEqual(data["status"], "pending")
+        self.assertEqual((data["processed"], data["total"]), (0, 2))
+        self.assertTrue(data["results"].endswith(f"/jobs/{data['id']}/results/"))
+        self.assertEqual(QueuedText.objects.filter(job_id=data["id"]).count(), 2)
+
+    def test_missing_texts_field(self) -> None:
+        """
+        Tests if the view handles missing "texts" field in request data.
+        """
+        response = self.client.post(reverse("jobs-list"), {}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_worker(self) -> None:
+        """
+        Tests if the worker analyses queued texts in batches, reports progress and
+        exposes the results, paginated, once the job is done.
+        """
+        job: AnalysisJob = create_job([f"Text number {index}" for index in range(5)])
+
+        with patch.object(jobs, "analyse_texts", side_effect=_predict) as mock_predict:
+            self.assertEqual(process_batch(2), 2)
+
+            response = self.client.get(reverse("jobs-detail", kwargs={"pk": job.pk}))
+            self.assertEqual(response.json()["status"], "running")
+            self.assertEqual(response.json()["processed"], 2)
+
+            call_command("run_sentiment_worker", "--once", "--batch-size", "2", stdout=StringIO())
+
+        self.assertEqual(mock_predict.call_count, 3)
+        job.refresh_from_db()
+        self.assertEqual(job.status, AnalysisJob.StatusChoices.DONE)
+        self.assertEqual(job.processed, 5)
+        self.assertIsNotNone(job.finished_at)
+        self.assertFalse(QueuedText.objects.exists())
+
+        response = self.client.get(
+            reverse("jobs-results", kwargs={"pk": job.pk}), {"page_size": 3}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data["count"], 5)
+        self.assertEqual(
+            [result["text"] for result in data["results"]],
+            ["Text number 0", "Text number 1", "Text number 2"],
+        )
+        self.assertIsNotNone(data["next"])
+
+    def test_cached_texts(self) -> None:
+        """
+        Tests if the worker takes results from the result cache and only runs the
+        other texts through the model.
+        """
+        SentimentResult.objects.create(
+            text_hash=text_hash("Known text"),
+            model=MODEL_ID,
+            sentiment="negative",
+            confidence_score=0.4,
+        )
+        job: AnalysisJob = create_job(["Known text", "New text"])
+
+        with patch.object(jobs, "analyse_texts", side_effect=_predict) as mock_predict:
+            self.assertEqual(process_batch(10), 2)
+
+        mock_predict.assert_called_once_with(["New text"])
+        self.assertEqual(
+            list(job.analyses.order_by("id").values_list("text", "sentiment")),
+            [("Known text", "negative"), ("New text", "positive")],
+        )
+
+    def test_retried_texts(self) -> None:
+        """
+        Tests if texts which cannot be analysed, e.g. because the model is
+        unavailable, are retried once their claim expires, and counted as failed
+        after ``JOB_MAX_ATTEMPTS``, while the other jobs go on.
+        """
+        failing: AnalysisJob = create_job(["Bad text", "Another bad text", "Third"])
+        other: AnalysisJob = create_job(["Good text"])
+
+        def _predict_or_fail(texts: list[str]) -> list[dict[str, float]]:
+            if "Bad text" in texts:
+                raise RuntimeError("Model unavailable")
+            return _predict(texts)
+
+        expired = timezone.now() - timedelta(seconds=settings.JOB_CLAIM_TIMEOUT + 1)
+        with override_settings(JOB_MAX_ATTEMPTS=2), patch.object(
+            jobs, "analyse_texts", side_effect=_predict_or_fail
+        ):
+            self.assertEqual(process_batch(2), 2)
+            self.assertEqual(process_batch(2), 2)
+            self.assertEqual(process_batch(2), 0)
+            self.assertEqual(
+                list(QueuedText.objects.values_list("text", "attempts")),
+                [("Bad text", 1), ("Another bad text", 1)],
+            )
+
+            QueuedText.objects.update(claimed_at=expired)
+            self.assertEqual(process_batch(2), 2)
+            self.assertEqual(process_batch(2), 0)
+
+        failing.refresh_from_db()
+        self.assertEqual(failing.status, AnalysisJob.StatusChoices.DONE)
+        self.assertEqual((failing.processed, failing.failed), (3, 2))
+        self.assertEqual(failing.error, "Model unavailable")
+        self.assertIsNotNone(failing.finished_at)
+        self.assertEqual(list(failing.analyses.values_list("text", flat=True)), ["Third"])
+
+        other.refresh_from_db()
+        self.assertEqual(other.status, AnalysisJob.StatusChoices.DONE)
+        self.assertFalse(QueuedText.objects.exists())
+
+    def test_error_result(self) -> None:
+        """
+        Tests if texts for which an error is returned are counted as failed instead
+        of being saved without a sentiment, while the other texts of the job are
+        saved, and if a job none of whose texts could be analysed fails.
+        """
+        job: AnalysisJob = create_job(["First text", "Second text"])
+
+        with patch.object(
+            jobs,
+            "analyse_texts",
+            return_value=[
+                {"sentiment": "positive", "confidence_score": 0.9},
+                {"error": "Preprocessing error"},
+            ],
+        ):
+            process_batch(10)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed, job.failed), ("done", 2, 1))
+        self.assertEqual(job.error, "Preprocessing error")
+        self.assertEqual(list(Analysis.objects.values_list("text", flat=True)), ["First text"])
+
+        failed: AnalysisJob = create_job(["Third text"])
+        with patch.object(
+            jobs, "analyse_texts", return_value=[{"error": "Preprocessing error"}]
+        ):
+            process_batch(10)
+
+        failed.refresh_from_db()
+        self.assertEqual((failed.status, failed.failed), ("failed", 1))
+        self.assertIsNotNone(failed.finished_at)
+
+    def test_unknown_job(self) -> None:
+        """
+        Tests if unknown jobs are reported as not found.
+        """
+        response = self.client.get(reverse("jobs-detail", kwargs={"pk": 404}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SkipLockedTest(TransactionTestCase):
+    """Tests for running job workers in parallel."""
+
+    def test_skip_locked(self) -> None:
+        """
+        Tests if a worker skips the texts claimed by another worker's open
+        transaction instead of waiting for them or analysing them twice.
+        """
+        job: AnalysisJob = create_job(["one", "two", "three"])
+        claimed = threading.Event()
+        release = threading.Event()
+
+        def _other_worker() -> None:
+            try:
+                with transaction.atomic():
+                    list(QueuedText.objects.select_for_update().order_by("id")[:2])
+                    claimed.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=_other_worker)
+        thread.start()
+        try:
+            claimed.wait(10)
+            with patch.object(jobs, "analyse_texts", side_effect=_predict):
+                self.assertEqual(process_batch(10), 1)
+        finally:
+            release.set()
+            thread.join()
+
+        self.assertEqual(list(Analysis.objects.values_list("text", flat=True)), ["three"])
+        self.assertEqual(QueuedText.objects.filter(job=job).count(), 2)
+
+    def test_claims(self) -> None:
+        """
+        Tests if no transaction is open while texts are analysed, and claimed texts
+        are only claimed again once their claim has expired.
+        """
+        job: AnalysisJob = create_job(["one", "two"])
+        QueuedText.objects.filter(text="one").update(claimed_at=timezone.now())
+
+        def _predict_outside_transaction(texts: list[str]) -> list[dict[str, float]]:
+            self.assertFalse(connection.in_atomic_block)
+            return _predict(texts)
+
+        with patch.object(jobs, "analyse_texts", side_effect=_predict_outside_transaction):
+            self.assertEqual(process_batch(10), 1)
+            self.assertEqual(process_batch(10), 0)
+
+            QueuedText.objects.filter(text="one").update(
+                claimed_at=timezone.now() - timedelta(seconds=settings.JOB_CLAIM_TIMEOUT + 1)
+            )
+            self.assertEqual(process_batch(10), 1)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, AnalysisJob.StatusChoices.DONE)
+        self.assertEqual(
+            sorted(Analysis.objects.values_list("text", flat=True)), ["one", "two"]
+        )
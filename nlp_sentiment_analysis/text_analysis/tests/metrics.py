@@ -0,0 +1,113 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from .. import analysis
+from ..engines import TFEngine
+from ..metrics import MetricsRegistry
+from ..views import BulkAnalysisViewSet
+from .analysis import _mock_model, _mock_tokenizer
+
+
+class MetricsRegistryTest(TestCase):
+    """Tests for the in-process metrics registry."""
+
+    def test_render(self) -> None:
+        """
+        Tests if counters, histograms and callback metrics are rendered in the
+        Prometheus text format, with cumulative buckets and escaped label values.
+        """
+        registry = MetricsRegistry()
+        counter = registry.counter("texts_total", "Texts.")
+        histogram = registry.histogram("stage_seconds", "Stages.", buckets=[0.1, 1.0])
+        registry.callback("queue_depth", "Queue.", "gauge", lambda: [({}, 3)])
+
+        counter.inc(2, tier='say "hi"')
+        histogram.observe(0.05, stage="tokenize")
+        histogram.observe(0.5, stage="tokenize")
+
+        self.assertEqual(
+            registry.render(),
+            "# HELP texts_total Texts.\n"
+            "# TYPE texts_total counter\n"
+            'texts_total{tier="say \\"hi\\""} 2\n'
+            "# HELP stage_seconds Stages.\n"
+            "# TYPE stage_seconds histogram\n"
+            'stage_seconds_bucket{stage="tokenize",le="0.1"} 1\n'
+            'stage_seconds_bucket{stage="tokenize",le="1"} 2\n'
+            'stage_seconds_bucket{stage="tokenize",le="+Inf"} 2\n'
+            'stage_seconds_sum{stage="tokenize"} 0.55\n'
+            'stage_seconds_count{stage="tokenize"} 2\n'
+            "# HELP queue_depth Queue.\n"
+            "# TYPE queue_depth gauge\n"
+            "queue_depth 3\n",
+        )
+
+
+class MetricsViewTest(APITestCase):
+    """Tests for the ``/metrics`` endpoint."""
+
+    def test_stage_metrics(self) -> None:
+        """
+        Tests if a bulk analysis is recorded in the per-stage histograms and the
+        text and cache counters.
+        """
+        with patch.object(
+            BulkAnalysisViewSet, "analyse_texts", new_callable=AsyncMock
+        ) as mock_analyse:
+            mock_analyse.return_value = [{"sentiment": "neutral", "confidence_score": 0.5}]
+            self.client.post(
+                reverse("analyses-list"), {"texts": ["Counted text"]}, format="json"
+            )
+
+        response = self.client.get(reverse("metrics"))
+        body: str = response.content.decode()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        for sample in (
+            'sentiment_stage_seconds_count{stage="cache_lookup"}',
+            'sentiment_stage_seconds_count{stage="db_write"}',
+            "sentiment_texts_requested_total",
+            'sentiment_cache_lookups_total{result="miss",tier="local"}',
+            "sentiment_queue_depth 0",
+        ):
+            self.assertIn(sample, body)
+
+    def test_graph_traces(self) -> None:
+        """
+        Tests if the traces of the loaded engine are exported per sequence length.
+        """
+        engine = MagicMock(trace_counts={64: 1, 128: 3})
+        with patch.object(analysis.loader, "_engine", engine):
+            body: str = self.client.get(reverse("metrics")).content.decode()
+
+        self.assertIn('sentiment_graph_traces_total{length="64"} 1\n', body)
+        self.assertIn('sentiment_graph_traces_total{length="128"} 3\n', body)
+
+
+class SampledLoggingTest(TestCase):
+    """Tests for the sampled debug logging of analysed texts."""
+
+    def test_sample_rate(self) -> None:
+        """
+        Tests if texts are only logged at debug level, and not at all with a
+        sample rate of 0.
+        """
+        texts: list[str] = ["Logged text"]
+        with patch.object(analysis.loader, "_tokenizer", _mock_tokenizer()), patch.object(
+            analysis.loader, "_engine", TFEngine(_mock_model([[0.0, 0.0, 1.0]]))
+        ):
+            with self.assertLogs(level="DEBUG") as logs, patch.object(
+                analysis, "LOG_SAMPLE_RATE", 1.0
+            ):
+                analysis.predict_sentiments(texts)
+            self.assertIn("DEBUG:root:Sentiment analysis for 'Logged text'", logs.output[0])
+
+            with self.assertNoLogs(level="DEBUG"), patch.object(
+                analysis, "LOG_SAMPLE_RATE", 0.0
+            ):
+                analysis.predict_sentiments(texts)
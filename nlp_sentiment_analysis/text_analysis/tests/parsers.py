@@ -0,0 +1,190 @@
+import io
+import json
+
+from unittest import skipIf
+from unittest.mock import AsyncMock, patch
+
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.test import APITestCase
+
+from ..caching import result_cache
+from ..models import Analysis, AnalysisJob, QueuedText
+from ..parsers import NDJSONParser, RequestTooLarge, msgpack
+from ..views import BulkAnalysisViewSet
+
+
+def _mock_results(texts: list[str]) -> list[dict[str, float]]:
+    return [{"sentiment": "neutral", "confidence_score": 0.5} for _ in texts]
+
+
+class NDJSONParserTest(APITestCase):
+    """Tests for parsing texts from NDJSON bodies."""
+
+    def test_lazy_texts(self) -> None:
+        """
+        Tests if strings and "text" objects are read one line at a time, skipping
+        blank lines, as the texts are consumed.
+        """
+        stream = io.BytesIO(b'"First"\n\n{"text": "Second", "id": 7}\n"Third"\n')
+        texts = NDJSONParser.iter_texts(stream, limit=1024)
+
+        self.assertEqual(next(texts), "First")
+        self.assertEqual(stream.tell(), len(b'"First"\n'))
+        self.assertEqual(list(texts), ["Second", "Third"])
+
+    def test_invalid_lines(self) -> None:
+        """
+        Tests if malformed lines and lines without a text raise a parse error
+        naming the line.
+        """
+        for body in (b'"Fine"\n{not json\n', b'"Fine"\n{"id": 7}\n'):
+            with self.assertRaisesRegex(ParseError, "line 2|Line 2"):
+                list(NDJSONParser.iter_texts(io.BytesIO(body), limit=1024))
+
+    def test_limit(self) -> None:
+        """
+        Tests if reading stops with a 413 error as soon as the limit is passed, even
+        within a single line.
+        """
+        stream = io.BytesIO(b'"Fine"\n"' + b"x" * 100 + b'"\n"Never read"\n')
+        texts = NDJSONParser.iter_texts(stream, limit=50)
+
+        self.assertEqual(next(texts), "Fine")
+        with self.assertRaises(RequestTooLarge):
+            next(texts)
+        self.assertEqual(stream.tell(), 51)
+
+
+@patch.object(BulkAnalysisViewSet, "analyse_texts", new_callable=AsyncMock)
+class RequestFormatTest(APITestCase):
+    """Tests for posting texts in the NDJSON and MessagePack formats."""
+
+    def setUp(self) -> None:
+        self.view_url: str = reverse("analyses-list")
+        result_cache.local.clear()
+
+    def test_ndjson_analyses(self, mock_analyse: AsyncMock) -> None:
+        """
+        Tests if NDJSON texts are analysed in chunks of ``MAX_BATCH_SIZE`` and all
+        returned in one response.
+        """
+        mock_analyse.side_effect = _mock_results
+        texts: list[str] = [f"Posted text {index}" for index in range(5)]
+        body: bytes = b"".join(json.dumps(text).encode() + b"\n" for text in texts)
+
+        with override_settings(MAX_BATCH_SIZE=2):
+            response = self.client.post(
+                self.view_url, body, content_type="application/x-ndjson"
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([result["text"] for result in response.json()], texts)
+        self.assertEqual(mock_analyse.await_count, 3)
+        self.assertEqual(Analysis.objects.count(), len(texts))
+
+    async def test_ndjson_stream_error(self, mock_analyse: AsyncMock) -> None:
+        """
+        Tests if a streamed response ends with an error line at a malformed NDJSON
+        line, after the texts before it have been analysed.
+        """
+        mock_analyse.side_effect = _mock_results
+        body: bytes = b'"One"\n"Two"\n"Three"\n{broken\n'
+
+        with override_settings(MAX_BATCH_SIZE=2):
+            response = await self.async_client.post(
+                f"{self.view_url}?stream=1", body, content_type="application/x-ndjson"
+            )
+            lines: list[dict] = [
+                json.loads(line)
+                for chunk in [chunk async for chunk in response.streaming_content]
+                for line in chunk.splitlines()
+            ]
+
+        self.assertEqual([line.get("text") for line in lines[:2]], ["One", "Two"])
+        self.assertIn("line 4", lines[-1]["error"])
+
+    def test_ndjson_errors(self, mock_analyse: AsyncMock) -> None:
+        """
+        Tests if empty and malformed NDJSON bodies are rejected before anything is
+        saved.
+        """
+        mock_analyse.side_effect = _mock_results
+
+        response = self.client.post(self.view_url, b"\n", content_type="application/x-ndjson")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(
+            self.view_url, b"{broken\n", content_type="application/x-ndjson"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Analysis.objects.count(), 0)
+
+    def test_ndjson_job(self, mock_analyse: AsyncMock) -> None:
+        """
+        Tests if a job's NDJSON texts are queued in batches of
+        ``JOB_INSERT_BATCH_SIZE``.
+        """
+        texts: list[str] = [f"Posted text {index}" for index in range(5)]
+        body: bytes = b"".join(json.dumps({"text": text}).encode() + b"\n" for text in texts)
+
+        with override_settings(JOB_INSERT_BATCH_SIZE=2):
+            response = self.client.post(
+                reverse("jobs-list"), body, content_type="application/x-ndjson"
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job: AnalysisJob = AnalysisJob.objects.get(pk=response.data["id"])
+        self.assertEqual(job.total, len(texts))
+        self.assertEqual(
+            list(QueuedText.objects.filter(job=job).order_by("id").values_list("text", flat=True)),
+            texts,
+        )
+
+    @skipIf(msgpack is None, "msgpack is not installed")
+    def test_msgpack(self, mock_analyse: AsyncMock) -> None:
+        """
+        Tests if MessagePack bodies are parsed like JSON ones.
+        """
+        mock_analyse.side_effect = _mock_results
+        texts: list[str] = ["This movie is great!", "This product is a disappointment."]
+
+        response = self.client.post(
+            self.view_url,
+            msgpack.packb({"texts": texts}),
+            content_type="application/msgpack",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([result["text"] for result in response.json()], texts)
+
+        response = self.client.post(
+            self.view_url, b"\xc1", content_type="application/msgpack"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(MAX_REQUEST_BODY_BYTES=64)
+    def test_too_large(self, mock_analyse: AsyncMock) -> None:
+        """
+        Tests if bodies over ``MAX_REQUEST_BODY_BYTES`` are rejected with a 413
+        in every format, without analysing anything.
+        """
+        texts: list[str] = ["x" * 100]
+        bodies: list[tuple[bytes, str]] = [
+            (json.dumps({"texts": texts}).encode(), "application/json"),
+            (json.dumps(texts[0]).encode() + b"\n", "application/x-ndjson"),
+        ]
+        if msgpack is not None:
+            bodies.append((msgpack.packb({"texts": texts}), "application/msgpack"))
+
+        for body, content_type in bodies:
+            with self.subTest(content_type=content_type):
+                response = self.client.post(self.view_url, body, content_type=content_type)
+                self.assertEqual(
+                    response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+                )
+                self.assertIn("64 bytes", response.json()["detail"])
+
+        mock_analyse.assert_not_awaited()
@@ -0,0 +1,100 @@
+import asyncio
+import threading
+
+from typing import Callable
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from ..metrics import STAGE_WAIT_SECONDS
+from ..pipeline import Stage, StagedPipeline
+
+
+class StagedPipelineTest(TestCase):
+    """Tests for running batches through stages on separate thread pools."""
+
+    def setUp(self) -> None:
+        self.release = threading.Event()
+        self.tokenized: list[str] = []
+
+        def _tokenize(item: str) -> str:
+            self.tokenized.append(item)
+            return item + "t"
+
+        def _infer(item: str) -> str:
+            self.release.wait(5)
+            return item + "i"
+
+        self.pipeline = StagedPipeline(
+            [Stage("tokenize", _tokenize, workers=1), Stage("inference", _infer, workers=1)],
+            queue_size=1,
+        )
+
+    async def _wait_until(self, condition: Callable[[], bool]) -> None:
+        for _ in range(500):
+            if condition():
+                return
+            await asyncio.sleep(0.01)
+        self.fail("Condition not met in time.")
+
+    async def test_stages_overlap(self) -> None:
+        """
+        Tests if an item is tokenized while the one before it is still in the
+        inference stage, and results are returned per item.
+        """
+        first: asyncio.Task = asyncio.create_task(self.pipeline.run("a"))
+        await self._wait_until(lambda: self.pipeline.stats()["inference"]["running"] == 1)
+        second: asyncio.Task = asyncio.create_task(self.pipeline.run("b"))
+        await self._wait_until(lambda: self.tokenized == ["a", "b"])
+
+        self.release.set()
+        self.assertEqual(await asyncio.gather(first, second), ["ati", "bti"])
+
+    async def test_bounded_queue(self) -> None:
+        """
+        Tests if a slow stage holds back the stages before it once ``queue_size``
+        items are waiting for it.
+        """
+        self.assertEqual(self.pipeline.capacity, 3)
+
+        tasks: list[asyncio.Task] = [
+            asyncio.create_task(self.pipeline.run(item)) for item in "abcd"
+        ]
+        # a is running, b is queued and c, although tokenized, holds the tokenize
+        # stage until it can be queued, so d is not tokenized yet
+        await self._wait_until(
+            lambda: self.pipeline.stats()
+            == {
+                "tokenize": {"waiting": 1, "running": 0},
+                "inference": {"waiting": 2, "running": 1},
+            }
+        )
+        self.assertEqual(self.tokenized, ["a", "b", "c"])
+
+        self.release.set()
+        self.assertEqual(await asyncio.gather(*tasks), ["ati", "bti", "cti", "dti"])
+
+    async def test_error(self) -> None:
+        """
+        Tests if errors raised by a stage are raised to the caller, skip the later
+        stages and free the stage for the next item. The time waited for each
+        stage is observed.
+        """
+        self.release.set()
+
+        def _tokenize(item: str) -> str:
+            if item == "bad":
+                raise ValueError("Cannot tokenize")
+            return item + "t"
+
+        self.pipeline.stages[0] = Stage("tokenize", _tokenize, workers=1)
+
+        with patch.object(STAGE_WAIT_SECONDS, "observe") as mock_observe:
+            with self.assertRaisesMessage(ValueError, "Cannot tokenize"):
+                await self.pipeline.run("bad")
+            self.assertEqual(await self.pipeline.run("good"), "goodti")
+
+        self.assertEqual(
+            [call.kwargs["stage"] for call in mock_observe.call_args_list],
+            ["tokenize", "tokenize", "inference"],
+        )
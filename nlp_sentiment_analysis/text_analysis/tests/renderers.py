@@ -0,0 +1,118 @@
+import json
+
+from unittest import skipIf
+from unittest.mock import AsyncMock, patch
+
+import numpy as np
+
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from ..models import Analysis, AnalysisJob
+from ..renderers import MessagePackRenderer, ORJSONRenderer, msgpack, orjson
+from ..serializers import AnalysisSerializer, serialize_analyses
+from ..storage import build_analyses, save_analyses
+from ..views import BulkAnalysisViewSet
+
+
+class RendererTest(APITestCase):
+    """Tests for the fast serialization path and renderers."""
+
+    def setUp(self) -> None:
+        texts: list[str] = [
+            "Plain text",
+            'Quotes " and \\ backslashes\nand new lines',
+            "Ünïcödé, emoji 😀 and line separators \u2028 \u2029",
+        ]
+        analyses: list[Analysis] = build_analyses(
+            texts,
+            [
+                {"sentiment": "positive", "confidence_score": 0.9876543210123},
+                {"sentiment": "neutral", "confidence_score": 1 / 3},
+                {"error": "Unexpected error"},
+            ],
+        )
+        analyses[0].job = AnalysisJob.objects.create(total=1)
+        self.analyses: list[Analysis] = save_analyses(analyses)
+
+    @skipIf(orjson is None, "orjson is not installed")
+    def test_byte_compatible(self) -> None:
+        """
+        Tests if the fast path renders exactly the bytes of ``AnalysisSerializer``
+        rendered by DRF's ``JSONRenderer``.
+        """
+        expected: bytes = JSONRenderer().render(
+            AnalysisSerializer(self.analyses, many=True).data
+        )
+
+        self.assertEqual(ORJSONRenderer().render(serialize_analyses(self.analyses)), expected)
+        self.assertEqual(
+            ORJSONRenderer().render(AnalysisSerializer(self.analyses, many=True).data),
+            expected,
+        )
+
+    @skipIf(orjson is None, "orjson is not installed")
+    def test_json_compatible(self) -> None:
+        """
+        Tests if values rendered differently from ``JSONRenderer`` still decode to
+        the same data, and NaN and infinite floats are rejected.
+        """
+        data: dict = {"small": 1e-05, "large": 1e16, "big": 2**64, "none": None}
+        self.assertEqual(
+            json.loads(ORJSONRenderer().render(data)), json.loads(JSONRenderer().render(data))
+        )
+
+        for value in [float("nan"), float("inf"), np.float32("-inf")]:
+            with self.assertRaisesMessage(ValueError, "Out of range float values"):
+                ORJSONRenderer().render({"results": [{"confidence_score": value}]})
+
+    def test_scope(self) -> None:
+        """
+        Tests if only the analysis views render JSON with ``ORJSONRenderer``.
+        """
+        response = self.client.get(reverse("analyses-list"))
+        self.assertIsInstance(response.accepted_renderer, ORJSONRenderer)
+
+        job: AnalysisJob = AnalysisJob.objects.create()
+        response = self.client.get(reverse("jobs-detail", kwargs={"pk": job.pk}))
+        self.assertNotIsInstance(response.accepted_renderer, ORJSONRenderer)
+
+    def test_indent(self) -> None:
+        """
+        Tests if indented responses are still rendered as requested.
+        """
+        rendered: bytes = ORJSONRenderer().render(
+            {"a": [1]}, "application/json; indent=2", {}
+        )
+        self.assertEqual(rendered, b'{\n  "a": [\n    1\n  ]\n}')
+
+    @skipIf(msgpack is None, "msgpack is not installed")
+    def test_messagepack(self) -> None:
+        """
+        Tests if bulk analyses are returned as MessagePack when it is accepted.
+        """
+        texts: list[str] = ["This movie is great!", "This product is a disappointment."]
+        with patch.object(
+            BulkAnalysisViewSet, "analyse_texts", new_callable=AsyncMock
+        ) as mock_analyse:
+            mock_analyse.return_value = [
+                {"sentiment": "positive", "confidence_score": 0.9},
+                {"sentiment": "negative", "confidence_score": 0.8},
+            ]
+            response = self.client.post(
+                reverse("analyses-list"),
+                {"texts": texts},
+                format="json",
+                HTTP_ACCEPT=MessagePackRenderer.media_type,
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response["Content-Type"], MessagePackRenderer.media_type)
+        data: list[dict] = msgpack.unpackb(response.content)
+        self.assertEqual([result["text"] for result in data], texts)
+        saved: list[Analysis] = Analysis.objects.filter(
+            pk__in=[result["id"] for result in data]
+        ).order_by("id")
+        self.assertEqual(data, serialize_analyses(saved))
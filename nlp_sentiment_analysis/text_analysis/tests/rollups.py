@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from ..caching import MODEL_ID
+from ..models import Analysis, SentimentRollup
+from ..storage import build_analyses, save_analyses
+
+
+def _save(sentiments: list[str], confidence_score: float = 0.5) -> list[Analysis]:
+    return save_analyses(
+        build_analyses(
+            [f"Text {index}" for index in range(len(sentiments))],
+            [
+                {"sentiment": sentiment, "confidence_score": confidence_score}
+                for sentiment in sentiments
+            ],
+        )
+    )
+
+
+class SentimentRollupTest(APITestCase):
+    """Tests for the sentiment rollup and the aggregates endpoint."""
+
+    def _rollups(self) -> list[tuple]:
+        return list(
+            SentimentRollup.objects.order_by("bucket_start", "sentiment").values_list(
+                "bucket_start", "sentiment", "model", "count", "confidence_sum"
+            )
+        )
+
+    def test_incremental_update(self) -> None:
+        """
+        Tests if saved analyses are added to their hour's rollup rows and failed
+        analyses are not counted.
+        """
+        _save(["positive", "negative"], 0.5)
+        analyses: list[Analysis] = _save(["positive"], 0.9)
+        save_analyses(build_analyses(["Failed"], [{"error": "Unexpected error"}]))
+
+        hour: datetime = analyses[0].created_at.astimezone(dt_timezone.utc).replace(
+            minute=0, second=0, microsecond=0
+        )
+        self.assertEqual(
+            self._rollups(),
+            [
+                (hour, "negative", MODEL_ID, 1, 0.5),
+                (hour, "positive", MODEL_ID, 2, 1.4),
+            ],
+        )
+
+    def test_rebuild(self) -> None:
+        """
+        Tests if rebuilding the rollup from history gives the incrementally
+        maintained rows.
+        """
+        _save(["positive", "neutral", "positive"], 0.8)
+        Analysis.objects.filter(sentiment="neutral").update(
+            created_at=datetime(2024, 5, 1, 10, 30, tzinfo=dt_timezone.utc)
+        )
+        Analysis.objects.filter(sentiment="neutral").update(model=None)
+        SentimentRollup.objects.all().delete()
+
+        call_command("rebuild_sentiment_rollups", stdout=StringIO())
+
+        rollups: list[tuple] = self._rollups()
+        self.assertEqual(
+            rollups[0],
+            (datetime(2024, 5, 1, 10, tzinfo=dt_timezone.utc), "neutral", "", 1, 0.8),
+        )
+        self.assertEqual(rollups[1][1:], ("positive", MODEL_ID, 2, 1.6))
+
+    def test_aggregates(self) -> None:
+        """
+        Tests if the endpoint returns counts and mean confidence per bucket and
+        sentiment within the requested range.
+        """
+        start = datetime(2024, 5, 1, tzinfo=dt_timezone.utc)
+        for hours, count, confidence_sum in [(1, 2, 1.0), (5, 2, 1.8), (30, 1, 0.7)]:
+            SentimentRollup.objects.create(
+                bucket_start=start + timedelta(hours=hours),
+                sentiment="positive",
+                model=MODEL_ID,
+                count=count,
+                confidence_sum=confidence_sum,
+            )
+
+        params: dict[str, str] = {
+            "start": start.isoformat(),
+            "end": (start + timedelta(days=1)).isoformat(),
+        }
+        response = self.client.get(reverse("aggregates-list"), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(row["count"], row["mean_confidence"]) for row in response.json()],
+            [(2, 0.5), (2, 0.9)],
+        )
+
+        params["end"] = (start + timedelta(days=2)).isoformat()
+        response = self.client.get(reverse("aggregates-list"), {**params, "interval": "day"})
+        self.assertEqual(
+            [(row["count"], round(row["mean_confidence"], 2)) for row in response.json()],
+            [(4, 0.7), (1, 0.7)],
+        )
+
+    def test_invalid_range(self) -> None:
+        """
+        Tests if ranges which end before they start are rejected.
+        """
+        response = self.client.get(
+            reverse("aggregates-list"),
+            {"start": "2024-05-02T00:00:00Z", "end": "2024-05-01T00:00:00Z"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,146 @@
+import json
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from django.core.cache.backends.redis import RedisCache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from .. import analysis, throttling
+from ..analysis import scheduler
+from ..batching import QueueFull
+from ..caching import result_cache
+from ..models import Analysis
+from ..throttling import TOKEN_BUCKET_SCRIPT, TextRateLimiter, text_limiter
+from ..views import BulkAnalysisViewSet
+
+
+@override_settings(RATE_LIMIT_TEXTS_PER_SECOND=1, RATE_LIMIT_BURST=10)
+class TextRateLimiterTest(TestCase):
+    """Tests for the per-client token bucket."""
+
+    def test_local_bucket(self) -> None:
+        """
+        Tests if texts are admitted while the bucket holds enough tokens, and the
+        time until it does is returned otherwise, per client.
+        """
+        limiter = TextRateLimiter()
+
+        self.assertEqual(limiter.consume("ip:1", 6), 0)
+        self.assertAlmostEqual(limiter.consume("ip:1", 6), 2, places=1)
+        self.assertEqual(limiter.consume("ip:2", 6), 0)
+        # Requests larger than the bucket are charged a full bucket
+        self.assertEqual(limiter.consume("ip:3", 50), 0)
+
+        with override_settings(RATE_LIMIT_TEXTS_PER_SECOND=0):
+            self.assertEqual(limiter.consume("ip:1", 100), 0)
+
+    def test_redis_bucket(self) -> None:
+        """
+        Tests if buckets are kept in Redis by a script when the cache is Redis.
+        """
+        redis_cache = MagicMock(spec=RedisCache)
+        script = redis_cache._cache.get_client.return_value.register_script.return_value
+        script.return_value = b"1.5"
+
+        with patch.object(throttling, "cache", redis_cache):
+            wait: float = TextRateLimiter().consume("ip:1", 4)
+
+        redis_cache._cache.get_client.return_value.register_script.assert_called_once_with(
+            TOKEN_BUCKET_SCRIPT
+        )
+        script.assert_called_once_with(keys=["ratelimit:texts:ip:1"], args=[10, 1, 4])
+        self.assertEqual(wait, 1.5)
+
+
+@patch.object(BulkAnalysisViewSet, "analyse_texts", new_callable=AsyncMock)
+class AdmissionControlTest(APITestCase):
+    """Tests for rejecting bulk analyses before they are tokenized."""
+
+    def setUp(self) -> None:
+        self.view_url: str = reverse("analyses-list")
+        text_limiter.reset()
+        result_cache.local.clear()
+
+    def _post(self, texts: list[str], **kwargs) -> object:
+        return self.client.post(self.view_url, {"texts": texts}, format="json", **kwargs)
+
+    @override_settings(MAX_TEXTS_PER_REQUEST=2)
+    def test_too_many_texts(self, mock_analyse: AsyncMock) -> None:
+        """
+        Tests if requests of more than ``MAX_TEXTS_PER_REQUEST`` texts are rejected
+        with a 413, also when NDJSON texts pass the limit after the first chunk.
+        """
+        response = self._post(["One", "Two", "Three"])
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        mock_analyse.assert_not_awaited()
+
+        mock_analyse.side_effect = lambda texts: [
+            {"sentiment": "neutral", "confidence_score": 0.5} for _ in texts
+        ]
+        body: bytes = b"".join(
+            json.dumps(f"Admitted text {index}").encode() + b"\n" for index in range(3)
+        )
+        with override_settings(MAX_BATCH_SIZE=2):
+            response = self.client.post(
+                self.view_url, body, content_type="application/x-ndjson"
+            )
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertEqual(Analysis.objects.count(), 2)
+
+    def test_queue_full(self, mock_analyse: AsyncMock) -> None:
+        """
+        Tests if requests are shed with a 429 and ``Retry-After`` while the inference
+        queue is full.
+        """
+        with patch.object(scheduler, "is_full", return_value=True):
+            response = self._post(["This movie is great!"])
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response["Retry-After"], "1")
+        mock_analyse.assert_not_awaited()
+
+    @override_settings(RATE_LIMIT_TEXTS_PER_SECOND=0.5, RATE_LIMIT_BURST=3)
+    def test_rate_limit(self, mock_analyse: AsyncMock) -> None:
+        """
+        Tests if texts rather than requests are counted per client, and clients
+        over their limit are rejected with a 429 and ``Retry-After``.
+        """
+        mock_analyse.side_effect = lambda texts: [
+            {"sentiment": "neutral", "confidence_score": 0.5} for _ in texts
+        ]
+
+        response = self._post(["Limited one", "Limited two"])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = self._post(["Limited three", "Limited four"])
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response["Retry-After"], "2")
+
+        response = self._post(["Limited five"], REMOTE_ADDR="10.0.0.2")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+
+class QueueFullTest(APITestCase):
+    """Tests for shedding load at the inference queue."""
+
+    def test_rejected_before_tokenization(self) -> None:
+        """
+        Tests if texts the inference queue cannot take are rejected with a 429
+        without being tokenized.
+        """
+        result_cache.local.clear()
+        mock_tokenizer = MagicMock()
+
+        with patch.object(analysis.loader, "_tokenizer", mock_tokenizer), patch.object(
+            scheduler, "submit", side_effect=QueueFull
+        ):
+            response = self.client.post(
+                reverse("analyses-list"), {"texts": ["Never tokenized"]}, format="json"
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response["Retry-After"], "1")
+        mock_tokenizer.assert_not_called()
@@ -1,7 +1,19 @@
+import json
+import threading
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from django.core.cache import cache
+from django.test import override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 
+from ..analysis import loader
+from ..benchmark import StubEngine, StubTokenizer
+from ..caching import result_cache, text_hash
 from ..models import Analysis
 from ..serializers import AnalysisSerializer
 from ..views import BulkAnalysisViewSet
@@ -11,13 +23,22 @@ class BulkAnalysisTest(APITestCase):
     """Tests for the BulkAnalysisViewSet."""
 
     def setUp(self) -> None:
-        self.view_url: str = reverse('bulk-analysis')
+        self.view_url: str = reverse('analyses-list')
+        result_cache.local.clear()
+        cache.clear()
+
+        # Run the offline stand-ins instead of downloading the model
+        self.engine = MagicMock(wraps=StubEngine())
+        self.engine.name = StubEngine.name
+        patcher = patch.multiple(loader, _tokenizer=StubTokenizer(), _engine=self.engine)
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
     def test_missing_texts_field(self) -> None:
         """
         Tests if the view handles missing "texts" field in request data.
         """
-        response = self.client.post(self.view_url, {})
+        response = self.client.post(self.view_url, {}, format="json")
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(response.data['error'], 'Missing "texts" field in request data')
 
@@ -25,7 +46,7 @@ class BulkAnalysisTest(APITestCase):
         """
         Tests if the view handles an empty "texts" list.
         """
-        response = self.client.post(self.view_url, {"texts": []})
+        response = self.client.post(self.view_url, {"texts": []}, format="json")
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(response.data['error'], 'Missing "texts" field in request data')
 
@@ -34,39 +55,316 @@ class BulkAnalysisTest(APITestCase):
         Tests if the view performs sentiment analysis, saves results, and returns a response.
         """
         texts: list[str] = ["This movie is great!", "This product is a disappointment."]
-        response = self.client.post(self.view_url, {"texts": texts})
+        response = self.client.post(self.view_url, {"texts": texts}, format="json")
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
 
         # Check if Analysis objects are created
-        analyses: list[Analysis] = Analysis.objects.all()
+        analyses: list[Analysis] = Analysis.objects.order_by("id")
         self.assertEqual(analyses.count(), len(texts))
         for analysis, text in zip(analyses, texts):
             self.assertEqual(analysis.text, text)
+            self.assertEqual(analysis.text_hash, text_hash(text))
+        self.assertEqual(
+            [analysis.sentiment for analysis in analyses], ["positive", "neutral"]
+        )
 
         # Check response data format
         data = response.json()
         self.assertIsInstance(data, list)
-        for result in data:
-            self.assertIn('text', result)
-            self.assertIn('sentiment', result)
-            self.assertIn('confidence_score', result)
+        self.assertEqual(
+            list(data[0]), ["id", "text", "sentiment", "confidence_score", "created_at"]
+        )
+        self.assertEqual([result["text"] for result in data], texts)
+        self.assertEqual([result["sentiment"] for result in data], ["positive", "neutral"])
+        self.assertAlmostEqual(data[0]["confidence_score"], 0.9838, places=4)
+        self.assertAlmostEqual(data[1]["confidence_score"], 0.6697, places=4)
 
     def test_cache_usage(self) -> None:
         """
         Tests if the view utilizes the cache for storing and retrieving sentiment results.
-        (This test requires modifying the `analyse_text` method to simulate cache behavior)
         """
-        # Modify `analyse_text` to mock cache usage
-        # ... (implementation details)
-
-        text1: str = "This service is amazing!"
-        text2: str = "This experience is awful!"
-        texts: list[str] = [text1, text2]
+        texts: list[str] = ["This service is amazing!", "This experience is awful!"]
 
         # First request, no cache hit
-        response = self.client.post(self.view_url, {"texts": texts})
+        response = self.client.post(self.view_url, {"texts": texts}, format="json")
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        first_results = [
+            (result["sentiment"], result["confidence_score"]) for result in response.json()
+        ]
+        self.assertEqual([sentiment for sentiment, _ in first_results], ["negative", "negative"])
+        self.assertEqual(self.engine.predict.call_count, 1)
 
         # Second request with the same text (cache hit expected)
-        response = self.client.post(self.view_url, {"texts": texts})
+        response = self.client.post(self.view_url, {"texts": texts}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [(result["sentiment"], result["confidence_score"]) for result in response.json()],
+            first_results,
+        )
+        self.assertEqual(self.engine.predict.call_count, 1)
+
+    def test_failed_analysis(self) -> None:
+        """
+        Tests if texts whose analysis failed are returned as errors in place and
+        not saved.
+        """
+        texts: list[str] = ["This movie is great!", "Unreadable text", "Awful service."]
+        with patch.object(
+            BulkAnalysisViewSet, "analyse_texts", new_callable=AsyncMock
+        ) as mock_analyse:
+            mock_analyse.return_value = [
+                {"sentiment": "positive", "confidence_score": 0.9},
+                {"error": "Preprocessing error"},
+                {"sentiment": "negative", "confidence_score": 0.8},
+            ]
+            response = self.client.post(self.view_url, {"texts": texts}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        data = response.json()
+        self.assertEqual(
+            [result.get("sentiment") for result in data], ["positive", None, "negative"]
+        )
+        self.assertEqual(data[1], {"text": "Unreadable text", "error": "Preprocessing error"})
+        self.assertEqual(
+            list(Analysis.objects.order_by("id").values_list("id", "text", "sentiment")),
+            [
+                (data[0]["id"], "This movie is great!", "positive"),
+                (data[2]["id"], "Awful service.", "negative"),
+            ],
+        )
+
+
+class ReadinessTest(APITestCase):
+    """Tests for the readiness endpoint."""
+
+    def test_not_ready(self) -> None:
+        """
+        Tests if the endpoint reports 503 until the model has been warmed up.
+        """
+        with patch.object(loader, "ready", threading.Event()):
+            response = self.client.get(reverse("healthz-ready"))
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def test_ready(self) -> None:
+        """
+        Tests if the endpoint reports 200 once the model has been warmed up.
+        """
+        ready = threading.Event()
+        ready.set()
+        engine = MagicMock(trace_count=5)
+        engine.name = "tf"
+        with patch.object(loader, "ready", ready), patch.object(loader, "_engine", engine):
+            response = self.client.get(reverse("healthz-ready"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {"status": "ready", "engine": "tf", "traces": 5})
+
+
+class StreamingAnalysisTest(APITestCase):
+    """Tests for the NDJSON streaming mode of the BulkAnalysisViewSet."""
+
+    def setUp(self) -> None:
+        self.view_url: str = reverse('analyses-list')
+
+    async def test_accept_header(self) -> None:
+        """
+        Tests if results are streamed as one JSON line per text, persisted in chunks
+        of ``MAX_BATCH_SIZE``, when NDJSON is requested with the Accept header.
+        """
+        texts: list[str] = [f"Text number {index}" for index in range(5)]
+        with override_settings(MAX_BATCH_SIZE=2), patch.object(
+            BulkAnalysisViewSet, "analyse_texts", new_callable=AsyncMock
+        ) as mock_analyse:
+            mock_analyse.side_effect = lambda chunk: [
+                {"sentiment": "neutral", "confidence_score": 0.5} for _ in chunk
+            ]
+            response = await self.async_client.post(
+                self.view_url,
+                {"texts": texts},
+                content_type="application/json",
+                headers={"Accept": "application/x-ndjson"},
+            )
+            chunks: list[bytes] = [chunk async for chunk in response.streaming_content]
+
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(mock_analyse.await_count, 3)
+        results: list[dict] = [json.loads(line) for line in b"".join(chunks).splitlines()]
+        self.assertEqual([result["text"] for result in results], texts)
+        self.assertEqual(await Analysis.objects.acount(), len(texts))
+
+    async def test_query_param(self) -> None:
+        """
+        Tests if ``?stream=1`` selects the streaming mode.
+        """
+        texts: list[str] = ["This movie is great!", "This product is a disappointment."]
+        response = await self.async_client.post(
+            f"{self.view_url}?stream=1", {"texts": texts}, content_type="application/json"
+        )
+        chunks: list[bytes] = [chunk async for chunk in response.streaming_content]
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["X-Accel-Buffering"], "no")
+        lines: list[bytes] = b"".join(chunks).splitlines()
+        self.assertEqual([json.loads(line)["text"] for line in lines], texts)
+        for line in lines:
+            self.assertIn('sentiment', json.loads(line))
+
+
+class AnalysisListTest(APITestCase):
+    """Tests for listing and retrieving stored analyses."""
+
+    def setUp(self) -> None:
+        self.view_url: str = reverse('analyses-list')
+        created_at = datetime(2024, 5, 1, 12, tzinfo=dt_timezone.utc)
+        self.analyses: list[Analysis] = Analysis.objects.bulk_create(
+            Analysis(text=f"Text {index}", sentiment=sentiment, confidence_score=score)
+            for index, (sentiment, score) in enumerate(
+                [("positive", 0.9), ("negative", 0.6), ("positive", 0.4), ("positive", 0.8)]
+            )
+        )
+        # The first two share a timestamp, so pages must be split on the id as well
+        for index, analysis in enumerate(self.analyses):
+            analysis.created_at = created_at + timedelta(minutes=max(index, 1))
+        Analysis.objects.bulk_update(self.analyses, ["created_at"])
+
+    def test_keyset_pagination(self) -> None:
+        """
+        Tests if pages follow each other newest first without gaps or repeats.
+        """
+        ids: list[int] = []
+        url: str = f"{self.view_url}?page_size=1"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids += [result["id"] for result in response.json()["results"]]
+            url = response.json()["next"]
+
+        self.assertEqual(ids, [analysis.pk for analysis in reversed(self.analyses)])
+
+    def test_filters(self) -> None:
+        """
+        Tests if the list is filtered by sentiment and confidence range and sparse
+        fieldsets leave out the other fields.
+        """
+        response = self.client.get(
+            self.view_url,
+            {"sentiment": "positive", "min_confidence": 0.5, "fields": "id,confidence_score"},
+        )
+        self.assertEqual(
+            response.json()["results"],
+            [
+                {"id": self.analyses[3].pk, "confidence_score": 0.8},
+                {"id": self.analyses[0].pk, "confidence_score": 0.9},
+            ],
+        )
+
+        response = self.client.get(self.view_url, {"fields": "id,secret"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invalid_cursor(self) -> None:
+        """
+        Tests if malformed cursors are reported as not found.
+        """
+        response = self.client.get(self.view_url, {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_retrieve(self) -> None:
+        """
+        Tests if a single analysis is returned, with sparse fieldsets.
+        """
+        analysis: Analysis = self.analyses[1]
+        url: str = reverse("analyses-detail", kwargs={"pk": analysis.pk})
+
+        response = self.client.get(url, {"fields": "sentiment"})
+        self.assertEqual(response.json(), {"sentiment": "negative"})
+
+        response = self.client.get(reverse("analyses-detail", kwargs={"pk": 0}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class AnalysisSearchTest(APITestCase):
+    """Tests for the full-text search over stored analyses."""
+
+    def setUp(self) -> None:
+        self.view_url: str = reverse('analyses-search')
+        Analysis.objects.bulk_create(
+            Analysis(text=text, sentiment=sentiment, confidence_score=0.9)
+            for text, sentiment in [
+                ("The battery of this phone dies quickly.", "negative"),
+                ("Great phone, the battery lasts for days. Battery life is superb!", "positive"),
+                ("My phone arrived broken.", "negative"),
+                ("The laptop keyboard is lovely.", "positive"),
+            ]
+        )
+
+    def test_ranked_search(self) -> None:
+        """
+        Tests if matches are returned best first across pages, using stemming.
+        """
+        texts: list[str] = []
+        url: str = f"{self.view_url}?q=batteries&page_size=1&fields=text"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            texts += [result["text"] for result in response.json()["results"]]
+            url = response.json()["next"]
+
+        self.assertEqual(
+            texts,
+            [
+                "Great phone, the battery lasts for days. Battery life is superb!",
+                "The battery of this phone dies quickly.",
+            ],
+        )
+
+    def test_tied_ranks(self) -> None:
+        """
+        Tests if every match is returned exactly once across pages when ranks are
+        tied, including ties on page boundaries.
+        """
+        expected: list[int] = [
+            analysis.pk
+            for analysis in Analysis.objects.bulk_create(
+                Analysis(text=text, sentiment="neutral", confidence_score=0.5)
+                for text in [
+                    "The charger works.",
+                    "The charger works.",
+                    "The charger works.",
+                    "A charger, a cable and a charger case.",
+                    "The charger works.",
+                    "The charger of the old phone is fine, thanks.",
+                    "The charger works.",
+                ]
+            )
+        ]
+
+        ids: list[int] = []
+        url: str = f"{self.view_url}?q=charger&page_size=2&fields=id"
+        while url:
+            response = self.client.get(url)
+            ids += [result["id"] for result in response.json()["results"]]
+            url = response.json()["next"]
+
+        self.assertEqual(sorted(ids), expected)
+
+    def test_filters(self) -> None:
+        """
+        Tests if the text query is combined with the sentiment and date filters.
+        """
+        response = self.client.get(self.view_url, {"q": "phone", "sentiment": "negative"})
+        self.assertEqual(
+            sorted(result["text"] for result in response.json()["results"]),
+            ["My phone arrived broken.", "The battery of this phone dies quickly."],
+        )
+
+        response = self.client.get(self.view_url, {"q": "phone", "end": "2000-01-01T00:00:00Z"})
+        self.assertEqual(response.json()["results"], [])
+
+    def test_missing_query(self) -> None:
+        """
+        Tests if searches without a query are rejected.
+        """
+        response = self.client.get(self.view_url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
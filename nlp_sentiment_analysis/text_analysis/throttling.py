@@ -0,0 +1,136 @@
+import threading
+import time
+
+from typing import Any, Optional
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.redis import RedisCache
+
+from rest_framework.exceptions import Throttled
+from rest_framework.request import Request
+from rest_framework.throttling import BaseThrottle
+
+from .metrics import registry
+
+# Refills and takes tokens atomically, using the Redis clock so that every web
+# worker sees the same time. Returns the seconds to wait, 0 if the texts were
+# admitted, as a string as Lua numbers are truncated to integers otherwise.
+TOKEN_BUCKET_SCRIPT: str = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local clock = redis.call("TIME")
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+
+local bucket = redis.call("HMGET", KEYS[1], "tokens", "updated")
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+
+local wait = 0
+if requested <= tokens then
+    tokens = tokens - requested
+else
+    wait = (requested - tokens) / rate
+end
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "updated", tostring(now))
+redis.call("EXPIRE", KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+REJECTED_TEXTS = registry.counter(
+    "sentiment_rejected_texts_total", "Texts rejected by admission control, by reason."
+)
+
+
+class TextRateLimiter:
+    """
+    Limits the number of texts each client may submit with a token bucket.
+
+    Every client has a bucket of ``RATE_LIMIT_BURST`` tokens which refills at
+    ``RATE_LIMIT_TEXTS_PER_SECOND`` tokens per second, and each text takes one
+    token. Buckets are kept in Redis, so the limit holds across all web workers,
+    or in process memory when the cache is not backed by Redis. A rate of 0
+    disables the limit.
+
+    Args:
+        prefix: The prefix of the Redis keys (str).
+    """
+
+    def __init__(self, prefix: str = "ratelimit:texts") -> None:
+        self.prefix = prefix
+        self._script: Optional[Any] = None
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def consume(self, client: str, count: int) -> float:
+        """
+        Takes ``count`` tokens from the client's bucket if it holds enough.
+
+        Args:
+            client: Identifies the client (str).
+            count: The number of texts (int).
+
+        Returns:
+            0 if the texts were admitted, otherwise the number of seconds until the
+            bucket holds enough tokens (float). Requests are never charged more than
+            a full bucket, so large ones are admitted once the bucket is full.
+        """
+        rate: float = settings.RATE_LIMIT_TEXTS_PER_SECOND
+        if rate <= 0:
+            return 0.0
+
+        capacity: int = settings.RATE_LIMIT_BURST
+        count = min(count, capacity)
+        key: str = f"{self.prefix}:{client}"
+        if isinstance(cache, RedisCache):
+            return float(self._redis_script()(keys=[key], args=[capacity, rate, count]))
+
+        with self._lock:
+            now: float = time.monotonic()
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if count <= tokens:
+                self._buckets[key] = (tokens - count, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            return (count - tokens) / rate
+
+    async def aconsume(self, client: str, count: int) -> float:
+        return await sync_to_async(self.consume, thread_sensitive=False)(client, count)
+
+    def reset(self) -> None:
+        """Refills the in-process buckets."""
+        with self._lock:
+            self._buckets.clear()
+
+    def _redis_script(self) -> Any:
+        if self._script is None:
+            client = cache._cache.get_client(write=True)
+            self._script = client.register_script(TOKEN_BUCKET_SCRIPT)
+        return self._script
+
+
+text_limiter: TextRateLimiter = TextRateLimiter()
+
+
+def client_ident(request: Request) -> str:
+    """
+    Identifies the client of a request by user, or by address for anonymous ones.
+    Behind nginx, the address is taken from ``X-Forwarded-For`` (see
+    ``NUM_PROXIES``).
+    """
+    if request.user and request.user.is_authenticated:
+        return f"user:{request.user.pk}"
+    return f"ip:{BaseThrottle().get_ident(request)}"
+
+
+def reject(reason: str, count: int, wait: float, detail: str) -> Throttled:
+    """
+    Counts rejected texts and returns a 429 error with a ``Retry-After`` header.
+    """
+    REJECTED_TEXTS.inc(count, reason=reason)
+    return Throttled(wait=wait, detail=detail)
@@ -1,12 +1,22 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from .views import BulkAnalysisViewSet
+from .views import (
+    AnalysisJobViewSet,
+    BulkAnalysisViewSet,
+    SentimentAggregateViewSet,
+    metrics,
+    readiness,
+)
 
 
 router = DefaultRouter()
 router.register(r"analyses", BulkAnalysisViewSet, basename="analyses")
+router.register(r"jobs", AnalysisJobViewSet, basename="jobs")
+router.register(r"aggregates", SentimentAggregateViewSet, basename="aggregates")
 
 urlpatterns = [
+    path("healthz/ready", readiness, name="healthz-ready"),
+    path("metrics", metrics, name="metrics"),
     path("", include(router.urls)),
 ]
@@ -1,15 +1,26 @@
 import asyncio
 import logging
 
-from typing import Optional, Any
+from itertools import islice
+from typing import AsyncIterator, Iterable, Iterator, Optional, Any, Union
 
-from django.core.cache import cache
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
 from django.core.exceptions import ImproperlyConfigured
+from django.db.models import F, FloatField, Sum
+from django.db.models.functions import Cast, TruncDay
+from django.http import HttpRequest, HttpResponse, JsonResponse, StreamingHttpResponse
 
 from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import APIException
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from rest_framework.request import Request
 from rest_framework.permissions import AllowAny
+from rest_framework.settings import api_settings
 
 from adrf.viewsets import ViewSet
 
@@ -17,9 +28,29 @@ from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
 
-from .analysis import analyse_sentiment_async
-from .models import Analysis
-from .serializers import AnalysisSerializer
+from .analysis import analyse_sentiments_async, loader, remote_engine, scheduler
+from .batching import QueueFull
+from .caching import get_sentiment_results
+from .jobs import create_job
+from .metrics import STAGE_SECONDS, registry
+from .models import SEARCH_CONFIG, Analysis, AnalysisJob, SentimentRollup
+from .pagination import KeysetPagination, SearchRankPagination
+from .parsers import NDJSONParser, RequestTooLarge, optional_parser_classes, peek_texts
+from .renderers import NDJSONRenderer, ORJSONRenderer, optional_renderer_classes
+from .serializers import (
+    AggregateQuerySerializer,
+    AnalysisJobSerializer,
+    AnalysisFilterSerializer,
+    AnalysisSearchSerializer,
+    AnalysisSerializer,
+    SentimentAggregateSerializer,
+    serialize_results,
+)
+from .storage import build_analyses, save_analyses
+from .throttling import REJECTED_TEXTS, client_ident, reject, text_limiter
+
+# A saved analysis, or the text and error of a text whose analysis failed
+AnalysisResult = Union[Analysis, dict[str, str]]
 
 
 class BulkAnalysisViewSet(ViewSet):
@@ -30,12 +61,35 @@ class BulkAnalysisViewSet(ViewSet):
     - post:
         Analyzes a list of texts asynchronously, creates analysis objects,
         and returns the analysis results.
+    - get:
+        Lists stored analyses newest first with keyset pagination, filtered by
+        ``sentiment``, ``min_confidence`` and ``max_confidence``, or retrieves one.
+        ``fields=id,sentiment,...`` only returns (and reads) the given fields.
+    - get search:
+        Full-text searches stored analyses (``q``, web search syntax), filtered by
+        ``sentiment`` and a ``start``/``end`` date range, best match first.
 
     The post action expects a POST request with the following data:
     - texts: A list of texts (in string format) to be analyzed. (Optional[list[str]])
 
     The post action returns a response with the following data:
-    - A list of analysis objects containing the sentiment analysis results.
+    - A list of analysis objects containing the sentiment analysis results. Texts
+      whose analysis failed are not saved and are returned as ``{"text": ...,
+      "error": ...}`` items instead.
+
+    With an ``Accept: application/x-ndjson`` header or ``?stream=1``, the results are
+    instead streamed as one JSON line per text as each batch finishes, and the
+    analysis objects are saved batch by batch.
+
+    Texts can also be posted as MessagePack or as NDJSON, one text per line. NDJSON
+    bodies are read batch by batch as they are analysed instead of being parsed
+    into a list up front. Bodies over ``MAX_REQUEST_BODY_BYTES`` are rejected with
+    a 413.
+
+    Before any text is tokenized, requests of more than ``MAX_TEXTS_PER_REQUEST``
+    texts are rejected with a 413, and requests arriving while the inference queue
+    is full or from clients over their text rate limit with a 429 and a
+    ``Retry-After`` header. NDJSON texts are admitted one chunk at a time.
 
     Example usage:
     POST /bulk-analysis/
@@ -47,6 +101,17 @@ class BulkAnalysisViewSet(ViewSet):
     queryset = Analysis.objects.all()
     serializer_class = AnalysisSerializer
     permission_classes = [AllowAny]
+    renderer_classes = [
+        ORJSONRenderer,
+        *api_settings.DEFAULT_RENDERER_CLASSES,
+        NDJSONRenderer,
+        *optional_renderer_classes(),
+    ]
+    parser_classes = [
+        *api_settings.DEFAULT_PARSER_CLASSES,
+        NDJSONParser,
+        *optional_parser_classes(),
+    ]
 
     @swagger_auto_schema(
         request_body=openapi.Schema(
@@ -61,7 +126,7 @@ class BulkAnalysisViewSet(ViewSet):
         )
     )
     async def create(self, request: Request, *args: Any, **kwargs: Any) -> Response:
-        texts: Optional[list[str]] = request.data.get("texts", [])
+        texts: Iterable[str] = peek_texts(request.data.get("texts", []))
 
         if not texts:
             logging.error('Missing "texts" field in request data')
@@ -70,33 +135,434 @@ class BulkAnalysisViewSet(ViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        sentiment_results: list[dict[str, float]] = []
-        for text in texts:
-            cache_key: str = f"sentiment:{text}"
-
-            cached_result: Optional[dict[str, float]] = cache.get(cache_key)
-            if cached_result:
-                logging.info(f"Sentiment analysis for '{text}' retrieved from cache.")
-                sentiment_results.append(cached_result)
-            else:
-                sentiment: dict[str, float] = await self.analyse_text(text)
-                sentiment_results.append(sentiment)
-                cache.set(cache_key, sentiment, timeout=None)
-
-        analyses: list[Analysis] = [
-            Analysis(
-                text=text,
-                sentiment=result['sentiment'],
-                confidence_score=result['confidence_score']
+        await self._admit(request, len(texts) if isinstance(texts, list) else 0)
+
+        if self._wants_stream(request):
+            response: StreamingHttpResponse = StreamingHttpResponse(
+                self._stream_analyses(texts),
+                content_type=NDJSONRenderer.media_type,
+                status=status.HTTP_201_CREATED,
+            )
+            # Pass lines through nginx as they are produced instead of buffering them
+            response["X-Accel-Buffering"] = "no"
+            return response
+
+        if isinstance(texts, list):
+            results: list[AnalysisResult] = await self._analyse_and_save(texts)
+        else:
+            results = [
+                result
+                async for chunk in self._analyse_chunks(texts)
+                for result in chunk
+            ]
+
+        return Response(serialize_results(results), status=status.HTTP_201_CREATED)
+
+    async def _admit(self, request: Request, count: int, admitted: int = 0) -> None:
+        """
+        Decides whether ``count`` more texts of a request are analysed, before any of
+        them is tokenized. With no texts, only checks that the inference queue has room.
+
+        Raises:
+            RequestTooLarge: The request holds more than ``MAX_TEXTS_PER_REQUEST`` texts.
+            Throttled: The inference queue is full or the client is over its text rate
+                limit.
+        """
+        if admitted + count > settings.MAX_TEXTS_PER_REQUEST:
+            REJECTED_TEXTS.inc(count, reason="too_many_texts")
+            raise RequestTooLarge(
+                f"Requests may contain at most {settings.MAX_TEXTS_PER_REQUEST} texts."
+            )
+
+        if scheduler.is_full(1):
+            raise reject(
+                "queue_full",
+                count,
+                settings.INFERENCE_QUEUE_RETRY_AFTER,
+                "The inference queue is full.",
+            )
+
+        if count:
+            wait: float = await text_limiter.aconsume(client_ident(request), count)
+            if wait:
+                raise reject("rate_limited", count, wait, "Text rate limit exceeded.")
+
+    def _wants_stream(self, request: Request) -> bool:
+        return (
+            request.accepted_renderer.format == NDJSONRenderer.format
+            or request.query_params.get("stream", "").lower() in ("1", "true")
+        )
+
+    async def _analyse_and_save(self, texts: list[str]) -> list[AnalysisResult]:
+        sentiment_results: list[dict[str, float]] = await self._get_sentiment_results(texts)
+        return await self._save_analyses(texts, sentiment_results)
+
+    async def _save_analyses(
+        self, texts: list[str], sentiment_results: list[dict[str, float]]
+    ) -> list[AnalysisResult]:
+        """
+        Saves the analyses of texts and returns them in the order of ``texts``, with
+        the text and error of each text whose analysis failed in its place.
+        """
+        with STAGE_SECONDS.time(stage="db_write"):
+            analyses: list[Analysis] = await sync_to_async(save_analyses)(
+                build_analyses(texts, sentiment_results)
             )
-            for result, text in zip(sentiment_results, texts)
-        ]
-        await Analysis.objects.abulk_create(analyses)
         logging.info(f"Successfully created {len(analyses)} analysis objects.")
+        if len(analyses) < len(texts):
+            logging.warning(f"{len(texts) - len(analyses)} texts could not be analysed.")
+
+        saved: Iterator[Analysis] = iter(analyses)
+        return [
+            {"text": text, "error": result["error"]} if "error" in result else next(saved)
+            for text, result in zip(texts, sentiment_results)
+        ]
+
+    async def _stream_analyses(self, texts: Iterable[str]) -> AsyncIterator[bytes]:
+        """
+        Yields one NDJSON line per text as each chunk of ``_analyse_chunks`` is saved.
+
+        The response has already started by the time an NDJSON body turns out to be
+        malformed or too large, so the error is sent as a final ``{"error": ...}``
+        line instead.
+        """
+        try:
+            async for results in self._analyse_chunks(texts):
+                yield b"".join(
+                    NDJSONRenderer.render_line(data) for data in serialize_results(results)
+                )
+        except APIException as e:
+            logging.error(f"Stopped streaming analyses: {e.detail}")
+            yield NDJSONRenderer.render_line({"error": str(e.detail)})
+
+    async def _analyse_chunks(
+        self, texts: Iterable[str]
+    ) -> AsyncIterator[list[AnalysisResult]]:
+        """
+        Analyses texts in chunks of ``MAX_BATCH_SIZE`` and yields the results of
+        ``_save_analyses`` for each chunk. The next chunk is already being analysed
+        while the current one is saved, and ``texts`` is only read one chunk ahead.
+        Texts from an iterator are admitted chunk by chunk.
+        """
+        iterator: Iterator[str] = iter(texts)
+        chunks: Iterator[list[str]] = iter(
+            lambda: list(islice(iterator, settings.MAX_BATCH_SIZE)), []
+        )
+
+        # Lists are admitted as a whole by ``create``, iterators chunk by chunk
+        metered: bool = not isinstance(texts, list)
+
+        chunk: Optional[list[str]] = next(chunks, None)
+        if chunk is None:
+            return
+        if metered:
+            await self._admit(self.request, len(chunk))
+        admitted: int = len(chunk)
+
+        pending: asyncio.Task = asyncio.ensure_future(self._get_sentiment_results(chunk))
+        try:
+            while chunk is not None:
+                sentiment_results: list[dict[str, float]] = await pending
+                try:
+                    next_chunk: Optional[list[str]] = next(chunks, None)
+                    if metered and next_chunk is not None:
+                        await self._admit(self.request, len(next_chunk), admitted)
+                        admitted += len(next_chunk)
+                except APIException:
+                    # Keep the texts read before a malformed line or a rejected chunk
+                    yield await self._save_analyses(chunk, sentiment_results)
+                    raise
+                if next_chunk is not None:
+                    pending = asyncio.ensure_future(self._get_sentiment_results(next_chunk))
+
+                yield await self._save_analyses(chunk, sentiment_results)
+                chunk = next_chunk
+        finally:
+            # Stop analysing once the client has gone away
+            pending.cancel()
+
+    async def _get_sentiment_results(self, texts: list[str]) -> list[dict[str, float]]:
+        """
+        Looks up the sentiment of each text in the cache and analyses the misses
+        with ``analyse_texts``.
+        """
+        return await get_sentiment_results(texts, self.analyse_texts)
+
+    async def analyse_texts(self, texts: list[str]) -> list[dict[str, float]]:
+        try:
+            sentiments: list[dict[str, float]] = await analyse_sentiments_async(texts)
+        except QueueFull:
+            raise reject(
+                "queue_full",
+                len(texts),
+                settings.INFERENCE_QUEUE_RETRY_AFTER,
+                "The inference queue is full.",
+            )
+        return sentiments
+
+    # The "list" action shadows the builtin in the class body, so the signatures
+    # of the methods below cannot use it in their annotations
+    @swagger_auto_schema(query_serializer=AnalysisFilterSerializer)
+    async def list(self, request: Request, *args: Any, **kwargs: Any) -> Response:
+        query = AnalysisFilterSerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(data=query.errors, status=status.HTTP_400_BAD_REQUEST)
+        params: dict[str, Any] = query.validated_data
+
+        analyses = Analysis.objects.all()
+        if "sentiment" in params:
+            analyses = analyses.filter(sentiment=params["sentiment"])
+        if "min_confidence" in params:
+            analyses = analyses.filter(confidence_score__gte=params["min_confidence"])
+        if "max_confidence" in params:
+            analyses = analyses.filter(confidence_score__lte=params["max_confidence"])
+        fields: Optional[list[str]] = params.get("fields")
+        if fields:
+            # The pagination key is always read
+            analyses = analyses.only("id", "created_at", *fields)
+
+        paginator = KeysetPagination()
+        page: list[Analysis] = await paginator.apaginate_queryset(analyses, request)
+        serializer = AnalysisSerializer(page, many=True, fields=fields)
+        return paginator.get_paginated_response(serializer.data)
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            openapi.Parameter(
+                "fields",
+                openapi.IN_QUERY,
+                description="Comma-separated fields to return.",
+                type=openapi.TYPE_STRING,
+            )
+        ]
+    )
+    async def retrieve(
+        self, request: Request, pk: str, *args: Any, **kwargs: Any
+    ) -> Response:
+        query = AnalysisFilterSerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(data=query.errors, status=status.HTTP_400_BAD_REQUEST)
+        fields: Optional[list[str]] = query.validated_data.get("fields")
+
+        analyses = Analysis.objects.filter(pk=pk)
+        if fields:
+            analyses = analyses.only("id", *fields)
+        analysis: Optional[Analysis] = await analyses.afirst()
+        if analysis is None:
+            return Response(
+                data={"error": "Analysis not found"}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        return Response(AnalysisSerializer(analysis, fields=fields).data)
+
+    @swagger_auto_schema(query_serializer=AnalysisSearchSerializer)
+    @action(detail=False)
+    async def search(self, request: Request, *args: Any, **kwargs: Any) -> Response:
+        query = AnalysisSearchSerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(data=query.errors, status=status.HTTP_400_BAD_REQUEST)
+        params: dict[str, Any] = query.validated_data
+
+        search_query = SearchQuery(
+            params["q"], config=SEARCH_CONFIG, search_type="websearch"
+        )
+        # Matches the expression of the GIN index on the text, so the index is used
+        search_vector = SearchVector("text", config=SEARCH_CONFIG)
+        analyses = Analysis.objects.annotate(search=search_vector).filter(
+            search=search_query
+        )
+        if "sentiment" in params:
+            analyses = analyses.filter(sentiment=params["sentiment"])
+        if "start" in params:
+            analyses = analyses.filter(created_at__gte=params["start"])
+        if "end" in params:
+            analyses = analyses.filter(created_at__lt=params["end"])
+        fields: Optional[list[str]] = params.get("fields")
+        if fields:
+            analyses = analyses.only("id", *fields)
+        # ts_rank returns a real, which is cast to the double precision of the page
+        # keys so rows are compared with the key exactly as it was encoded
+        analyses = analyses.annotate(
+            rank=Cast(SearchRank(search_vector, search_query), FloatField())
+        )
+
+        paginator = SearchRankPagination()
+        page: list[Analysis] = await paginator.apaginate_queryset(analyses, request)
+        serializer = AnalysisSerializer(page, many=True, fields=fields)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class JobResultsPagination(PageNumberPagination):
+    page_size = settings.JOB_RESULTS_PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = settings.JOB_RESULTS_MAX_PAGE_SIZE
+
+
+class AnalysisJobViewSet(ViewSet):
+    """
+    Async ViewSet for bulk sentiment analyses too large for a single request.
+
+    This ViewSet provides the following actions:
+    - post:
+        Queues a list of texts as a background job and returns the job straight
+        away. The texts are analysed by ``manage.py run_sentiment_worker``.
+    - get:
+        Returns the progress of a job (processed/total texts and throughput).
+    - get results:
+        Returns the analyses of a job, paginated.
+
+    Example usage:
+    POST /jobs/
+    {
+        "texts": ["I love this product!", "This movie is terrible."]
+    }
+    GET /jobs/1/
+    GET /jobs/1/results/?page=2
+    """
+
+    queryset = AnalysisJob.objects.all()
+    serializer_class = AnalysisJobSerializer
+    permission_classes = [AllowAny]
+    parser_classes = [
+        *api_settings.DEFAULT_PARSER_CLASSES,
+        NDJSONParser,
+        *optional_parser_classes(),
+    ]
+
+    @swagger_auto_schema(
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=["texts"],
+            properties={
+                "texts": openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Schema(type=openapi.TYPE_STRING),
+                )
+            },
+        )
+    )
+    async def create(self, request: Request, *args: Any, **kwargs: Any) -> Response:
+        texts: Iterable[str] = peek_texts(request.data.get("texts", []))
+
+        if not texts:
+            logging.error('Missing "texts" field in request data')
+            return Response(
+                data={"error": 'Missing "texts" field in request data'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        job: AnalysisJob = await sync_to_async(create_job)(texts)
+
+        serializer = AnalysisJobSerializer(job, context={"request": request})
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
 
-        serializer: AnalysisSerializer = AnalysisSerializer(analyses, many=True)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    async def retrieve(self, request: Request, pk: str, *args: Any, **kwargs: Any) -> Response:
+        job: Optional[AnalysisJob] = await AnalysisJob.objects.filter(pk=pk).afirst()
+        if job is None:
+            return Response(
+                data={"error": "Job not found"}, status=status.HTTP_404_NOT_FOUND
+            )
 
-    async def analyse_text(self, text: str) -> dict[str, float]:
-        sentiment: dict[str, float] = await analyse_sentiment_async(text)
-        return sentiment
+        serializer = AnalysisJobSerializer(job, context={"request": request})
+        return Response(serializer.data)
+
+    @action(detail=True)
+    async def results(self, request: Request, pk: str, *args: Any, **kwargs: Any) -> Response:
+        if not await AnalysisJob.objects.filter(pk=pk).aexists():
+            return Response(
+                data={"error": "Job not found"}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        paginator = JobResultsPagination()
+        analyses: list[Analysis] = await sync_to_async(paginator.paginate_queryset)(
+            Analysis.objects.filter(job_id=pk).order_by("id"), request, view=self
+        )
+        serializer = AnalysisSerializer(analyses, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class SentimentAggregateViewSet(ViewSet):
+    """
+    Async ViewSet returning sentiment time series for dashboards.
+
+    Counts and mean confidence scores per sentiment are read from the hourly
+    ``SentimentRollup`` table, so the cost depends on the number of buckets in the
+    range and not on the number of analyses.
+
+    The list action expects the following query parameters:
+    - start, end: The range of bucket start times, end exclusive (ISO 8601).
+    - interval: "hour" (default) or "day".
+    - model: Only count analyses of this model id (optional).
+
+    Example usage:
+    GET /aggregates/?start=2024-05-01T00:00:00Z&end=2024-06-01T00:00:00Z&interval=day
+    """
+
+    permission_classes = [AllowAny]
+
+    @swagger_auto_schema(query_serializer=AggregateQuerySerializer)
+    async def list(self, request: Request, *args: Any, **kwargs: Any) -> Response:
+        query = AggregateQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(data=query.errors, status=status.HTTP_400_BAD_REQUEST)
+        params: dict[str, Any] = query.validated_data
+
+        rollups = SentimentRollup.objects.filter(
+            bucket_start__gte=params["start"], bucket_start__lt=params["end"]
+        )
+        if "model" in params:
+            rollups = rollups.filter(model=params["model"])
+
+        bucket = F("bucket_start")
+        if params["interval"] == "day":
+            bucket = TruncDay("bucket_start")
+        buckets = (
+            rollups.annotate(bucket=bucket)
+            .values("bucket", "sentiment")
+            .annotate(total=Sum("count"), score_sum=Sum("confidence_sum"))
+            .order_by("bucket", "sentiment")
+        )
+        aggregates: list[dict[str, Any]] = [
+            {
+                "bucket_start": row["bucket"],
+                "sentiment": row["sentiment"],
+                "count": row["total"],
+                "mean_confidence": row["score_sum"] / row["total"],
+            }
+            async for row in buckets
+        ]
+
+        serializer = SentimentAggregateSerializer(aggregates, many=True)
+        return Response(serializer.data)
+
+
+async def readiness(request: HttpRequest) -> JsonResponse:
+    """
+    Readiness probe which only succeeds once the model has been warmed up, so the
+    proxy does not route traffic to cold workers. With an inference server, that
+    is the server's model.
+    """
+    if remote_engine is not None and await remote_engine.ping():
+        return JsonResponse({"status": "ready", "engine": remote_engine.name})
+    if loader.ready.is_set():
+        return JsonResponse(
+            {
+                "status": "ready",
+                "engine": loader.engine.name,
+                # Should stay at one per length bucket once the worker is warmed up
+                "traces": getattr(loader.engine, "trace_count", None),
+            }
+        )
+    return JsonResponse(
+        {"status": "error" if loader.error else "warming up", "error": loader.error},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
+
+
+async def metrics(request: HttpRequest) -> HttpResponse:
+    """
+    Exposes the metrics of this worker in the Prometheus text format.
+    """
+    return HttpResponse(
+        registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )